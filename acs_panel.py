@@ -0,0 +1,257 @@
+# Tract x year panel of the gap metrics over every available ACS 5-year vintage.
+#
+# Each vintage's income and family size files are loaded, cleaned and imputed the same way
+# as the single year analysis, in parallel worker processes, which hand back compact
+# tract_store.TractStore tables. The results share one sorted
+# array of tract keys, so every panel column is a years x tracts matrix. Housing New York
+# buildings are matched to a vintage by their completion year, and the gaps for every year
+# are computed in one vectorized pass, each year against its own AMI schedule.
+#
+# Vintage files follow the names of the 2019 ones, e.g. ACS5YR2017_median_income.csv and
+# ACSDT5Y2017_family_size.csv. The income columns are read by their codes in the 2017+
+# S1903 layout. For older downloads with different codes, add a mapping to INCOME_CODES.
+# Vintages from 2020 on are published on 2020 tracts. They are imputed on those tracts and
+# then moved onto the 2010 tracts everything else uses with a tract_crosswalk.Crosswalk.
+
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from affordability import HOUSEHOLD_LEVELS, LEVEL_INC_COLS, LEVEL_SHARE_COLS, NO_AFFORDABLE_UNITS, TOP_CODED_INCOME, UNIT_BANDS, panel_gaps, rank_columns
+from pipeline import AMI_LEVELS, PCT_AMI
+from tract_keys import BORO_PREFIXES, boro_code, from_geo_id, to_geo_id, to_tract_name
+from tract_store import TractStore
+
+INCOME_PATTERN = "./ACS5YR{year}_median_income.csv"
+FAMILY_PATTERN = "./ACSDT5Y{year}_family_size.csv"
+
+FIRST_VINTAGE = 2014
+
+#the first vintage on 2020 tracts
+TRACTS_2020_VINTAGE = 2020
+
+#per vintage renames from that year's S1903 column codes to the 2019 ones, for vintages published in another layout
+INCOME_CODES = {}
+
+#100% AMI for a family of four in New York City by year, from HPD's Area Median Income
+#charts (https://www.nyc.gov/site/hpd/services-and-information/area-median-income.page),
+#which take it from HUD's income limits for the New York, NY HUD Metro FMR Area. HUD's 2020
+#limits came out lower than 2019's.
+AMI_FOUR_PERSON = {2014: 85900, 2015: 86300, 2016: 90600, 2017: 95400, 2018: 104300, 2019: 106700, 2020: 102400, 2021: 107400, 2022: 127100, 2023: 141200}
+
+#full AMI schedules (1 to 7+ people) by year, used instead of scaling where they are known
+AMI_SCHEDULES = {2019: AMI_LEVELS}
+
+#how buildings are matched to vintages: each one to the latest vintage at or before its
+#completion year, cumulatively to every vintage from then on, or every building (completed
+#or not) to every vintage, like the single year analysis
+MATCHES = ['completion', 'cumulative', 'all']
+
+PANEL_COLUMNS = ['Year', 'Tract Key', 'Census Tract', 'Boro', 'buildings', 'mode_unit', 'mode_family', 'mode_diff', 'weighted_avg', 'mode_diff_zero', 'avg_diff_zero']
+
+
+def ami_levels(year):
+    # AMI schedule (1 to 7+ people) for year: the published one from AMI_SCHEDULES if there
+    # is one, otherwise the 2019 schedule scaled by that year's four person AMI and rounded
+    # to the nearest $50. Scaling keeps the 2019 household size adjustments, so it can be a
+    # little off from a year's published values for the other sizes.
+    if year in AMI_SCHEDULES:
+        return list(AMI_SCHEDULES[year])
+    return [int(round(level * AMI_FOUR_PERSON[year] / AMI_FOUR_PERSON[2019] / 50) * 50) for level in AMI_LEVELS]
+
+
+def vintage_paths(years=None, income_pattern=INCOME_PATTERN, family_pattern=FAMILY_PATTERN):
+    # {year: (income path, family path)} for the given years, or every vintage from
+    # FIRST_VINTAGE on that has both files
+    if years is None:
+        found = re.compile(re.escape(os.path.basename(income_pattern)).replace(re.escape("{year}"), r"(\d{4})") + "$")
+        matches = (found.match(os.path.basename(path)) for path in glob.glob(income_pattern.replace("{year}", "[0-9]" * 4)))
+        years = sorted(int(match.group(1)) for match in matches if match)
+        years = [year for year in years if year >= FIRST_VINTAGE and os.path.exists(family_pattern.format(year = year))]
+    return {year: (income_pattern.format(year = year), family_pattern.format(year = year)) for year in sorted(years)}
+
+
+def to_2010_tracts(income_data, family_data, crosswalk=None, top_coded=None):
+    # The imputed income table and raw family table of a 2020 tract vintage moved onto 2010
+    # tracts: household counts split by overlap area, and median incomes averaged over the
+    # overlapping tracts weighted by their households. Both are one sparse product each.
+    # Given the vintage's top coded incomes by tract key (see load_vintage), those are moved
+    # too and returned third: an average is only the top code where everything in it was.
+    from data_loaders import FAMILY_COLUMNS
+    from tract_crosswalk import Crosswalk
+
+    crosswalk = crosswalk or Crosswalk.from_relationship_file('2020')
+    family_data = family_data.assign(**{'Tract Key': from_geo_id(family_data['GEO_ID'])})
+    households = family_data.set_index('Tract Key')['B11016_001E']
+    count_cols = [col for col in FAMILY_COLUMNS if col != 'GEO_ID']
+    family_data = crosswalk.counts(family_data, count_cols).dropna(how = 'all')
+    family_data.insert(0, 'GEO_ID', to_geo_id(family_data.index).to_numpy())
+
+    income_data = crosswalk.averages(income_data, LEVEL_INC_COLS, weights = households).dropna(how = 'all').reset_index()
+    if top_coded is None:
+        return income_data, family_data.reset_index(drop = True)
+    top_coded = crosswalk.averages(top_coded.astype(float), LEVEL_INC_COLS, weights = households) == 1
+    return income_data, family_data.reset_index(drop = True), top_coded
+
+
+def load_vintage(year, income_path, family_path, engine=None):
+    # One vintage's TractStore: the imputed median incomes, household shares and mode family
+    # size for every 2010 tract. Runs in a worker process.
+    from data_loaders import INCOME_COLUMNS, load_family, parse_income, read_acs
+    from pipeline import INCOME_NAMES, family_tracts, imputed_income, income_tracts
+
+    codes = INCOME_CODES.get(year, {})
+    columns = {next((old for old, new in codes.items() if new == col), col): dtype for col, dtype in INCOME_COLUMNS.items()}
+    income_data = read_acs(income_path, columns, engine).rename(columns = codes)
+    top_coded = {}
+    for col in INCOME_COLUMNS:
+        if col != 'GEO_ID':
+            income_data[col], top_coded[col] = parse_income(income_data[col], with_top_coded = True)
+    #the "250,000+" incomes by tract key; imputation only fills missing incomes, so they still hold after it
+    top_coded = pd.DataFrame(top_coded).rename(columns = INCOME_NAMES).set_index(from_geo_id(income_data['GEO_ID']))
+    top_coded = top_coded[top_coded.index.notna()]
+
+    income_data = imputed_income(income_tracts(income_data))
+    family_data = load_family(family_path, engine)
+    if year >= TRACTS_2020_VINTAGE:
+        income_data, family_data, top_coded = to_2010_tracts(income_data, family_data, top_coded = top_coded)
+    family_data = family_tracts(family_data)
+    data = pd.merge(income_data[['Tract Key'] + LEVEL_INC_COLS], family_data[['Tract Key', 'mode_family'] + LEVEL_SHARE_COLS], on = "Tract Key")
+    return TractStore.from_frame(data, top_coded = top_coded)
+
+
+def load_vintages(paths, workers=None, engine=None):
+    #{year: load_vintage store} for every vintage in paths, loaded by `workers` processes
+    years = list(paths)
+    workers = min(len(years), workers or os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            tables = list(pool.map(load_vintage, years, *zip(*paths.values()), [engine] * len(years)))
+    else:
+        tables = [load_vintage(year, *paths[year], engine) for year in years]
+    return dict(zip(years, tables))
+
+
+def completion_years(housing_data):
+    dates = pd.to_datetime(housing_data['Building Completion Date'], format = "%m/%d/%Y", errors = 'coerce')
+    return dates.dt.year.to_numpy(dtype = float, na_value = np.nan)
+
+
+class TractPanel:
+    # Panel columns as years x tracts matrices over shared tract keys. `present` marks the
+    # tracts each vintage has data for and `buildings` counts the buildings matched to each
+    # tract and year; the rest are the vintage values, the unit totals and the gaps.
+
+    def __init__(self, years, keys, columns):
+        self.years = list(years)
+        self.keys = np.asarray(keys, dtype = np.int64)
+        self.columns = columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def frame(self, all_tracts=False):
+        # Long table with one row per year and tract, only for tracts with buildings matched
+        # to that year unless all_tracts
+        keep = self['present'] & (all_tracts | (self['buildings'] > 0))
+        year_idx, tract_idx = np.nonzero(keep)
+        keys = pd.Series(self.keys[tract_idx])
+        bands = self['mode_band'][keep]
+        levels = self['mode_level'][keep]
+        #-1 (none) picks the last name
+        bands_named = np.asarray(UNIT_BANDS + [NO_AFFORDABLE_UNITS], dtype = object)
+        levels_named = np.asarray(HOUSEHOLD_LEVELS + [None], dtype = object)
+        data = pd.DataFrame({
+            'Year': np.asarray(self.years)[year_idx],
+            'Tract Key': keys.astype('Int64'),
+            'Census Tract': to_tract_name(keys),
+            'Boro': boro_code(keys).map(BORO_PREFIXES),
+            'buildings': self['buildings'][keep],
+            'mode_unit': bands_named[bands],
+            'mode_family': levels_named[levels],
+            'mode_diff': self['mode_diff'][keep],
+            'weighted_avg': self['weighted_avg'][keep],
+        })
+        data['mode_diff_zero'] = data['mode_diff'] > 0
+        data['avg_diff_zero'] = data['weighted_avg'] > 0
+        for i, band in enumerate(UNIT_BANDS):
+            data[band] = self['units'][keep][:, i]
+        return data
+
+
+def build_panel(housing_data, vintages, ami_schedules=None, pct_ami=PCT_AMI, match='completion'):
+    # The TractPanel for the cleaned housing data and the load_vintages stores, with the
+    # gaps for every year. ami_schedules maps years to AMI schedules, defaulting to
+    # ami_levels(year) for each vintage.
+    if match not in MATCHES:
+        raise ValueError("unknown match: " + str(match) + " (choose from " + ", ".join(MATCHES) + ")")
+    years = sorted(vintages)
+    keys = np.unique(np.concatenate([vintages[year].keys.astype(np.int64) for year in years]))
+    shape = (len(years), len(keys))
+
+    #vintage values on the shared keys
+    income = np.full(shape + (len(LEVEL_INC_COLS),), np.nan)
+    shares = np.full(shape + (len(LEVEL_SHARE_COLS),), np.nan)
+    levels = np.full(shape, -1, dtype = np.int64)
+    present = np.zeros(shape, dtype = bool)
+    for y, year in enumerate(years):
+        store = vintages[year]
+        cols = np.searchsorted(keys, store.keys)
+        income[y, cols] = store.income
+        shares[y, cols] = store.shares
+        levels[y, cols] = store.levels()
+        present[y, cols] = True
+
+    #unit totals and building counts for each year and tract
+    tract_keys = housing_data['Tract Key'].to_numpy(dtype = float, na_value = np.nan)
+    position = np.searchsorted(keys, np.nan_to_num(tract_keys).astype(np.int64))
+    in_panel = ~np.isnan(tract_keys) & (position < len(keys)) & (keys[np.minimum(position, len(keys) - 1)] == np.nan_to_num(tract_keys))
+    if match == 'all':
+        year_idx = np.zeros(len(housing_data), dtype = np.int64)
+    else:
+        completed = completion_years(housing_data)
+        year_idx = np.searchsorted(np.asarray(years, dtype = float), np.nan_to_num(completed, nan = -1), side = 'right') - 1
+        in_panel &= ~np.isnan(completed) & (year_idx >= 0)
+    unit_values = np.nan_to_num(housing_data[UNIT_BANDS].to_numpy(dtype = float, na_value = np.nan))
+    units = np.zeros(shape + (len(UNIT_BANDS),))
+    buildings = np.zeros(shape, dtype = np.int64)
+    np.add.at(units, (year_idx[in_panel], position[in_panel]), unit_values[in_panel])
+    np.add.at(buildings, (year_idx[in_panel], position[in_panel]), 1)
+    if match != 'completion':
+        units = np.cumsum(units, axis = 0)
+        buildings = np.cumsum(buildings, axis = 0)
+
+    #mode affordability band, -1 without affordable units (ties go to the higher band)
+    flat_units = units.reshape(-1, len(UNIT_BANDS))
+    top = rank_columns(flat_units)[:, 0]
+    bands = np.where(flat_units[np.arange(len(flat_units)), top] > 0, top, -1)
+
+    #every year's gaps at once, each year with its own AMI schedule
+    ami_schedules = ami_schedules or {}
+    schedules = [ami_schedules[year] if year in ami_schedules else ami_levels(year) for year in years]
+    flat_income = income.reshape(-1, len(LEVEL_INC_COLS))
+    flat_income = np.where(np.isnan(flat_income), TOP_CODED_INCOME, flat_income)
+    mode, weighted = panel_gaps(flat_income, shares.reshape(-1, len(LEVEL_SHARE_COLS)), levels.ravel(), bands, np.repeat(np.arange(len(years)), len(keys)), schedules, pct_ami)
+
+    columns = {'present': present, 'buildings': buildings, 'units': units, 'income': income, 'shares': shares,
+               'mode_level': levels, 'mode_band': bands.reshape(shape), 'mode_diff': mode.reshape(shape), 'weighted_avg': weighted.reshape(shape)}
+    return TractPanel(years, keys, columns)
+
+
+def tract_panel(housing_data, years=None, workers=None, engine=None, ami_schedules=None, pct_ami=PCT_AMI, match='completion'):
+    #load every vintage (in parallel) and build the panel for the cleaned housing data
+    from profiling import stage
+
+    paths = vintage_paths(years)
+    if not paths:
+        raise FileNotFoundError("no ACS vintages found matching " + INCOME_PATTERN + " and " + FAMILY_PATTERN)
+    with stage("load_vintages", vintages = len(paths)):
+        vintages = load_vintages(paths, workers, engine)
+    with stage("build_panel", rows_in = len(housing_data)) as s:
+        panel = build_panel(housing_data, vintages, ami_schedules, pct_ami, match)
+        s['tracts'] = len(panel.keys)
+    return panel
@@ -0,0 +1,133 @@
+# Tract-level affordability calculations, done on whole NumPy matrices rather than row by row.
+
+import numpy as np
+import pandas as pd
+
+from tract_rollup import INCOME_UNIT_COLS
+
+NO_AFFORDABLE_UNITS = "no affordable units"
+
+FAMILY_COLS = ['two_person_hh', 'three_person_hh', 'four_person_hh', 'five_person_hh', 'six_person_hh', 'sev_person_hh']
+
+#affordability bands, lowest to highest, in the same order as the pct_ami values
+UNIT_BANDS = INCOME_UNIT_COLS
+
+#household sizes in the same order as the ami_levels values: 1 person (nonfamily) up to 7+ people,
+#with the median income and household share columns for each
+HOUSEHOLD_LEVELS = ['nonfamily_hh'] + FAMILY_COLS
+LEVEL_INC_COLS = ['med_inc_nonfamily', 'med_inc_family_2', 'med_inc_family_3', 'med_inc_family_4', 'med_inc_family_5', 'med_inc_family_6', 'med_inc_family_7']
+LEVEL_SHARE_COLS = HOUSEHOLD_LEVELS
+
+#median income used when the census value can't be parsed (the "250,000+" top code)
+TOP_CODED_INCOME = 250000.00
+
+
+def rank_columns(matrix):
+    # Column positions for each row ordered from largest to smallest value. Ties go to the
+    # column further right, so with columns ordered from lowest to highest income band the
+    # higher band wins a tie (and with family sizes, the larger family). NaN counts as 0.
+    matrix = np.nan_to_num(np.asarray(matrix, dtype = float))
+    n = matrix.shape[1]
+    return n - 1 - np.argsort(-matrix[:, ::-1], axis = 1, kind = 'stable')
+
+
+def mode_designation(data, rank=1, sentinel=None):
+    # Name of the column holding the largest (rank=1), second largest (rank=2), ... value for
+    # each row of data. If sentinel is given, rows where that value isn't positive get the
+    # sentinel instead, e.g. NO_AFFORDABLE_UNITS for tracts without any affordable units.
+    matrix = np.nan_to_num(data.apply(pd.to_numeric, errors = 'coerce').to_numpy(dtype = float, na_value = np.nan))
+    if matrix.shape[1] == 0 or len(matrix) == 0:
+        return pd.Series(sentinel, index = data.index, dtype = object)
+
+    position = rank_columns(matrix)[:, rank - 1]
+    names = np.asarray(data.columns, dtype = object)[position]
+    if sentinel is not None:
+        value = matrix[np.arange(len(matrix)), position]
+        names = np.where(value > 0, names, sentinel)
+    return pd.Series(names, index = data.index, dtype = object)
+
+
+def threshold_matrix(ami_levels, pct_ami):
+    #minimum income requirement for every affordability band (rows) and household size (columns)
+    return np.outer(np.asarray(pct_ami, dtype = float), np.asarray(ami_levels, dtype = float))
+
+
+def gap_inputs(data):
+    # Pull the matrices the gap calculations need out of the combined tract table:
+    # median incomes and household shares (tracts x household sizes), plus the row of the
+    # threshold matrix for each tract's mode band and the column for its mode household
+    # size (-1 where there is none, e.g. no affordable units).
+    income = data[LEVEL_INC_COLS].apply(pd.to_numeric, errors = 'coerce').to_numpy(dtype = float, na_value = np.nan)
+    income = np.where(np.isnan(income), TOP_CODED_INCOME, income)
+    shares = data[LEVEL_SHARE_COLS].apply(pd.to_numeric, errors = 'coerce').to_numpy(dtype = float, na_value = np.nan)
+    bands = data['mode_unit'].map({band: i for i, band in enumerate(UNIT_BANDS)}).fillna(-1).to_numpy(dtype = np.int64)
+    levels = data['mode_family'].map({level: i for i, level in enumerate(HOUSEHOLD_LEVELS)}).fillna(-1).to_numpy(dtype = np.int64)
+    return income, shares, levels, bands
+
+
+def mode_gap(income, levels, bands, thresholds):
+    #median income minus the minimum income requirement, both for the mode household size
+    rows = np.arange(len(income))
+    found = (levels >= 0) & (bands >= 0)
+    gap = income[rows, np.maximum(levels, 0)] - thresholds[np.maximum(bands, 0), np.maximum(levels, 0)]
+    return np.where(found, gap, np.nan)
+
+
+def weighted_gap(income, shares, bands, thresholds):
+    #the same difference for every household size, weighted by its share of the tract's households
+    gap = ((income - thresholds[np.maximum(bands, 0)]) * shares).sum(axis = 1)
+    return np.where(bands >= 0, gap, np.nan)
+
+
+def panel_gaps(income, shares, levels, bands, years, ami_schedules, pct_ami):
+    # mode_gap and weighted_gap for rows from different years in one pass, each row against
+    # its own year's AMI schedule: years holds the row of ami_schedules (years x household
+    # sizes) to use for each row
+    ami = np.asarray(ami_schedules, dtype = float)[years]
+    pct = np.asarray(pct_ami, dtype = float)[np.maximum(bands, 0)]
+    rows = np.arange(len(income))
+    level_idx = np.maximum(levels, 0)
+
+    mode = income[rows, level_idx] - pct * ami[rows, level_idx]
+    mode = np.where((levels >= 0) & (bands >= 0), mode, np.nan)
+    weighted = ((income - pct[:, None] * ami) * shares).sum(axis = 1)
+    weighted = np.where(bands >= 0, weighted, np.nan)
+    return mode, weighted
+
+
+def scenario_gaps(income, shares, levels, bands, ami_schedules, pct_schedules):
+    # mode_gap and weighted_gap for every tract under N AMI schedules (N x household sizes)
+    # and M band definitions (M x affordability bands) at once. Since each threshold is
+    # pct * ami, both gaps separate into per-tract terms that broadcast to N x M x tracts
+    # arrays without building the full threshold grid.
+    ami = np.atleast_2d(np.asarray(ami_schedules, dtype = float))
+    pct = np.atleast_2d(np.asarray(pct_schedules, dtype = float))
+    found_level = levels >= 0
+    found_band = bands >= 0
+    level_idx = np.maximum(levels, 0)
+    band_idx = np.maximum(bands, 0)
+
+    tract_pct = pct[:, band_idx]
+    mode_income = income[np.arange(len(income)), level_idx]
+    mode = mode_income[None, None, :] - ami[:, level_idx][:, None, :] * tract_pct[None, :, :]
+    mode = np.where(found_level & found_band, mode, np.nan)
+
+    weighted = (income * shares).sum(axis = 1)[None, None, :] - (ami @ shares.T)[:, None, :] * tract_pct[None, :, :]
+    weighted = np.where(found_band, weighted, np.nan)
+    return mode, weighted
+
+
+def scenario_table(data, ami_schedules, pct_schedules):
+    # Long-format table of mode_diff and weighted_avg for every tract in data under every
+    # combination of the named AMI schedules and band definitions, e.g.
+    # scenario_table(combined_data, {'2019': ami_levels, '2020': ami_2020}, {'current': pct_ami})
+    income, shares, levels, bands = gap_inputs(data)
+    mode, weighted = scenario_gaps(income, shares, levels, bands, list(ami_schedules.values()), list(pct_schedules.values()))
+    n, m, t = mode.shape
+    return pd.DataFrame({
+        'ami_schedule': np.repeat(np.asarray(list(ami_schedules), dtype = object), m * t),
+        'pct_schedule': np.tile(np.repeat(np.asarray(list(pct_schedules), dtype = object), t), n),
+        'Tract Key': np.tile(data['Tract Key'].to_numpy(), n * m),
+        'mode_diff': mode.ravel(),
+        'weighted_avg': weighted.ravel(),
+    })
@@ -0,0 +1,230 @@
+# Every stage of the analysis timed on its own, on synthetic data at 1x, 10x and 100x
+# today's size. Each stage gets the real output of the stages before it, computed once per
+# process and not timed. Run with asv (see asv.conf.json) or `python -m benchmarks.run`,
+# which also reports how each stage's time grows with the data.
+
+import os
+import tempfile
+
+from . import synthetic
+
+SCALES = [1, 10, 100]
+
+#second AMI schedule for the scenario stage, 3% above the 2019 one
+AMI_2020 = [77000, 88000, 99000, 109900, 118700, 127500, 140750]
+
+
+def load_housing(inputs):
+    from data_loaders import load_housing
+    return load_housing(inputs.paths['housing'])
+
+
+def load_income(inputs):
+    from data_loaders import load_income
+    return load_income(inputs.paths['income'])
+
+
+def load_family(inputs):
+    from data_loaders import load_family
+    return load_family(inputs.paths['family'])
+
+
+def row_hashes(inputs):
+    from housing_refresh import row_hashes
+    return row_hashes(inputs['load_housing'])
+
+
+def tract_locator(inputs):
+    from tract_geometry import TractLocator, load_tracts_geojson
+    return TractLocator(load_tracts_geojson(inputs.paths['geojson']))
+
+
+def clean_housing(inputs):
+    #buildings without coordinates go to an empty in-memory geocoder, so the address path runs without the network
+    from geocoding import GeocodeCache, StaticGeocoder
+    from housing_tracts import clean_housing
+    return clean_housing(inputs['load_housing'], inputs['tract_locator'], GeocodeCache(":memory:", StaticGeocoder()))
+
+
+def income_tracts(inputs):
+    from pipeline import income_tracts
+    return income_tracts(inputs['load_income'])
+
+
+def family_tracts(inputs):
+    from pipeline import family_tracts
+    return family_tracts(inputs['load_family'])
+
+
+def tract_unit_totals(inputs):
+    from tract_rollup import tract_unit_totals
+    return tract_unit_totals(inputs['clean_housing'])
+
+
+def impute_income(inputs):
+    from tract_imputation import impute_income
+    income_data = inputs['income_tracts']
+    return impute_income(income_data, income_data.index[income_data['Tract Key'].isin(inputs['clean_housing']['Tract Key'])])
+
+
+def impute_income_knn(inputs):
+    from tract_geometry import tract_centroids
+    from tract_imputation import impute_income_knn
+    income_data = inputs['income_tracts']
+    targets = income_data.index[income_data['Tract Key'].isin(inputs['clean_housing']['Tract Key'])]
+    return impute_income_knn(income_data, targets, k = 4, idw = True, centroids = tract_centroids(inputs.paths['geojson']))
+
+
+def imputed_tracts(inputs):
+    from pipeline import imputed_tracts
+    return imputed_tracts(inputs['clean_housing'], inputs['income_tracts'])
+
+
+def combine_tracts(inputs):
+    from pipeline import combine_tracts
+    return combine_tracts(inputs['clean_housing'], inputs['imputed_tracts'], inputs['family_tracts'])
+
+
+def tract_gaps(inputs):
+    from pipeline import tract_gaps
+    return tract_gaps(inputs['combine_tracts'])
+
+
+def scenarios(inputs):
+    from affordability import scenario_table
+    from pipeline import AMI_LEVELS, PCT_AMI
+    return scenario_table(inputs['combine_tracts'], {'2019': AMI_LEVELS, '2020': AMI_2020}, {'current': PCT_AMI})
+
+
+def export(inputs):
+    from pipeline import GAP_COLUMNS
+    path = os.path.join(inputs.directory, "tract_gaps.csv")
+    inputs['tract_gaps'][GAP_COLUMNS].to_csv(path, index = False)
+    return path
+
+
+#in pipeline order, grouped as loading, normalization, aggregation, imputation, gaps and export
+STAGES = {
+    'load_housing': load_housing,
+    'load_income': load_income,
+    'load_family': load_family,
+    'row_hashes': row_hashes,
+    'tract_locator': tract_locator,
+    'clean_housing': clean_housing,
+    'income_tracts': income_tracts,
+    'family_tracts': family_tracts,
+    'tract_unit_totals': tract_unit_totals,
+    'impute_income': impute_income,
+    'impute_income_knn': impute_income_knn,
+    'imputed_tracts': imputed_tracts,
+    'combine_tracts': combine_tracts,
+    'tract_gaps': tract_gaps,
+    'scenarios': scenarios,
+    'export': export,
+}
+
+
+class StageInputs:
+    # The output of every stage for one synthetic dataset, each computed the first time a
+    # later stage asks for it
+
+    def __init__(self, scale, seed=0):
+        self.paths = synthetic.dataset(scale, seed)
+        self.directory = tempfile.mkdtemp(prefix = "ami-bench-")
+        self.results = {}
+
+    def __getitem__(self, name):
+        if name not in self.results:
+            self.results[name] = STAGES[name](self)
+        return self.results[name]
+
+
+_inputs = {}
+
+
+def stage_inputs(scale, seed=0):
+    if (scale, seed) not in _inputs:
+        _inputs[scale, seed] = StageInputs(scale, seed)
+    return _inputs[scale, seed]
+
+
+class _StageBenchmark:
+    params = SCALES
+    param_names = ['scale']
+    timeout = 3600
+    stage = None
+
+    def setup(self, scale):
+        #one untimed run, which also builds everything the stage reads
+        self.inputs = stage_inputs(scale)
+        self.inputs[self.stage]
+
+    def time_stage(self, scale):
+        STAGES[self.stage](self.inputs)
+
+    def peakmem_stage(self, scale):
+        STAGES[self.stage](self.inputs)
+
+
+class LoadHousing(_StageBenchmark):
+    stage = 'load_housing'
+
+
+class LoadIncome(_StageBenchmark):
+    stage = 'load_income'
+
+
+class LoadFamily(_StageBenchmark):
+    stage = 'load_family'
+
+
+class RowHashes(_StageBenchmark):
+    stage = 'row_hashes'
+
+
+class TractLocator(_StageBenchmark):
+    stage = 'tract_locator'
+
+
+class CleanHousing(_StageBenchmark):
+    stage = 'clean_housing'
+
+
+class IncomeTracts(_StageBenchmark):
+    stage = 'income_tracts'
+
+
+class FamilyTracts(_StageBenchmark):
+    stage = 'family_tracts'
+
+
+class TractUnitTotals(_StageBenchmark):
+    stage = 'tract_unit_totals'
+
+
+class ImputeIncome(_StageBenchmark):
+    stage = 'impute_income'
+
+
+class ImputeIncomeKnn(_StageBenchmark):
+    stage = 'impute_income_knn'
+
+
+class ImputedTracts(_StageBenchmark):
+    stage = 'imputed_tracts'
+
+
+class CombineTracts(_StageBenchmark):
+    stage = 'combine_tracts'
+
+
+class TractGaps(_StageBenchmark):
+    stage = 'tract_gaps'
+
+
+class Scenarios(_StageBenchmark):
+    stage = 'scenarios'
+
+
+class Export(_StageBenchmark):
+    stage = 'export'
@@ -0,0 +1,75 @@
+# Time every stage at several data scales and report how its time grows, without asv:
+#
+#   python -m benchmarks.run                       1x and 10x
+#   python -m benchmarks.run --scales 1 10 100 --report bench_report.json
+#
+# The growth exponent between two scales is log(t2 / t1) / log(s2 / s1): about 1 for a stage
+# that scales linearly, 2 for a quadratic one. Stages whose exponent between the two largest
+# scales is above --max-exponent are flagged, and the exit status is 1 if there are any.
+
+import argparse
+import json
+import math
+import sys
+import time
+
+from .bench_stages import STAGES, StageInputs
+
+#stages faster than this at the smaller scale are too noisy to judge
+MIN_SECONDS = 0.005
+
+
+def time_stage(inputs, name, repeat):
+    inputs[name]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        STAGES[name](inputs)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def exponent(scale1, time1, scale2, time2):
+    if time1 < MIN_SECONDS or time2 <= 0:
+        return None
+    return math.log(time2 / time1) / math.log(scale2 / scale1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description = "Time each stage of the analysis on synthetic data at several scales.")
+    parser.add_argument('--scales', nargs = '+', type = float, default = [1, 10], help = "multiples of today's data size (default: %(default)s)")
+    parser.add_argument('--stages', nargs = '+', choices = list(STAGES), default = list(STAGES), metavar = 'STAGE', help = "stages to time (default: all)")
+    parser.add_argument('--repeat', type = int, default = 3, help = "runs per stage, the fastest is kept (default: %(default)s)")
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--max-exponent', type = float, default = 1.25, help = "flag stages growing faster than scale**this (default: %(default)s)")
+    parser.add_argument('--report', help = "also write the timings to this JSON file")
+    args = parser.parse_args(argv)
+
+    scales = sorted(int(scale) if scale == int(scale) else scale for scale in args.scales)
+    timings = {name: {} for name in args.stages}
+    for scale in scales:
+        inputs = StageInputs(scale, args.seed)
+        for name in args.stages:
+            timings[name][scale] = time_stage(inputs, name, args.repeat)
+            print("x" + str(scale), name, round(timings[name][scale], 4), "s", file = sys.stderr)
+
+    flagged = []
+    print("stage".ljust(20) + "".join(("x" + str(scale)).rjust(12) for scale in scales) + "exponent".rjust(12))
+    for name in args.stages:
+        times = timings[name]
+        growth = exponent(scales[-2], times[scales[-2]], scales[-1], times[scales[-1]]) if len(scales) > 1 else None
+        if growth is not None and growth > args.max_exponent:
+            flagged.append(name)
+        print(name.ljust(20) + "".join("{:12.4f}".format(times[scale]) for scale in scales) + ("-" if growth is None else "{:.2f}".format(growth)).rjust(12) + (" !" if name in flagged else ""))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'scales': scales, 'repeat': args.repeat, 'seed': args.seed, 'seconds': timings, 'superlinear': flagged}, f, indent = 1)
+    if flagged:
+        print("growing faster than scale**" + str(args.max_exponent) + ":", " ".join(flagged))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# Synthetic inputs in the same formats as the real ones, at any multiple of today's size:
+# an HPD-style Housing New York building file, the ACS S1903 (median income) and B11016
+# (family size) downloads with their second header row and every other column, and a square
+# grid of tract polygons standing in for the NYC tract GeoJSON.
+#
+# Scale 1 is about the size of the 2019 files (5,362 buildings in 2,167 tracts). Missing data
+# follows the real files: ACS incomes can be "-" (missing), "2,500-" (bottom coded) or
+# "250,000+" (top coded), some buildings have neither a tract nor coordinates (confidential
+# sites, dropped by the analysis) and a few have coordinates but "Not Found" as the tract.
+
+import csv
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+BUILDINGS = 5362
+TRACTS = 2167
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+BOROUGHS = ['Manhattan', 'Bronx', 'Brooklyn', 'Queens', 'Staten Island']
+COUNTIES = ['061', '005', '047', '081', '085']
+COUNTY_NAMES = ['New York County', 'Bronx County', 'Kings County', 'Queens County', 'Richmond County']
+#share of tracts and buildings in each borough, roughly as in the real files
+TRACT_SHARES = [0.13, 0.16, 0.35, 0.31, 0.05]
+BUILDING_SHARES = [0.18, 0.24, 0.41, 0.12, 0.05]
+
+#the bounding box the tract grid covers
+LATS = (40.50, 40.91)
+LONS = (-74.25, -73.70)
+
+INCOME_ESTIMATES = ['S1903_C03_024E', 'S1903_C03_025E', 'S1903_C03_026E', 'S1903_C03_027E', 'S1903_C03_028E', 'S1903_C03_029E', 'S1903_C03_034E']
+HOUSING_HEADER = ['Project ID', 'Project Name', 'Project Start Date', 'Project Completion Date', 'Building ID', 'Number', 'Street', 'Borough', 'Postcode', 'BBL', 'BIN', 'Community Board', 'Council District', 'Census Tract', 'NTA - Neighborhood Tabulation Area', 'Latitude', 'Longitude', 'Latitude (Internal)', 'Longitude (Internal)', 'Building Completion Date', 'Reporting Construction Type', 'Extended Affordability Only', 'Prevailing Wage Status', 'Extremely Low Income Units', 'Very Low Income Units', 'Low Income Units', 'Moderate Income Units', 'Middle Income Units', 'Other Income Units', 'Studio Units', '1-BR Units', '2-BR Units', '3-BR Units', '4-BR Units', '5-BR Units', '6-BR+ Units', 'Unknown-BR Units', 'Counted Rental Units', 'Counted Homeownership Units', 'All Counted Units', 'Total Units']
+
+#rows are written in chunks, so 100x files don't have to be built in memory at once
+CHUNK = 20000
+
+
+def tract_table(scale=1, seed=0):
+    # One row per synthetic tract: borough index, 6 digit tract number and the grid cell of its
+    # polygon. Most tract numbers end in 00 like real ones, the rest are split tracts (.01-.09).
+    rng = np.random.default_rng(seed)
+    n = int(round(TRACTS * scale))
+    boros = np.repeat(np.arange(5), np.diff(np.round(np.cumsum([0] + TRACT_SHARES) * n).astype(int)))
+    #tract numbers 1.00 to 9999.09, three in four of them whole
+    pool = np.arange(100, 1000000, 100)[:, None] + np.arange(10)
+    weights = np.where(np.arange(10) == 0, 0.75, 0.25 / 9) * np.ones(pool.shape)
+    numbers = np.empty(n, dtype = np.int64)
+    for boro in range(5):
+        rows = np.flatnonzero(boros == boro)
+        numbers[rows] = np.sort(rng.choice(pool.ravel(), size = len(rows), replace = False, p = weights.ravel() / weights.sum()))
+    tracts = pd.DataFrame({'boro': boros, 'tract': numbers})
+    side = math.ceil(math.sqrt(len(tracts)))
+    tracts['row'] = np.arange(len(tracts)) // side
+    tracts['col'] = np.arange(len(tracts)) % side
+    tracts.attrs['side'] = side
+    return tracts
+
+
+def cell_bounds(tracts):
+    #(south, west, north, east) of every tract's grid cell
+    side = tracts.attrs['side']
+    height = (LATS[1] - LATS[0]) / side
+    width = (LONS[1] - LONS[0]) / side
+    south = LATS[0] + tracts['row'].to_numpy() * height
+    west = LONS[0] + tracts['col'].to_numpy() * width
+    return south, west, south + height, west + width
+
+
+def write_geojson(path, tracts):
+    south, west, north, east = cell_bounds(tracts)
+    with open(path, 'w') as f:
+        f.write('{"type": "FeatureCollection", "features": [')
+        for i, (boro, tract) in enumerate(zip(tracts['boro'], tracts['tract'])):
+            ring = [[west[i], south[i]], [east[i], south[i]], [east[i], north[i]], [west[i], north[i]], [west[i], south[i]]]
+            properties = {'ct2010': str(tract).zfill(6), 'boro_code': str(boro + 1), 'boro_ct2010': str(boro + 1) + str(tract).zfill(6)}
+            f.write(("," if i else "") + json.dumps({'type': 'Feature', 'properties': properties, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}))
+        f.write(']}')
+
+
+def geo_ids(tracts):
+    return ["1400000US36" + COUNTIES[boro] + str(tract).zfill(6) for boro, tract in zip(tracts['boro'], tracts['tract'])]
+
+
+def area_names(tracts):
+    names = []
+    for boro, tract in zip(tracts['boro'], tracts['tract']):
+        number = str(tract // 100) + ("" if tract % 100 == 0 else "." + str(tract % 100).zfill(2))
+        names.append("Census Tract " + number + ", " + COUNTY_NAMES[boro] + ", New York")
+    return names
+
+
+def income_strings(rng, n, missing, bottom_coded, top_coded):
+    #ACS median income cells: comma formatted dollars plus the missing and top/bottom code markers
+    values = np.clip(rng.lognormal(11.1, 0.6, n), 2500, 250000).astype(int)
+    cells = np.array(["{:,}".format(value) for value in values], dtype = object)
+    draw = rng.random(n)
+    cells[draw < missing] = "-"
+    cells[(draw >= missing) & (draw < missing + bottom_coded)] = "2,500-"
+    cells[(draw >= missing + bottom_coded) & (draw < missing + bottom_coded + top_coded)] = "250,000+"
+    return cells
+
+
+def write_income(path, tracts, rng, missing=0.1, bottom_coded=0.005, top_coded=0.02):
+    columns = ["S1903_C0" + str(c) + "_" + str(i).zfill(3) + kind for c in (1, 2, 3) for i in range(1, 41) for kind in "EM"]
+    positions = [columns.index(col) for col in INCOME_ESTIMATES]
+    with open(path, 'w', newline = "") as f:
+        writer = csv.writer(f, quoting = csv.QUOTE_ALL)
+        writer.writerow(['GEO_ID', 'NAME'] + columns)
+        writer.writerow(['id', 'Geographic Area Name'] + ["Estimate!!" + col for col in columns])
+        ids, names = geo_ids(tracts), area_names(tracts)
+        for start in range(0, len(tracts), CHUNK):
+            stop = min(start + CHUNK, len(tracts))
+            #every other column gets plausible filler; only the estimates the analysis reads matter
+            filler = rng.integers(0, 5000, size = (stop - start, len(columns))).astype(str).astype(object)
+            for position in positions:
+                filler[:, position] = income_strings(rng, stop - start, missing, bottom_coded, top_coded)
+            for i in range(stop - start):
+                writer.writerow([ids[start + i], names[start + i]] + list(filler[i]))
+
+
+def write_family(path, tracts, rng, empty=0.01):
+    columns = ["B11016_" + str(i).zfill(3) + kind for i in range(1, 17) for kind in "EM"]
+    with open(path, 'w', newline = "") as f:
+        writer = csv.writer(f, quoting = csv.QUOTE_ALL)
+        writer.writerow(columns + ['GEO_ID', 'NAME'])
+        writer.writerow(["Estimate!!" + col for col in columns] + ['id', 'Geographic Area Name'])
+        ids, names = geo_ids(tracts), area_names(tracts)
+        for start in range(0, len(tracts), CHUNK):
+            stop = min(start + CHUNK, len(tracts))
+            n = stop - start
+            #household counts for 2-7+ person families (B11016_003-008) and 1-7+ person non-family households (010-016)
+            family = rng.poisson(rng.uniform(20, 400, (n, 1)) * np.array([0.4, 0.25, 0.18, 0.1, 0.04, 0.03]))
+            nonfamily = rng.poisson(rng.uniform(10, 300, (n, 1)) * np.array([0.8, 0.15, 0.03, 0.01, 0.005, 0.003, 0.002]))
+            family[rng.random(n) < empty] = 0
+            nonfamily[(family.sum(axis = 1) == 0)] = 0
+            estimates = np.column_stack([family.sum(axis = 1) + nonfamily.sum(axis = 1), family.sum(axis = 1), family, nonfamily.sum(axis = 1), nonfamily])
+            margins = rng.integers(10, 200, estimates.shape)
+            cells = np.empty((n, len(columns)), dtype = np.int64)
+            cells[:, 0::2] = estimates
+            cells[:, 1::2] = margins
+            for i in range(n):
+                writer.writerow([str(value) for value in cells[i]] + [ids[start + i], names[start + i]])
+
+
+def hpd_tract(tract):
+    #HPD writes tracts without the decimal point or leading zeros, e.g. 017702 as 17702 and 000100 as 1
+    return str(tract // 100) if tract % 100 == 0 else str(tract)
+
+
+def write_housing(path, tracts, rng, scale=1, confidential=0.2, not_found=0.002):
+    n = int(round(BUILDINGS * scale))
+    boros = rng.choice(5, size = n, p = BUILDING_SHARES)
+    #each building goes to a random tract of its borough, with a point inside that tract's cell
+    rows = np.empty(n, dtype = np.int64)
+    for boro in range(5):
+        candidates = np.flatnonzero(tracts['boro'].to_numpy() == boro)
+        rows[boros == boro] = rng.choice(candidates, size = (boros == boro).sum())
+    south, west, north, east = cell_bounds(tracts)
+    lats = np.round(south[rows] + (north[rows] - south[rows]) * rng.uniform(0.1, 0.9, n), 6)
+    lons = np.round(west[rows] + (east[rows] - west[rows]) * rng.uniform(0.1, 0.9, n), 6)
+    #confidential sites have no tract or location at all; a few located buildings have "Not Found" as the tract
+    draw = rng.random(n)
+    hidden = draw < confidential
+    lats[hidden] = np.nan
+    lons[hidden] = np.nan
+    tract_cells = np.array([hpd_tract(tract) for tract in tracts['tract'].to_numpy()[rows]], dtype = object)
+    tract_cells[hidden] = ""
+    tract_cells[(draw >= confidential) & (draw < confidential + not_found)] = "Not Found"
+
+    units = rng.poisson(rng.gamma(0.6, 15, (n, 1)) * np.array([0.2, 0.2, 0.3, 0.1, 0.1, 0.1]))
+    bedrooms = rng.multinomial(units.sum(axis = 1), [0.2, 0.35, 0.3, 0.1, 0.03, 0.01, 0.005, 0.005])
+    rental = np.where(rng.random(n) < 0.9, units.sum(axis = 1), 0)
+    counted = units.sum(axis = 1)
+
+    data = pd.DataFrame({
+        'Project ID': rng.integers(40000, 70000, n),
+        'Project Name': "PROJECT " + pd.Series(rng.integers(0, 10 ** 6, n)).astype(str),
+        'Project Start Date': "06/30/2021",
+        'Project Completion Date': "",
+        'Building ID': np.arange(900000, 900000 + n),
+        'Number': np.where(hidden, "", rng.integers(1, 3000, n).astype(str)),
+        'Street': np.where(hidden, "", "STREET " + rng.integers(1, 5000, n).astype(str).astype(object)),
+        'Borough': np.array(BOROUGHS)[boros],
+        'Postcode': pd.array(rng.integers(10001, 11698, n), dtype = 'Int64'),
+        'BBL': "", 'BIN': "", 'Community Board': "", 'Council District': "",
+        'Census Tract': tract_cells,
+        'NTA - Neighborhood Tabulation Area': "",
+        'Latitude': lats, 'Longitude': lons,
+        'Latitude (Internal)': lats, 'Longitude (Internal)': lons,
+        'Building Completion Date': "",
+        'Reporting Construction Type': np.where(rng.random(n) < 0.5, "New Construction", "Preservation"),
+        'Extended Affordability Only': "No",
+        'Prevailing Wage Status': "Non Prevailing Wage",
+    })
+    for col, i in zip(HOUSING_HEADER[23:29], range(6)):
+        data[col] = units[:, i]
+    for col, i in zip(HOUSING_HEADER[29:37], range(8)):
+        data[col] = bedrooms[:, i]
+    data['Counted Rental Units'] = rental
+    data['Counted Homeownership Units'] = counted - rental
+    data['All Counted Units'] = counted
+    data['Total Units'] = counted + rng.integers(0, 3, n)
+    data.loc[hidden, 'Postcode'] = pd.NA
+    data[HOUSING_HEADER].to_csv(path, index = False)
+
+
+def generate(directory, scale=1, seed=0, missing_income=0.1, bottom_coded=0.005, top_coded=0.02, confidential=0.2, not_found=0.002):
+    # Write all four inputs for `scale` times today's data to directory and return their paths
+    # (keys housing, income, family and geojson).
+    os.makedirs(directory, exist_ok = True)
+    rng = np.random.default_rng(seed)
+    tracts = tract_table(scale, seed)
+    paths = {name: os.path.join(directory, name + ext) for name, ext in [('housing', ".csv"), ('income', ".csv"), ('family', ".csv"), ('geojson', ".geojson")]}
+    write_geojson(paths['geojson'], tracts)
+    write_income(paths['income'], tracts, rng, missing_income, bottom_coded, top_coded)
+    write_family(paths['family'], tracts, rng)
+    write_housing(paths['housing'], tracts, rng, scale, confidential, not_found)
+    return paths
+
+
+def dataset(scale=1, seed=0, directory=DATA_DIR, **missingness):
+    #generate(), writing to a folder named after the settings and reusing it if it is already there
+    name = "x" + str(scale) + "-seed" + str(seed) + "".join("-" + key + str(value) for key, value in sorted(missingness.items()))
+    path = os.path.join(directory, name)
+    paths = {name: os.path.join(path, name + ext) for name, ext in [('housing', ".csv"), ('income', ".csv"), ('family', ".csv"), ('geojson', ".geojson")]}
+    if not all(os.path.exists(p) for p in paths.values()):
+        generate(path + ".tmp", scale, seed, **missingness)
+        if os.path.exists(path):
+            import shutil
+            shutil.rmtree(path)
+        os.replace(path + ".tmp", path)
+    return paths
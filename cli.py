@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Command line entry point for running the analysis as a batch job, e.g.
+#
+#   python cli.py --headless                       every output, nothing shown on screen
+#   python cli.py --headless --outputs gaps        only the gaps CSV (plotly is never imported)
+#   python cli.py --outputs figures --figures heatmap_modediff bar_modediff
+#   python cli.py --headless --outputs panel       gaps for every ACS vintage, by building completion year
+#   python cli.py --headless --outputs imputed --impute-all-tracts   imputed median incomes of every tract
+#
+# It runs the same steps as the notebook (ami_tract_analysis.py) through pipeline.py, without
+# the notebook's displays.
+
+import argparse
+import sys
+
+OUTPUTS = ['gaps', 'scenarios', 'figures', 'panel', 'imputed']
+DEFAULT_OUTPUTS = ['gaps', 'scenarios', 'figures']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description = "Compare minimum income requirements of Housing New York units with census tract median incomes.")
+    parser.add_argument('--headless', action = 'store_true', help = "batch mode: write the outputs without showing any figures")
+    parser.add_argument('--outputs', nargs = '+', choices = OUTPUTS, default = DEFAULT_OUTPUTS, help = "outputs to produce (default: %(default)s)")
+    parser.add_argument('--figures', nargs = '+', metavar = 'NAME', help = "only render these figures (see figures.FIGURES)")
+    parser.add_argument('--gaps-csv', default = "tract_gaps.csv", help = "path of the gaps CSV (default: %(default)s)")
+    parser.add_argument('--scenarios-csv', default = "tract_scenarios.csv", help = "path of the scenarios CSV (default: %(default)s)")
+    parser.add_argument('--panel-csv', default = "tract_panel.csv", help = "path of the multi-year panel CSV (default: %(default)s)")
+    parser.add_argument('--imputed-csv', default = "tract_incomes_imputed.csv", help = "path of the imputed median incomes CSV (default: %(default)s)")
+    parser.add_argument('--panel-years', nargs = '+', type = int, metavar = 'YEAR', help = "ACS vintages for the panel (default: every one found)")
+    parser.add_argument('--panel-match', choices = ['completion', 'cumulative', 'all'], default = 'completion', help = "how buildings are matched to vintages (default: %(default)s)")
+    parser.add_argument('--impute-all-tracts', action = 'store_true', help = "impute every census tract for --outputs imputed, not only the ones with buildings")
+    parser.add_argument('--impute', choices = ['tract_number', 'centroid'], default = 'tract_number', help = "how nearest tracts are found for missing incomes: by tract number in the borough, or by centroid distance (default: %(default)s)")
+    parser.add_argument('--impute-neighbors', type = int, default = 2, metavar = 'K', help = "neighbors averaged per missing income with --impute centroid (default: %(default)s)")
+    parser.add_argument('--impute-idw', action = 'store_true', help = "weight the --impute centroid neighbors by inverse distance")
+    parser.add_argument('--impute-cross-boro', action = 'store_true', help = "let --impute centroid use neighbors in other boroughs")
+    parser.add_argument('--incremental-refresh', action = 'store_true', help = "update the snapshot of the previous Housing New York release instead of rebuilding")
+    parser.add_argument('--no-snapshots', action = 'store_true', help = "always rebuild the cleaned tables, and don't save them")
+    parser.add_argument('--engine', choices = ['c', 'pyarrow'], help = "CSV parser engine")
+    parser.add_argument('--workers', type = int, help = "figure rendering and ACS vintage loading processes (default: one per core)")
+    parser.add_argument('--force', action = 'store_true', help = "render figures even if they haven't changed")
+    parser.add_argument('--self-contained-maps', action = 'store_true', help = "embed the geometry and plotly.js in every map")
+    parser.add_argument('--plotlyjs', choices = ['directory', 'cdn'], default = 'directory', help = "where compact maps load plotly.js from (default: %(default)s)")
+    parser.add_argument('--profile', metavar = 'REPORT', help = "write a JSON report of every stage's wall/CPU time, peak memory and row counts")
+    parser.add_argument('--profile-trace', metavar = 'DIR', help = "also write a profiler trace of every top level stage to DIR")
+    parser.add_argument('--profile-tracer', choices = ['cprofile', 'pyinstrument'], default = 'cprofile', help = "profiler for --profile-trace (default: %(default)s)")
+    parser.add_argument('--no-profile-memory', action = 'store_true', help = "don't track peak memory (tracemalloc slows the run down)")
+    return parser.parse_args(argv)
+
+
+def imputation_options(args):
+    #impute_income options for the --impute flags, None for the original tract number method
+    if args.impute == 'tract_number':
+        return None
+    return {'method': args.impute, 'k': args.impute_neighbors, 'idw': args.impute_idw, 'cross_boro': args.impute_cross_boro}
+
+
+def write_figures(combined_data, args):
+    from figures import FIGURES, build_figure, render_figures
+    from profiling import stage
+    from tract_geometry import SIMPLIFY_TOLERANCE, tract_geojson
+    from tract_keys import to_boro_ct2010
+
+    names = args.figures or list(FIGURES)
+    unknown = [name for name in names if name not in FIGURES]
+    if unknown:
+        raise SystemExit("unknown figures: " + ", ".join(unknown) + " (choose from " + ", ".join(FIGURES) + ")")
+
+    #every tract is drawn, those without gaps too, like the notebook; the maps match tracts on boro_ct2010
+    data = combined_data.assign(**{'Census Tract': to_boro_ct2010(combined_data['Tract Key'])})
+    shapes = None
+    if any(FIGURES[name]['kind'] != 'bar' for name in names):
+        with stage("tract_geojson") as s:
+            shapes = tract_geojson(data['Census Tract'], tolerance = SIMPLIFY_TOLERANCE)
+            s['features'] = len(shapes['features'])
+
+    rendered = render_figures(data, shapes, names, workers = args.workers, compact = not args.self_contained_maps, plotlyjs = args.plotlyjs, force = args.force)
+    print("rendered", len(rendered), "of", len(names), "figures:", " ".join(rendered) or "-")
+    if not args.headless:
+        for name in names:
+            build_figure(FIGURES[name], data, shapes).show()
+
+
+def run(args):
+    from profiling import stage
+
+    with stage("import"):
+        import pipeline
+
+    housing_data, income_data, family_data, income_data_imputed, combined_data = pipeline.cleaned_tables(args.impute_all_tracts, args.incremental_refresh, use_snapshots = not args.no_snapshots, engine = args.engine, imputation = imputation_options(args))
+    combined_data = pipeline.tract_gaps(combined_data)
+
+    if 'gaps' in args.outputs:
+        with stage("write_gaps", rows_in = len(combined_data)):
+            combined_data[pipeline.GAP_COLUMNS].to_csv(args.gaps_csv, index = False)
+        print("wrote", args.gaps_csv)
+    if 'scenarios' in args.outputs:
+        from affordability import scenario_table
+        with stage("scenarios", rows_in = len(combined_data)) as s:
+            scenarios = scenario_table(combined_data, {'2019': pipeline.AMI_LEVELS}, {'2019': pipeline.PCT_AMI})
+            scenarios.to_csv(args.scenarios_csv, index = False)
+            s['rows_out'] = len(scenarios)
+        print("wrote", args.scenarios_csv)
+    if 'figures' in args.outputs:
+        with stage("figures"):
+            write_figures(combined_data, args)
+    if 'imputed' in args.outputs:
+        with stage("write_imputed", rows_in = len(income_data_imputed)):
+            income_data_imputed[pipeline.IMPUTED_COLUMNS].to_csv(args.imputed_csv, index = False)
+        print("wrote", args.imputed_csv, "for", len(income_data_imputed), "tracts")
+    if 'panel' in args.outputs:
+        from acs_panel import PANEL_COLUMNS, tract_panel
+        panel = tract_panel(housing_data, args.panel_years, args.workers, args.engine, match = args.panel_match)
+        panel.frame()[PANEL_COLUMNS].to_csv(args.panel_csv, index = False)
+        print("wrote", args.panel_csv, "for", ", ".join(str(year) for year in panel.years))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile is None and args.profile_trace is None:
+        run(args)
+        return 0
+
+    from profiling import RunProfile
+    with RunProfile(memory = not args.no_profile_memory, trace_dir = args.profile_trace, tracer = args.profile_tracer) as profile:
+        profile.info['argv'] = sys.argv[1:] if argv is None else list(argv)
+        run(args)
+    print("wrote", profile.write(args.profile or "run_report.json"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# Loaders for the three source datasets. Each one only parses the columns the analysis uses,
+# with explicit dtypes, so the wide ACS tables (hundreds of string columns) and the HPD
+# building list load quickly and without object columns where they can be avoided.
+# engine='pyarrow' uses the pyarrow CSV reader if it is installed.
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+from tract_rollup import UNIT_COLS
+
+HOUSING_PATH = "./Housing_New_York_Units_by_Building.csv"
+INCOME_PATH = "./ACS5YR2019_median_income.csv"
+FAMILY_PATH = "./ACSDT5Y2019_family_size.csv"
+
+HOUSING_COLUMNS = {
+    'Project ID': 'Int64',
+    'Building ID': 'Int64',
+    'Number': 'str',
+    'Street': 'str',
+    'Borough': 'category',
+    'Postcode': 'Int32',
+    'Census Tract': 'str',
+    'Latitude': 'float64',
+    'Longitude': 'float64',
+    'Building Completion Date': 'str',
+    **{col: 'Int32' for col in UNIT_COLS},
+    'Counted Rental Units': 'Int32',
+    'Counted Homeownership Units': 'Int32',
+    'All Counted Units': 'Int32',
+    'Total Units': 'Int32',
+}
+
+#median income by household size (S1903); these are read as text and parsed by parse_income
+INCOME_COLUMNS = {
+    'GEO_ID': 'str',
+    'S1903_C03_024E': 'str',
+    'S1903_C03_025E': 'str',
+    'S1903_C03_026E': 'str',
+    'S1903_C03_027E': 'str',
+    'S1903_C03_028E': 'str',
+    'S1903_C03_029E': 'str',
+    'S1903_C03_034E': 'str',
+}
+
+#household counts by family size (B11016)
+FAMILY_COLUMNS = {
+    'GEO_ID': 'str',
+    **{col: 'Int32' for col in ['B11016_001E', 'B11016_003E', 'B11016_004E', 'B11016_005E', 'B11016_006E', 'B11016_007E', 'B11016_008E', 'B11016_009E']},
+}
+
+
+def parse_income(values, with_top_coded=False):
+    # ACS median incomes as float32: "250,000+" becomes 250000, and the missing marker "-"
+    # and bottom code "2,500-" become NaN (both are imputed later on). with_top_coded also
+    # returns whether each value was the "250,000+" top code, which the number alone can't
+    # tell apart from a real (or later imputed) 250000.
+    strs = values.astype(str).str.replace(",", "", regex=False)
+    missing = strs.str.contains("-", regex=False) | values.isna()
+    parsed = pd.to_numeric(strs.str.replace("+", "", regex=False), errors='coerce').mask(missing).astype(np.float32)
+    if with_top_coded:
+        return parsed, strs.str.endswith("+") & ~missing
+    return parsed
+
+
+def read_acs(path, columns, engine=None):
+    #ACS downloads have a second header row of column descriptions, skipped here at parse time
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f))
+    #columns are picked by position, since the pyarrow engine can't combine names= with usecols=;
+    #both engines return them in file order
+    positions = sorted(header.index(col) for col in columns)
+    data = pd.read_csv(path, engine = engine, header = None, skiprows = 2, usecols = positions, dtype = str)
+    data.columns = [header[i] for i in positions]
+    return data[list(columns)].astype(columns)
+
+
+def load_housing(path=HOUSING_PATH, engine=None):
+    return pd.read_csv(path, engine = engine, usecols = list(HOUSING_COLUMNS), dtype = HOUSING_COLUMNS)
+
+
+def load_income(path=INCOME_PATH, engine=None):
+    data = read_acs(path, INCOME_COLUMNS, engine)
+    for col in INCOME_COLUMNS:
+        if col != 'GEO_ID':
+            data[col] = parse_income(data[col])
+    return data
+
+
+def load_family(path=FAMILY_PATH, engine=None):
+    return read_acs(path, FAMILY_COLUMNS, engine)
@@ -0,0 +1,194 @@
+# The analysis figures as declarative specs, and a rendering stage for them.
+#
+# Each spec names a plotly express chart, the options it is built with and the file it is
+# written to. render_figures builds and writes every figure whose inputs changed since the
+# last run (tracked by hashing the spec, the columns it uses and the map geometry) in a pool
+# of worker processes, each keeping one warm Kaleido renderer for the PNG exports.
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from profiling import stage
+
+OUTPUT_DIR = "graphs"
+
+#hashes of the last rendered version of every output file
+MANIFEST = os.path.join(OUTPUT_DIR, "figures.json")
+
+BAR_TITLE = "Minimum Income Requirement vs Median Income by Borough"
+MAP_TITLE = "Difference in Median Income and Minimum Income Requirement"
+
+MAP_OPTIONS = {
+    'locations': 'Census Tract',
+    'featureidkey': 'properties.boro_ct2010',
+    'hover_data': ['Census Tract'],
+    'title': MAP_TITLE,
+    'center': {'lat': 40.73, 'lon': -73.98},
+    'zoom': 9,
+    'mapbox_style': 'carto-positron',
+}
+
+FIGURES = {
+    'bar_modediff': {
+        'kind': 'bar',
+        'output': os.path.join(OUTPUT_DIR, "bar_modediff.png"),
+        'options': {'x': 'Boro', 'color': 'mode_diff_zero', 'title': BAR_TITLE, 'barmode': 'group',
+                    'labels': {'count': 'Number of Units', 'mode_diff_zero': "Requirement < Median Income", 'Boro': 'Borough'}},
+    },
+    'bar_avgdiff': {
+        'kind': 'bar',
+        'output': os.path.join(OUTPUT_DIR, "bar_avgdiff.png"),
+        'options': {'x': 'Boro', 'color': 'avg_diff_zero', 'title': BAR_TITLE, 'barmode': 'group',
+                    'labels': {'count': 'Number of Units', 'avg_diff_zero': "Requirement < Median Income", 'Boro': 'Borough'}},
+    },
+    'heatmap_modediff': {
+        'kind': 'choropleth',
+        'output': os.path.join(OUTPUT_DIR, "heatmap_modediff.html"),
+        'options': {**MAP_OPTIONS, 'color': 'mode_diff', 'range_color': [-10000, 10000], 'labels': {'mode_diff': 'Difference'}},
+        'layout': {'height': 700},
+    },
+    'heatmap_avgdiff': {
+        'kind': 'choropleth',
+        'output': os.path.join(OUTPUT_DIR, "heatmap_avgdiff.html"),
+        'options': {**MAP_OPTIONS, 'color': 'weighted_avg', 'range_color': [-10000, 10000], 'labels': {'mode_diff': 'Difference'}},
+        'layout': {'height': 700},
+    },
+    'heatmap_modediff2': {
+        'kind': 'choropleth',
+        'output': os.path.join(OUTPUT_DIR, "heatmap_modediff2.html"),
+        'options': {**MAP_OPTIONS, 'color': 'mode_diff_zero', 'labels': {'mode_diff_zero': 'Median Inc > Minimimum Inc Requirement'}},
+        'layout': {'height': 700},
+    },
+    'heatmap_avgdiff2': {
+        'kind': 'choropleth',
+        'output': os.path.join(OUTPUT_DIR, "heatmap_avgdiff2.html"),
+        'options': {**MAP_OPTIONS, 'color': 'avg_diff_zero', 'labels': {'avg_diff_zero': 'Median Inc > Minimimum Inc Requirement'}},
+        'layout': {'height': 700},
+    },
+    #all four heatmaps on one page, with buttons to switch between them
+    'heatmap_layers': {
+        'kind': 'layers',
+        'output': os.path.join(OUTPUT_DIR, "heatmap_layers.html"),
+        'layers': {'mode_diff': 'heatmap_modediff', 'weighted_avg': 'heatmap_avgdiff', 'mode_diff_zero': 'heatmap_modediff2', 'avg_diff_zero': 'heatmap_avgdiff2'},
+    },
+}
+
+
+def spec_columns(spec, figures=FIGURES):
+    #the data columns a figure is built from
+    if spec['kind'] == 'layers':
+        return sorted(set().union(*(spec_columns(figures[name], figures) for name in spec['layers'].values())))
+    options = spec['options']
+    columns = [options.get(key) for key in ('x', 'y', 'color', 'locations')] + list(options.get('hover_data', []))
+    return sorted(set(col for col in columns if col is not None))
+
+
+def build_figure(spec, data, geojson=None, figures=FIGURES):
+    import plotly.express as px
+
+    if spec['kind'] == 'bar':
+        fig = px.bar(data, **spec['options'])
+    elif spec['kind'] == 'choropleth':
+        fig = px.choropleth_mapbox(data, geojson = geojson, **spec['options'])
+    elif spec['kind'] == 'layers':
+        from map_export import layered_map
+        fig = layered_map({label: build_figure(figures[name], data, geojson, figures) for label, name in spec['layers'].items()})
+    else:
+        raise ValueError("unknown figure kind: " + str(spec['kind']))
+    if spec.get('layout'):
+        fig.update_layout(**spec['layout'])
+    return fig
+
+
+def write_figure(fig, spec, compact=True, plotlyjs='directory'):
+    os.makedirs(os.path.dirname(spec['output']) or ".", exist_ok = True)
+    if not spec['output'].endswith(".html"):
+        fig.write_image(spec['output'])
+    elif compact and spec['kind'] != 'bar':
+        from map_export import write_map_html
+        write_map_html(fig, spec['output'], plotlyjs = plotlyjs)
+    else:
+        fig.write_html(spec['output'])
+
+
+def figure_hash(spec, data, geojson=None, figures=FIGURES, settings=()):
+    # Changes whenever the figure would: its spec (and the specs of any layers), the values
+    # of the columns it uses, the geometry for maps, the render settings and this module
+    digest = hashlib.sha256()
+    layers = [figures[name] for name in spec.get('layers', {}).values()]
+    digest.update(json.dumps([spec] + layers + [list(settings)], sort_keys = True, default = str).encode())
+    columns = spec_columns(spec, figures)
+    digest.update(pd.util.hash_pandas_object(data[columns], index = False).to_numpy().tobytes())
+    digest.update(json.dumps(columns).encode())
+    if spec['kind'] != 'bar':
+        digest.update(json.dumps(geojson, sort_keys = True).encode())
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+_worker_geojson = None
+
+
+def _start_worker(geojson):
+    # Runs once in every worker process: keep the geometry, and start one Kaleido renderer to
+    # reuse for every image this worker writes (Kaleido 1.x; older Kaleido already keeps one
+    # per process once the first image is written)
+    global _worker_geojson
+    _worker_geojson = geojson
+    try:
+        import kaleido
+    except ImportError:
+        return
+    if hasattr(kaleido, 'start_sync_server'):
+        kaleido.start_sync_server(silence_warnings = True)
+
+
+def _render(spec, data, figures, compact, plotlyjs):
+    write_figure(build_figure(spec, data, _worker_geojson, figures), spec, compact, plotlyjs)
+    return spec['output']
+
+
+def render_figures(data, geojson=None, names=None, figures=FIGURES, workers=None, compact=True, plotlyjs='directory', manifest=MANIFEST, force=False):
+    # Render the named figures (all of them by default) from data, skipping the ones whose
+    # hash matches the last render and whose output still exists. Returns the names rendered.
+    names = list(figures) if names is None else list(names)
+    settings = (compact, plotlyjs)
+    previous = {}
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            previous = json.load(f)
+
+    with stage("figure_hashes", figures = len(names)):
+        hashes = {name: figure_hash(figures[name], data, geojson, figures, settings) for name in names}
+    todo = [name for name in names if force or previous.get(figures[name]['output']) != hashes[name] or not os.path.exists(figures[name]['output'])]
+
+    maps = [name for name in names if figures[name]['kind'] != 'bar']
+    if compact and maps and geojson is not None:
+        from map_export import GEOMETRY_FILE, write_geometry
+        directory = os.path.dirname(figures[maps[0]]['output'])
+        if any(name in todo for name in maps) or not os.path.exists(os.path.join(directory, GEOMETRY_FILE)):
+            with stage("write_geometry"):
+                write_geometry(geojson, directory)
+
+    tasks = [(figures[name], data[spec_columns(figures[name], figures)], figures, compact, plotlyjs) for name in todo]
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    with stage("render", figures = len(tasks), workers = workers):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers = workers, initializer = _start_worker, initargs = (geojson,)) as pool:
+                list(pool.map(_render, *zip(*tasks)))
+        elif tasks:
+            _start_worker(geojson)
+            for task in tasks:
+                _render(*task)
+
+    for name in todo:
+        previous[figures[name]['output']] = hashes[name]
+    os.makedirs(os.path.dirname(manifest) or ".", exist_ok = True)
+    with open(manifest, 'w') as f:
+        json.dump(previous, f, indent = 1, sort_keys = True)
+    return todo
@@ -0,0 +1,214 @@
+# Census tract geocoding with a persistent on-disk cache.
+#
+# Lookups are keyed by rounded (lat, lon) or by a normalized one line address and stored in
+# a small SQLite file, so a building only ever has to be geocoded once. Tracts are returned
+# as the 6 digit census TRACT code (e.g. "017702"), or None when no tract was found.
+
+import math
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_PATH = "./geocode_cache.sqlite"
+
+#per-row lookup statuses: a tract was found, no tract was found (or there was nothing to look
+#up), the lookup failed, or the lookup timed out
+STATUSES = ['hit', 'miss', 'error', 'timeout']
+
+
+class CensusGeocoder:
+    # The Census Bureau geocoder, through the censusgeocode package. censusgeocode is only
+    # imported once something actually has to be looked up. url overrides the geocoder
+    # endpoint (e.g. "http://127.0.0.1:8000/geocoder" for a local mock server).
+
+    def __init__(self, timeout=3, url=None, benchmark=None, vintage=None):
+        self.timeout = timeout
+        self.url = url
+        self.benchmark = benchmark
+        self.vintage = vintage
+        self._client = None
+
+    def client(self):
+        if self._client is None:
+            import censusgeocode as cg
+            self._client = cg.CensusGeocode(benchmark = self.benchmark, vintage = self.vintage)
+            if self.url is not None:
+                self._client._url = self.url.rstrip("/") + "/{returntype}/{searchtype}"
+        return self._client
+
+    def coordinates(self, lat, lon):
+        response = self.client().coordinates(x = lon, y = lat, returntype = 'geographies', timeout = self.timeout)
+        tracts = response.get('Census Tracts') or []
+        return str(tracts[0]['TRACT']) if tracts else None
+
+    def address(self, address):
+        response = self.client().onelineaddress(address, returntype = 'geographies', timeout = self.timeout)
+        if len(response) == 0:
+            return None
+        tracts = response[0]['geographies'].get('Census Tracts') or []
+        return str(tracts[0]['TRACT']) if tracts else None
+
+
+class TokenBucket:
+    # Thread-safe rate limiter allowing `rate` lookups per second on average, in bursts of
+    # up to `capacity`.
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_timeout(exc):
+    #covers socket/asyncio timeouts as well as requests' Timeout, ConnectTimeout and ReadTimeout
+    return isinstance(exc, TimeoutError) or any(cls.__name__.endswith('Timeout') for cls in type(exc).__mro__)
+
+
+class StaticGeocoder:
+    # A local geocoder answering from fixed lookups, for tests and offline runs. Keys are
+    # rounded (lat, lon) tuples and normalized addresses, as produced by the cache.
+
+    def __init__(self, coordinates=None, addresses=None, precision=6):
+        self.precision = precision
+        self._coordinates = {coordinate_key(lat, lon, precision): tract for (lat, lon), tract in (coordinates or {}).items()}
+        self._addresses = {normalize_address(address): tract for address, tract in (addresses or {}).items()}
+        self.calls = 0
+
+    def coordinates(self, lat, lon):
+        self.calls += 1
+        return self._coordinates.get(coordinate_key(lat, lon, self.precision))
+
+    def address(self, address):
+        self.calls += 1
+        return self._addresses.get(normalize_address(address))
+
+
+def coordinate_key(lat, lon, precision=6):
+    #store coordinates as scaled integers so the cache key doesn't depend on float formatting
+    if math.isnan(float(lat)) or math.isnan(float(lon)):
+        return None
+    scale = 10 ** precision
+    return (int(round(float(lat) * scale)), int(round(float(lon) * scale)))
+
+
+def normalize_address(address):
+    address = re.sub(r"[^\w\s,-]", "", str(address).upper())
+    address = re.sub(r"\s*,\s*", ", ", address)
+    return re.sub(r"\s+", " ", address).strip(" ,")
+
+
+class GeocodeCache:
+    # Batch tract lookups backed by a SQLite cache file. Each batch is deduplicated, only the
+    # keys missing from the cache are sent to the geocoder, and the new results are written
+    # back in one transaction. With offline=True nothing is ever sent to the geocoder.
+    #
+    # Uncached keys are looked up by `workers` threads, limited to `rate` lookups per second
+    # if given. Failed lookups are retried `retries` times, waiting backoff, 2*backoff, ...
+    # seconds in between. Lookups that still fail are not cached, so they are retried on
+    # the next run.
+    #
+    # stats counts the unique keys answered from the cache ('cached') or sent to the geocoder
+    # ('looked_up'), and the status of every row returned.
+
+    def __init__(self, path=CACHE_PATH, geocoder=None, precision=6, offline=False, workers=1, rate=None, retries=2, backoff=0.5):
+        self.path = path
+        self.geocoder = geocoder if geocoder is not None else CensusGeocoder()
+        self.precision = precision
+        self.offline = offline
+        self.workers = workers
+        self.limiter = TokenBucket(rate) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS coordinates (lat INTEGER, lon INTEGER, tract TEXT, PRIMARY KEY (lat, lon))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS addresses (address TEXT PRIMARY KEY, tract TEXT)")
+        self.conn.commit()
+        self._coordinates = None
+        self._addresses = None
+        self.stats = dict.fromkeys(['cached', 'looked_up'] + STATUSES, 0)
+
+    def coordinate_tracts(self, lats, lons, with_status=False):
+        if self._coordinates is None:
+            self._coordinates = {(lat, lon): tract for lat, lon, tract in self.conn.execute("SELECT lat, lon, tract FROM coordinates")}
+        keys = [coordinate_key(lat, lon, self.precision) for lat, lon in zip(lats, lons)]
+        scale = 10 ** self.precision
+
+        def lookup(key):
+            return self.geocoder.coordinates(key[0] / scale, key[1] / scale)
+
+        new, failed = self._resolve(keys, self._coordinates, lookup)
+        if new:
+            self.conn.executemany("INSERT OR REPLACE INTO coordinates VALUES (?, ?, ?)", [(key[0], key[1], tract) for key, tract in new.items()])
+            self.conn.commit()
+        return self._results(keys, self._coordinates, failed, with_status)
+
+    def address_tracts(self, addresses, with_status=False):
+        if self._addresses is None:
+            self._addresses = dict(self.conn.execute("SELECT address, tract FROM addresses"))
+        keys = [normalize_address(address) for address in addresses]
+        new, failed = self._resolve(keys, self._addresses, self.geocoder.address)
+        if new:
+            self.conn.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?)", list(new.items()))
+            self.conn.commit()
+        return self._results(keys, self._addresses, failed, with_status)
+
+    def _results(self, keys, cached, failed, with_status):
+        tracts = [cached.get(key) for key in keys]
+        statuses = [failed.get(key, 'miss' if tract is None else 'hit') for key, tract in zip(keys, tracts)]
+        for status in statuses:
+            self.stats[status] += 1
+        return (tracts, statuses) if with_status else tracts
+
+    def _lookup(self, lookup, key):
+        #returns (tract, None) on success or (None, 'error'/'timeout') once the retries run out
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return lookup(key), None
+            except Exception as exc:
+                status = 'timeout' if is_timeout(exc) else 'error'
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        return None, status
+
+    def _resolve(self, keys, cached, lookup):
+        new = {}
+        failed = {}
+        if self.offline:
+            return new, failed
+        unique = [key for key in dict.fromkeys(keys) if key is not None]
+        todo = [key for key in unique if key not in cached]
+        self.stats['cached'] += len(unique) - len(todo)
+        self.stats['looked_up'] += len(todo)
+        if self.workers > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(max_workers = self.workers) as pool:
+                results = list(pool.map(lambda key: self._lookup(lookup, key), todo))
+        else:
+            results = [self._lookup(lookup, key) for key in todo]
+        for key, (tract, status) in zip(todo, results):
+            if status is None:
+                new[key] = tract
+            else:
+                failed[key] = status
+        cached.update(new)
+        return new, failed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,90 @@
+# Incremental updates for new releases of the Housing New York dataset.
+#
+# HPD republishes the building list regularly and usually only a few buildings change. Rather
+# than cleaning every building again, a new release is compared with the cleaned snapshot
+# building by building (by Project ID and Building ID, plus a hash of the raw record), only
+# the added and changed buildings are cleaned, and only the tracts those buildings belonged
+# to before or belong to now are rebuilt in the combined tract table.
+
+import numpy as np
+import pandas as pd
+
+from affordability import NO_AFFORDABLE_UNITS, mode_designation
+from data_loaders import HOUSING_COLUMNS
+from housing_tracts import clean_housing
+from tract_imputation import INC_COLS, impute_income
+from tract_rollup import INCOME_UNIT_COLS, tract_unit_totals
+
+BUILDING_KEYS = ['Project ID', 'Building ID']
+
+
+def building_ids(data):
+    #one uint64 per building; Building ID is missing for some buildings, which still hash consistently
+    return pd.util.hash_pandas_object(data[BUILDING_KEYS], index = False).to_numpy()
+
+
+def row_hashes(data):
+    #hash of every raw column the analysis reads, stored in the 'Row Hash' column when a release is loaded
+    return pd.util.hash_pandas_object(data[list(HOUSING_COLUMNS)], index = False).to_numpy()
+
+
+def diff_buildings(previous, current):
+    # Compare a newly loaded release with the previously cleaned buildings. Returns the
+    # position in previous of every unchanged building in current (-1 where the building
+    # was added or changed), so the cleaned rows can be reused.
+    position = pd.Index(building_ids(previous)).get_indexer(building_ids(current))
+    stored = previous['Row Hash'].to_numpy(dtype = np.uint64)
+    same = (position >= 0) & (stored[np.maximum(position, 0)] == row_hashes(current))
+    return np.where(same, position, -1)
+
+
+def refresh_housing(previous, current, geocoder, locator=None):
+    # Cleaned housing data for the current release, reusing the previous rows for unchanged
+    # buildings. Buildings that were dropped for lacking a tract are always cleaned again
+    # (their lookups come from the geocode cache). Returns the cleaned data and the keys of
+    # every tract whose buildings changed.
+    current = current.copy()
+    current['Row Hash'] = row_hashes(current)
+    position = diff_buildings(previous, current)
+    unchanged = position >= 0
+
+    kept = previous.iloc[position[unchanged]].set_axis(current.index[unchanged])
+    changed = current[~unchanged]
+    if len(changed) > 0:
+        if locator is None:
+            from tract_geometry import TractLocator
+            locator = TractLocator.from_geojson()
+        changed = clean_housing(changed, locator, geocoder)
+    else:
+        #nothing to clean, but keep the cleaned columns for the tract keys below
+        changed = previous.iloc[:0]
+    housing = pd.concat([kept, changed.reindex(columns = kept.columns)]).sort_index()
+
+    stale = np.ones(len(previous), dtype = bool)
+    stale[position[unchanged]] = False
+    affected = pd.concat([previous['Tract Key'][stale], changed['Tract Key']]).dropna().unique()
+    return housing, affected
+
+
+def refresh_tracts(combined_data, housing_data, income_data, family_data, tract_keys, imputation=None):
+    # Rebuild the combined_data rows for the given tracts from the updated housing data, the
+    # same way the script builds them: unit totals, mode unit, household sizes and imputed
+    # incomes. Tracts left without buildings are dropped and new ones added, in the census
+    # row order the full build uses. imputation holds impute_income options.
+    tracts = income_data.loc[income_data['Tract Key'].isin(tract_keys), ['Census Tract', 'Tract Key']]
+    buildings = housing_data[housing_data['Tract Key'].isin(tract_keys)]
+    rows = pd.merge(tracts, tract_unit_totals(buildings), on = "Tract Key")
+    rows['mode_unit'] = mode_designation(rows[INCOME_UNIT_COLS], sentinel = NO_AFFORDABLE_UNITS)
+
+    income = income_data[income_data['Tract Key'].isin(rows['Tract Key'])].copy()
+    imputed, filled = impute_income(income_data, income.index, **(imputation or {}))
+    for x in range(len(INC_COLS)):
+        income[INC_COLS[x]] = income[INC_COLS[x]].where(~filled[:, x], imputed[:, x])
+
+    rows = pd.merge(rows, family_data.drop(columns = 'Census Tract'), on = "Tract Key")
+    rows = pd.merge(rows, income.drop(columns = 'Census Tract'), on = "Tract Key")
+
+    kept = combined_data[~combined_data['Tract Key'].isin(tract_keys)]
+    combined = pd.concat([kept, rows], ignore_index = True)
+    order = pd.Index(income_data['Tract Key']).get_indexer(combined['Tract Key'])
+    return combined.iloc[np.argsort(order, kind = 'stable')].reset_index(drop = True)
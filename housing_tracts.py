@@ -0,0 +1,47 @@
+# Census tracts for the Housing New York buildings: filling in missing tracts from each
+# building's coordinates or address, and turning HPD's tract numbers into tract keys.
+
+import pandas as pd
+
+from tract_keys import from_hpd, to_tract_name
+
+
+def building_address(number, street, boro):
+    boro = str(boro).strip()
+    if boro.find("Manhattan") != -1:
+        boro = "New York"
+    return str(number).strip()+" "+str(street).strip()+", "+boro+", NY"
+
+
+def tract_filler(data, located, geocoder):
+    # Fill in the missing census tracts, using the tract located from the coordinates where
+    # there are coordinates and looking up the rest by address (through a GeocodeCache) in one
+    # batch. Returns the tracts and a status for each building that needed one.
+    tracts = data['Census Tract'].copy()
+    missing = tracts.isin(["", "Not Found"])
+    by_coords = missing & data['Latitude'].notna() & data['Longitude'].notna()
+    by_address = missing & ~by_coords & data['Number'].notna() & data['Street'].notna()
+
+    found = pd.Series(None, index = data.index, dtype = object)
+    status = pd.Series(None, index = data.index, dtype = object)
+    found[by_coords] = located[by_coords]
+    status[by_coords] = located[by_coords].notna().map({True: 'hit', False: 'miss'})
+    addresses = [building_address(number, street, boro) for number, street, boro in zip(data.loc[by_address, 'Number'], data.loc[by_address, 'Street'], data.loc[by_address, 'Borough'])]
+    found[by_address], status[by_address] = geocoder.address_tracts(addresses, with_status = True)
+    status[missing & ~by_coords & ~by_address] = 'miss'
+
+    found = found.where(found.astype(str).str.len() >= 5)
+    return tracts.where(found.isna(), found), status
+
+
+def clean_housing(data, locator, geocoder):
+    # All of the tract cleaning the analysis does for the housing data (cells 5 and 9 of the
+    # script) in one call: fill in missing tracts, drop the buildings still without one, and
+    # add the Tract Key and uniform Census Tract name columns.
+    located = pd.Series(locator.locate(data['Latitude'], data['Longitude']), index = data.index, dtype = object)
+    data = data.copy()
+    data['Census Tract'], data['Geocode Status'] = tract_filler(data, located, geocoder)
+    data = data[data['Census Tract'].notna()].copy()
+    data['Tract Key'] = from_hpd(data['Census Tract'], data['Borough'], located)
+    data['Census Tract'] = to_tract_name(data['Tract Key']).fillna(data['Census Tract'])
+    return data
@@ -0,0 +1,85 @@
+# Compact HTML export for the tract heatmaps.
+#
+# By default every map HTML file embeds both plotly.js and the tract geometry. Here the
+# geometry is written once to a shared, quantized GeoJSON file and plotly.js once to a
+# shared plotly.min.js, so each map file only holds its per-tract values. The maps fetch the
+# geometry when they load, so they have to be served over http(s) (e.g. the dashboard, or
+# `python -m http.server` in the output folder) rather than opened straight from disk.
+
+import json
+import os
+
+GEOMETRY_FILE = "tracts.geojson"
+
+
+def _round_coords(coords, precision):
+    if isinstance(coords[0], (int, float)):
+        return [round(coords[0], precision), round(coords[1], precision)]
+    return [_round_coords(part, precision) for part in coords]
+
+
+def quantize_geojson(geojson, precision=5, featureidkey='boro_ct2010'):
+    # Round coordinates to `precision` decimal places (5 is about 1 m) and keep only the
+    # property the maps match tracts on
+    features = []
+    for feature in geojson['features']:
+        geometry = feature['geometry']
+        features.append({'type': 'Feature',
+                         'properties': {featureidkey: feature['properties'][featureidkey]},
+                         'geometry': {'type': geometry['type'], 'coordinates': _round_coords(geometry['coordinates'], precision)}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def write_geometry(geojson, directory, precision=5, filename=GEOMETRY_FILE, featureidkey='boro_ct2010'):
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, filename)
+    with open(path, 'w') as f:
+        json.dump(quantize_geojson(geojson, precision, featureidkey), f, separators = (',', ':'))
+    return path
+
+
+def external_geometry(fig, url=GEOMETRY_FILE):
+    #a copy of fig whose map traces load their geometry from url instead of embedding it
+    import plotly.graph_objects as go
+
+    fig = go.Figure(fig)
+    for trace in fig.data:
+        if 'geojson' in trace:
+            trace.geojson = url
+    return fig
+
+
+def write_map_html(fig, path, geometry_url=GEOMETRY_FILE, plotlyjs='directory'):
+    # Write fig without its geometry or plotly.js. With plotlyjs='directory', plotly.min.js is
+    # written next to the HTML file once and shared by every map in that folder; 'cdn' loads it
+    # from the plotly CDN instead.
+    external_geometry(fig, geometry_url).write_html(path, include_plotlyjs = plotlyjs)
+
+
+def layered_map(figs):
+    # One map holding the traces of every figure in figs (a dict of button label -> figure
+    # over the same geometry), with buttons switching between them. Each layer keeps its own
+    # title, color axis and legend.
+    import plotly.graph_objects as go
+
+    figs = list(figs.items())
+    layered = go.Figure(figs[0][1])
+    layered.data = []
+    owner = []
+    for i, (label, fig) in enumerate(figs):
+        for trace in fig.data:
+            layered.add_trace(trace)
+            owner.append(i)
+
+    buttons = []
+    for i, (label, fig) in enumerate(figs):
+        visible = [j == i for j in owner]
+        layout = {'title': fig.layout.title.to_plotly_json(),
+                  'coloraxis': fig.layout.coloraxis.to_plotly_json(),
+                  'showlegend': any(trace.showlegend for trace in fig.data)}
+        buttons.append({'label': label, 'method': 'update', 'args': [{'visible': visible}, layout]})
+
+    for trace, j in zip(layered.data, owner):
+        trace.visible = j == 0
+    layered.update_layout(updatemenus = [{'type': 'buttons', 'direction': 'right', 'x': 0, 'xanchor': 'left', 'y': 1.08, 'yanchor': 'bottom', 'buttons': buttons}])
+    return layered
@@ -0,0 +1,208 @@
+# The analysis as plain functions, so it can run without the notebook (see cli.py). Each step
+# does the work of the notebook cells named in its comment, and the notebook calls these
+# same functions.
+
+import numpy as np
+import pandas as pd
+
+from affordability import FAMILY_COLS, NO_AFFORDABLE_UNITS, gap_inputs, mode_designation, mode_gap, threshold_matrix, weighted_gap
+from data_loaders import FAMILY_PATH, HOUSING_PATH, INCOME_PATH, load_family, load_housing, load_income
+from profiling import count_delta, stage
+from snapshots import SNAPSHOT_DIR, SnapshotCache, snapshot_key
+from tract_imputation import INC_COLS, impute_income
+from tract_keys import BORO_PREFIXES, boro_code, from_geo_id, to_tract_name, tract_number
+from tract_rollup import INCOME_UNIT_COLS, tract_unit_totals
+
+GEOCODE_CACHE_PATH = "./geocode_cache.sqlite"
+
+#the cleaned tables, in the order they are returned and snapshotted
+TABLE_NAMES = ['housing_data', 'income_data', 'family_data', 'income_data_imputed', 'combined_data']
+
+#2019 AMI by household size (1 to 7+ people) and the minimum share of AMI for each affordability band
+AMI_LEVELS = [74700, 85400, 96100, 106700, 115300, 123800, 136650]
+PCT_AMI = [0, 0.31, 0.51, 0.81, 1.20]
+
+INCOME_NAMES = {'S1903_C03_024E': 'med_inc_family_2', 'S1903_C03_025E': 'med_inc_family_3', 'S1903_C03_026E': 'med_inc_family_4', 'S1903_C03_027E': 'med_inc_family_5', 'S1903_C03_028E': 'med_inc_family_6', 'S1903_C03_029E': 'med_inc_family_7', 'S1903_C03_034E': 'med_inc_nonfamily'}
+FAMILY_NAMES = {'B11016_001E': 'total_hh', 'B11016_003E': 'two_person_hh', 'B11016_004E': 'three_person_hh', 'B11016_005E': 'four_person_hh', 'B11016_006E': 'five_person_hh', 'B11016_007E': 'six_person_hh', 'B11016_008E': 'sev_person_hh', 'B11016_009E': 'nonfamily_hh'}
+
+#columns of the gaps CSV
+GAP_COLUMNS = ['Tract Key', 'Census Tract', 'Boro', 'mode_unit', 'mode_family', 'mode_diff', 'weighted_avg', 'mode_diff_zero', 'avg_diff_zero']
+#columns of the imputed incomes CSV
+IMPUTED_COLUMNS = ['Tract Key', 'Census Tract', 'Boro'] + INC_COLS
+
+
+def default_geocoder():
+    #the Census geocoder behind the on-disk cache, 8 lookups at a time and at most 10 per second
+    from geocoding import GeocodeCache
+    return GeocodeCache(GEOCODE_CACHE_PATH, workers = 8, rate = 10)
+
+
+def census_tracts(data):
+    #replace GEO_ID with the tract key and a readable tract name like "BX0001.00" (cells 6 and 7)
+    data = data.copy()
+    data.insert(0, 'Tract Key', from_geo_id(data['GEO_ID']))
+    data.insert(0, 'Census Tract', to_tract_name(data['Tract Key']))
+    return data.drop(columns = 'GEO_ID')
+
+
+def income_tracts(income_data):
+    # Median incomes by household size for every tract, with the tract code and borough
+    # columns the imputation uses (cells 6, 10 and 16)
+    income_data = census_tracts(income_data)
+    income_data = income_data[['Census Tract', 'Tract Key'] + list(INCOME_NAMES)].rename(columns = INCOME_NAMES)
+    #tract as a float without the borough code, to one decimal place (177.02 becomes 177.0)
+    income_data['Tract No Code'] = (tract_number(income_data['Tract Key']) // 10).to_numpy(dtype = float) / 10
+    income_data['Boro'] = boro_code(income_data['Tract Key']).map(BORO_PREFIXES)
+    return income_data
+
+
+def family_tracts(family_data):
+    # Household counts by size for every tract turned into shares of all households, plus the
+    # mode family size (cells 7, 11, 14 and 15). Tracts without households keep their counts.
+    family_data = census_tracts(family_data)
+    family_data = family_data[['Census Tract', 'Tract Key'] + list(FAMILY_NAMES)].rename(columns = FAMILY_NAMES)
+    #ties go to the larger family size
+    family_data['mode_family'] = mode_designation(family_data[FAMILY_COLS])
+
+    share_cols = FAMILY_COLS + ['nonfamily_hh']
+    counts = family_data[share_cols].to_numpy(dtype = float, na_value = np.nan)
+    total = family_data['total_hh'].to_numpy(dtype = float, na_value = np.nan)[:, None]
+    family_data[share_cols] = np.where(total > 0, counts / np.where(total > 0, total, 1), counts)
+    return family_data
+
+
+def imputed_income(income_data, targets=None, imputation=None):
+    # A copy of the target rows of income_data (all of them by default) with the missing
+    # median incomes imputed from the nearest tracts (cells 17 and 18). imputation holds
+    # impute_income options, e.g. {'method': 'centroid', 'k': 4, 'idw': True}.
+    income_data_imputed = income_data.copy() if targets is None else income_data.loc[targets].copy()
+    with stage("impute_income", rows_in = len(income_data_imputed)) as s:
+        imputed, filled = impute_income(income_data, income_data_imputed.index, **(imputation or {}))
+        s['values_filled'] = int(filled.sum())
+    for x in range(len(INC_COLS)):
+        income_data_imputed[INC_COLS[x]] = income_data_imputed[INC_COLS[x]].where(~filled[:, x], imputed[:, x])
+    return income_data_imputed
+
+
+def imputed_tracts(housing_data, income_data, impute_all_tracts=False, imputation=None):
+    #income_data_imputed: every tract with impute_all_tracts, otherwise only the tracts with Housing New York buildings (cells 17 and 18)
+    if impute_all_tracts:
+        return imputed_income(income_data, imputation = imputation)
+    return imputed_income(income_data, income_data.index[income_data['Tract Key'].isin(housing_data['Tract Key'])], imputation)
+
+
+def combine_tracts(housing_data, income_data_imputed, family_data):
+    # One row per tract with Housing New York buildings: unit totals, mode affordability
+    # designation, household shares and the imputed median incomes (cells 12 and 13)
+    combined_data = pd.merge(income_data_imputed[['Census Tract', 'Tract Key']], tract_unit_totals(housing_data), on = "Tract Key")
+    combined_data['mode_unit'] = mode_designation(combined_data[INCOME_UNIT_COLS], sentinel = NO_AFFORDABLE_UNITS)
+    combined_data = pd.merge(combined_data, family_data.drop(columns = 'Census Tract'), on = "Tract Key")
+    return pd.merge(combined_data, income_data_imputed.drop(columns = 'Census Tract'), on = "Tract Key")
+
+
+def build_tables(impute_all_tracts=False, geocoder=None, locator=None, engine=None, imputation=None):
+    #load and clean all three datasets from scratch (cells 2 to 18)
+    from housing_refresh import row_hashes
+    from housing_tracts import clean_housing
+
+    with stage("load_housing") as s:
+        housing_data = load_housing(engine = engine)
+        s['rows_out'] = len(housing_data)
+    with stage("row_hashes", rows_in = len(housing_data)):
+        housing_data['Row Hash'] = row_hashes(housing_data)
+    if locator is None:
+        with stage("tract_locator") as s:
+            from tract_geometry import TractLocator
+            locator = TractLocator.from_geojson()
+            s['polygons'] = len(locator.polygons)
+    if geocoder is None:
+        geocoder = default_geocoder()
+    with stage("clean_housing", rows_in = len(housing_data)) as s:
+        stats = dict(getattr(geocoder, 'stats', {}))
+        housing_data = clean_housing(housing_data, locator, geocoder)
+        s['rows_out'] = len(housing_data)
+        s['geocode_status'] = {str(key): int(value) for key, value in housing_data['Geocode Status'].value_counts().items()}
+        s['geocoder'] = count_delta(stats, getattr(geocoder, 'stats', {}))
+
+    with stage("income_tracts") as s:
+        income_data = income_tracts(load_income(engine = engine))
+        s['rows_out'] = len(income_data)
+    with stage("family_tracts") as s:
+        family_data = family_tracts(load_family(engine = engine))
+        s['rows_out'] = len(family_data)
+    with stage("imputed_tracts", rows_in = len(income_data)) as s:
+        income_data_imputed = imputed_tracts(housing_data, income_data, impute_all_tracts, imputation)
+        s['rows_out'] = len(income_data_imputed)
+    with stage("combine_tracts", rows_in = len(housing_data)) as s:
+        combined_data = combine_tracts(housing_data, income_data_imputed, family_data)
+        s['rows_out'] = len(combined_data)
+    return [housing_data, income_data, family_data, income_data_imputed, combined_data]
+
+
+def snapshot_tables(impute_all_tracts=False, incremental_refresh=False, directory=SNAPSHOT_DIR, geocoder=None, imputation=None):
+    # The snapshot cache for the current inputs and settings, and the cleaned tables saved in
+    # it (None if they still have to be built). The key has one part for the census data,
+    # tract polygons, modules and settings, and one for the Housing New York release. With
+    # incremental_refresh, the snapshot of an earlier release is updated for the buildings
+    # that changed, instead of everything being rebuilt.
+    from tract_geometry import GEOJSON_PATH
+
+    #the default imputation leaves the key as it was before imputation options existed
+    params = [impute_all_tracts] + ([sorted(imputation.items())] if imputation else [])
+    base = snapshot_key([INCOME_PATH, FAMILY_PATH, GEOJSON_PATH], params = params)
+    with stage("snapshot_key"):
+        snapshots = SnapshotCache(base + "-" + snapshot_key([HOUSING_PATH], code = []), directory)
+    with stage("load_snapshot") as s:
+        tables = snapshots.load(TABLE_NAMES)
+        s['found'] = tables is not None
+    if tables is None and incremental_refresh:
+        previous = snapshots.previous(TABLE_NAMES, base)
+        if previous is not None:
+            from housing_refresh import refresh_housing, refresh_tracts
+
+            housing_data, income_data, family_data, income_data_imputed, combined_data = previous
+            if geocoder is None:
+                geocoder = default_geocoder()
+            with stage("refresh_housing", rows_in = len(housing_data)) as s:
+                stats = dict(getattr(geocoder, 'stats', {}))
+                housing_data, changed_tracts = refresh_housing(housing_data, load_housing(), geocoder)
+                s['rows_out'] = len(housing_data)
+                s['changed_tracts'] = len(changed_tracts)
+                s['geocoder'] = count_delta(stats, getattr(geocoder, 'stats', {}))
+            with stage("refresh_tracts", rows_in = len(combined_data)) as s:
+                combined_data = refresh_tracts(combined_data, housing_data, income_data, family_data, changed_tracts, imputation)
+                s['rows_out'] = len(combined_data)
+            if not impute_all_tracts:
+                #the tracts with buildings may have changed; imputing every tract doesn't depend on the buildings
+                income_data_imputed = imputed_tracts(housing_data, income_data, imputation = imputation)
+            tables = [housing_data, income_data, family_data, income_data_imputed, combined_data]
+            with stage("save_snapshot"):
+                snapshots.save(dict(zip(TABLE_NAMES, tables)))
+    return snapshots, tables
+
+
+def cleaned_tables(impute_all_tracts=False, incremental_refresh=False, use_snapshots=True, geocoder=None, engine=None, imputation=None):
+    #housing_data, income_data, family_data, income_data_imputed and combined_data, from a snapshot where possible
+    snapshots, tables = snapshot_tables(impute_all_tracts, incremental_refresh, geocoder = geocoder, imputation = imputation) if use_snapshots else (None, None)
+    if tables is None:
+        with stage("build_tables"):
+            tables = build_tables(impute_all_tracts, geocoder, engine = engine, imputation = imputation)
+        if snapshots is not None:
+            with stage("save_snapshot"):
+                snapshots.save(dict(zip(TABLE_NAMES, tables)))
+    return tables
+
+
+def tract_gaps(combined_data, ami_levels=AMI_LEVELS, pct_ami=PCT_AMI):
+    # Add the gaps between median income and the minimum income requirement: for the mode
+    # household size (mode_diff), weighted over all household sizes (weighted_avg), and
+    # whether each is positive (cells 71, 53 and 73)
+    with stage("tract_gaps", rows_in = len(combined_data)):
+        combined_data = combined_data.copy()
+        thresholds = threshold_matrix(ami_levels, pct_ami)
+        income, shares, levels, bands = gap_inputs(combined_data)
+        combined_data['mode_diff'] = mode_gap(income, levels, bands, thresholds)
+        combined_data['weighted_avg'] = weighted_gap(income, shares, bands, thresholds)
+        combined_data['mode_diff_zero'] = combined_data['mode_diff'] > 0
+        combined_data['avg_diff_zero'] = combined_data['weighted_avg'] > 0
+    return combined_data
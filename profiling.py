@@ -0,0 +1,186 @@
+# Stage-level profiling for a run of the analysis.
+#
+#   with RunProfile(trace_dir = "profiles") as profile:
+#       tables = pipeline.cleaned_tables()
+#   profile.write("run_report.json")
+#
+# The pipeline steps are wrapped in `with stage("name") as s:`, which does nothing unless a
+# RunProfile is active. Each stage records its wall time, CPU time (plus that of worker
+# processes that finished during it), the peak memory allocated during it and whatever the
+# step adds to s, such as rows_in/rows_out or geocoder counts. Stages started inside another
+# stage are named "outer/inner".
+#
+# Memory is measured with tracemalloc, which sees Python and numpy/pandas allocations but not
+# other C libraries, and slows the run down; pass memory=False for more accurate timings.
+# With trace_dir, every top level stage is also profiled with cProfile (or pyinstrument)
+# and its trace written to <trace_dir>/<stage>.prof (.html for pyinstrument).
+
+import cProfile
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TRACERS = ['cprofile', 'pyinstrument']
+
+#the RunProfile stages are recorded in, if any
+_active = None
+
+
+def _children_cpu():
+    #CPU seconds used by child processes that have finished and been waited for
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10, 1)
+
+
+class RunProfile:
+    # The stages of one run. Stages are only recorded while it is active, i.e. inside a
+    # `with RunProfile() as profile:` block.
+
+    def __init__(self, memory=True, trace_dir=None, tracer='cprofile'):
+        if tracer not in TRACERS:
+            raise ValueError("unknown tracer: " + str(tracer))
+        self.memory = memory
+        self.trace_dir = trace_dir
+        self.tracer = tracer
+        self.stages = []
+        self.info = {}
+        self._open = []
+        self._previous = None
+        self._own_tracemalloc = False
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracemalloc = True
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = (time.perf_counter(), time.process_time(), _children_cpu())
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        wall, cpu, children = self._start
+        self.wall = time.perf_counter() - wall
+        self.cpu = time.process_time() - cpu
+        self.cpu_children = _children_cpu() - children
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        _active = self._previous
+        return False
+
+    @contextmanager
+    def stage(self, name, **counts):
+        parent = self._open[-1] if self._open else None
+        record = {'name': name if parent is None else parent['name'] + "/" + name, **counts}
+        self.stages.append(record)
+
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            #keep the peak the enclosing stage reached so far before starting this one's
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent['_peak'] = max(parent['_peak'], peak)
+            tracemalloc.reset_peak()
+            record['_start_memory'] = record['_peak'] = current
+
+        tracer = None
+        if self.trace_dir is not None and not any('_tracer' in stage for stage in self._open):
+            tracer = record['_tracer'] = self._start_tracer()
+        self._open.append(record)
+        wall, cpu, children = time.perf_counter(), time.process_time(), _children_cpu()
+        try:
+            yield record
+        except BaseException as exc:
+            record['error'] = type(exc).__name__
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall, 6)
+            record['cpu_s'] = round(time.process_time() - cpu, 6)
+            children = _children_cpu() - children
+            if children:
+                record['cpu_children_s'] = round(children, 6)
+            if tracer is not None:
+                del record['_tracer']
+                record['trace'] = self._write_trace(tracer, record['name'])
+            if memory:
+                peak = max(record.pop('_peak'), tracemalloc.get_traced_memory()[1])
+                record['peak_memory_mb'] = round((peak - record.pop('_start_memory')) / 2 ** 20, 3)
+                if parent is not None:
+                    parent['_peak'] = max(parent['_peak'], peak)
+            self._open.pop()
+
+    def _start_tracer(self):
+        if self.tracer == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _write_trace(self, profiler, name):
+        os.makedirs(self.trace_dir, exist_ok = True)
+        path = os.path.join(self.trace_dir, re.sub(r"[^\w.-]+", "_", name))
+        if self.tracer == 'pyinstrument':
+            profiler.stop()
+            path += ".html"
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            path += ".prof"
+            profiler.dump_stats(path)
+        return path
+
+    def report(self):
+        stages = [{key: value for key, value in stage.items() if not key.startswith("_")} for stage in self.stages]
+        report = {'started': getattr(self, 'started', None), 'python': platform.python_version(), 'platform': platform.platform(),
+                  'wall_s': round(getattr(self, 'wall', 0.0), 6), 'cpu_s': round(getattr(self, 'cpu', 0.0), 6),
+                  'cpu_children_s': round(getattr(self, 'cpu_children', 0.0), 6), 'max_rss_mb': _max_rss_mb()}
+        report.update(self.info)
+        report['stages'] = stages
+        return report
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent = 1, default = str)
+        return path
+
+
+@contextmanager
+def stage(name, **counts):
+    #a stage of the active RunProfile, or a throwaway record when nothing is being profiled
+    if _active is None:
+        yield dict(counts)
+    else:
+        with _active.stage(name, **counts) as record:
+            yield record
+
+
+def count_delta(before, after):
+    #the counters in after that changed since before, e.g. a GeocodeCache's stats over one stage
+    return {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
@@ -0,0 +1,75 @@
+# Snapshots of the cleaned tables, so a rerun that only changes the gap calculation or the
+# plots doesn't have to re-read the CSVs and redo every cleaning step.
+#
+# Tables are stored as uncompressed Arrow IPC (Feather v2) files and memory-mapped on load.
+# Each snapshot is keyed by a hash of the input files, the code that produced it and any
+# parameters, so changing any of those rebuilds it.
+
+import glob
+import hashlib
+import os
+
+SNAPSHOT_DIR = "./snapshots"
+
+#modules whose code affects the cleaned tables
+CODE_FILES = ['data_loaders.py', 'geocoding.py', 'housing_refresh.py', 'housing_tracts.py', 'pipeline.py', 'tract_geometry.py', 'tract_imputation.py', 'tract_keys.py', 'tract_rollup.py', 'affordability.py']
+
+
+def snapshot_key(inputs, code=CODE_FILES, params=()):
+    #sha256 over the contents of every input and code file plus repr(params); missing files hash as empty
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = list(inputs) + [os.path.join(here, name) for name in code]
+    for path in paths:
+        digest.update(os.path.basename(path).encode() + b"\0")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        digest.update(b"\0")
+    digest.update(repr(tuple(params)).encode())
+    return digest.hexdigest()[:16]
+
+
+class SnapshotCache:
+    # Named tables stored under `directory` as <name>-<key>.arrow. Saving a table removes its
+    # snapshots for other keys, so there is only ever one per table.
+
+    def __init__(self, key, directory=SNAPSHOT_DIR):
+        self.key = key
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name + "-" + self.key + ".arrow")
+
+    def exists(self, names):
+        return all(os.path.exists(self.path(name)) for name in names)
+
+    def load(self, names):
+        #list of DataFrames in the order of names, or None unless every one of them is saved
+        if not self.exists(names):
+            return None
+        from pyarrow import feather
+        return [feather.read_table(self.path(name), memory_map = True).to_pandas() for name in names]
+
+    def previous(self, names, prefix):
+        # The most recent saved snapshots of names under another key starting with prefix, e.g.
+        # built from an earlier release of one of the inputs, or None if there aren't any
+        pattern = os.path.join(glob.escape(self.directory), glob.escape(names[0]) + "-" + glob.escape(prefix) + "*.arrow")
+        paths = sorted(glob.glob(pattern), key = os.path.getmtime, reverse = True)
+        for path in paths:
+            other = SnapshotCache(os.path.basename(path)[len(names[0]) + 1:-len(".arrow")], self.directory)
+            if other.key != self.key and other.exists(names):
+                return other.load(names)
+        return None
+
+    def save(self, tables):
+        from pyarrow import feather
+        os.makedirs(self.directory, exist_ok = True)
+        for name, data in tables.items():
+            path = self.path(name)
+            feather.write_feather(data, path + ".tmp", compression = 'uncompressed')
+            os.replace(path + ".tmp", path)
+            for old in glob.glob(os.path.join(glob.escape(self.directory), glob.escape(name) + "-*.arrow")):
+                if old != path:
+                    os.remove(old)
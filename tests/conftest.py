@@ -0,0 +1,9 @@
+# The analysis modules live at the top of the repo rather than in a package, so make them
+# importable from the tests.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,144 @@
+# build_panel on two small synthetic vintages, the three ways of matching buildings to
+# vintages, the AMI schedules of other years, and moving a 2020 tract vintage onto 2010 tracts.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import acs_panel
+from acs_panel import AMI_FOUR_PERSON, ami_levels, build_panel, to_2010_tracts
+from affordability import HOUSEHOLD_LEVELS, LEVEL_INC_COLS, LEVEL_SHARE_COLS, UNIT_BANDS
+from pipeline import AMI_LEVELS, PCT_AMI
+from tract_crosswalk import Crosswalk
+from tract_store import TractStore
+
+A, B, C, D = 2000100, 2000200, 2000300, 2000400
+
+
+def vintage(keys, income):
+    data = pd.DataFrame({'Tract Key': keys})
+    data[LEVEL_INC_COLS] = income
+    data[LEVEL_SHARE_COLS] = 1.0 / len(LEVEL_SHARE_COLS)
+    data['mode_family'] = HOUSEHOLD_LEVELS[3]
+    return TractStore.from_frame(data)
+
+
+#tract C only shows up in 2019
+VINTAGES = {2017: vintage([A, B], 60000.0), 2019: vintage([A, B, C], 70000.0)}
+
+#tract, completion date, band with the units
+BUILDINGS = [
+    (A, "06/30/2016", 0),   #before the first vintage
+    (A, "03/01/2018", 1),   #2017
+    (B, "12/31/2019", 2),   #2019
+    (C, "01/15/2021", 3),   #after the last vintage, so 2019
+    (B, None, 4),           #not completed
+    (D, "03/01/2018", 0),   #not in any vintage
+    (None, "03/01/2018", 0),
+]
+
+
+@pytest.fixture
+def housing():
+    data = pd.DataFrame({'Tract Key': pd.array([row[0] for row in BUILDINGS], dtype = 'Int64'), 'Building Completion Date': [row[1] for row in BUILDINGS]})
+    for i, band in enumerate(UNIT_BANDS):
+        data[band] = [10 if row[2] == i else 0 for row in BUILDINGS]
+    return data
+
+
+def matched(panel):
+    #{year: {tract: buildings}} for the tracts with buildings
+    return {year: {int(key): int(count) for key, count in zip(panel.keys, row) if count} for year, row in zip(panel.years, panel['buildings'])}
+
+
+def test_match_completion(housing):
+    panel = build_panel(housing, VINTAGES)
+    assert panel.years == [2017, 2019]
+    assert panel.keys.tolist() == [A, B, C]
+    assert matched(panel) == {2017: {A: 1}, 2019: {B: 1, C: 1}}
+    assert panel['units'][0, 0].tolist() == [0, 10, 0, 0, 0]
+    assert panel['mode_band'].tolist() == [[1, -1, -1], [-1, 2, 3]]
+
+
+def test_match_cumulative(housing):
+    panel = build_panel(housing, VINTAGES, match = 'cumulative')
+    assert matched(panel) == {2017: {A: 1}, 2019: {A: 1, B: 1, C: 1}}
+    assert panel['mode_band'].tolist() == [[1, -1, -1], [1, 2, 3]]
+
+
+def test_match_all(housing):
+    panel = build_panel(housing, VINTAGES, match = 'all')
+    #every building in a panel tract, completed or not, in every year
+    assert matched(panel) == {2017: {A: 2, B: 2, C: 1}, 2019: {A: 2, B: 2, C: 1}}
+    #ties between the two buildings of a tract go to the higher band
+    assert panel['mode_band'].tolist() == [[1, 4, 3], [1, 4, 3]]
+
+
+def test_unknown_match(housing):
+    with pytest.raises(ValueError):
+        build_panel(housing, VINTAGES, match = 'nearest')
+
+
+def test_frame(housing):
+    frame = build_panel(housing, VINTAGES, match = 'cumulative').frame()
+    assert list(zip(frame['Year'], frame['Tract Key'])) == [(2017, A), (2019, A), (2019, B), (2019, C)]
+    assert frame['mode_unit'].tolist() == [UNIT_BANDS[1], UNIT_BANDS[1], UNIT_BANDS[2], UNIT_BANDS[3]]
+    assert set(acs_panel.PANEL_COLUMNS) <= set(frame.columns)
+    #tracts a vintage doesn't have never show up, even with all_tracts
+    everything = build_panel(housing, VINTAGES, match = 'all').frame(all_tracts = True)
+    assert list(zip(everything['Year'], everything['Tract Key'])) == [(2017, A), (2017, B), (2019, A), (2019, B), (2019, C)]
+
+
+def test_gaps_use_each_years_schedule(housing):
+    panel = build_panel(housing, VINTAGES, match = 'cumulative')
+    #four person households, each year with its own AMI and income
+    assert panel['mode_diff'][0, 0] == pytest.approx(60000 - PCT_AMI[1] * ami_levels(2017)[3])
+    assert panel['mode_diff'][1, 2] == pytest.approx(70000 - PCT_AMI[3] * AMI_LEVELS[3])
+    assert panel['weighted_avg'][1, 1] == pytest.approx(70000 - PCT_AMI[2] * np.mean(AMI_LEVELS))
+    assert np.isnan(panel['mode_diff'][0, 1])
+    schedule = [100000] * 7
+    mine = build_panel(housing, VINTAGES, ami_schedules = {2017: schedule}, match = 'cumulative')
+    assert mine['mode_diff'][0, 0] == pytest.approx(60000 - PCT_AMI[1] * 100000)
+    assert mine['mode_diff'][1, 2] == panel['mode_diff'][1, 2]
+
+
+def test_ami_levels():
+    assert ami_levels(2019) == AMI_LEVELS
+    for year in AMI_FOUR_PERSON:
+        levels = ami_levels(year)
+        assert len(levels) == len(AMI_LEVELS)
+        assert all(level % 50 == 0 for level in levels)
+        #the 2019 schedule scaled by the year's four person AMI, to the nearest $50
+        scale = AMI_FOUR_PERSON[year] / AMI_FOUR_PERSON[2019]
+        assert all(abs(level - old * scale) <= 25 for level, old in zip(levels, AMI_LEVELS))
+        assert levels[3] == AMI_FOUR_PERSON[year]
+    assert ami_levels(2020)[3] < ami_levels(2019)[3]
+
+
+def test_published_schedule_wins(monkeypatch):
+    published = [81000, 92600, 104200, 115700, 125000, 134300, 148150]
+    monkeypatch.setitem(acs_panel.AMI_SCHEDULES, 2021, published)
+    assert ami_levels(2021) == published
+    assert ami_levels(2021) is not published
+
+
+def test_to_2010_tracts():
+    #2020 tract 1.01 and 1.02 were 2010 tract 1.00, split 30:10; 2020 tract 2.00 is 2010 tract 2.00
+    crosswalk = Crosswalk([2000101, 2000102, 2000200], [A, A, B], [30, 10, 50])
+    income = pd.DataFrame({'Tract Key': [2000101, 2000102, 2000200]})
+    income[LEVEL_INC_COLS] = [[40000.0] * 7, [80000.0] * 7, [55000.0] * 7]
+    family = pd.DataFrame({'GEO_ID': ["1400000US36005000101", "1400000US36005000102", "1400000US36005000200"]})
+    for i, col in enumerate(['B11016_001E', 'B11016_003E', 'B11016_004E', 'B11016_005E', 'B11016_006E', 'B11016_007E', 'B11016_008E', 'B11016_009E']):
+        family[col] = [300 - i, 100 - i, 200 - i]
+    top_coded = pd.DataFrame(False, index = income['Tract Key'].to_numpy(), columns = LEVEL_INC_COLS)
+    top_coded.loc[[2000101, 2000200], LEVEL_INC_COLS[0]] = True
+    income, family, top_coded = to_2010_tracts(income, family, crosswalk, top_coded)
+    #a top code averaged with other incomes isn't one any more
+    assert top_coded[LEVEL_INC_COLS[0]].to_dict() == {A: False, B: True}
+    assert not top_coded[LEVEL_INC_COLS[1:]].any().any()
+    assert income['Tract Key'].tolist() == [A, B]
+    #weighted by area times households: 30 * 300 at 40000, 10 * 100 at 80000
+    assert income[LEVEL_INC_COLS[0]].tolist() == [pytest.approx((30 * 300 * 40000 + 10 * 100 * 80000) / (30 * 300 + 10 * 100)), 55000]
+    #whole 2020 tracts into one 2010 tract, so the counts just add up
+    assert family['GEO_ID'].tolist() == ["1400000US36005000100", "1400000US36005000200"]
+    assert family['B11016_001E'].tolist() == [400, 200]
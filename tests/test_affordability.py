@@ -0,0 +1,194 @@
+# The matrix gap calculations against literal ports of the original row-by-row
+# calc_mode_diff and calc_weighted_avg, on random tracts with missing and top coded incomes.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from affordability import HOUSEHOLD_LEVELS, NO_AFFORDABLE_UNITS, UNIT_BANDS, gap_inputs, mode_designation, mode_gap, rank_columns, scenario_gaps, scenario_table, threshold_matrix, weighted_gap
+
+AMI_LEVELS = [74700, 85400, 96100, 106700, 115300, 123800, 136650]
+PCT_AMI = [0, 0.31, 0.51, 0.81, 1.20]
+INC_COLS = ['med_inc_family_2', 'med_inc_family_3', 'med_inc_family_4', 'med_inc_family_5', 'med_inc_family_6', 'med_inc_family_7', 'med_inc_nonfamily']
+FAM_COLS = ['two_person_hh', 'three_person_hh', 'four_person_hh', 'five_person_hh', 'six_person_hh', 'sev_person_hh', 'nonfamily_hh']
+
+
+def calc_mode_diff(row, ami_levels=AMI_LEVELS, pct_ami=PCT_AMI):
+    # The original, with its if/elif chains as lookups
+    level_index = ['nonfamily_hh', 'two_person_hh', 'three_person_hh', 'four_person_hh', 'five_person_hh', 'six_person_hh', 'sev_person_hh'].index(row["mode_family"])
+    if row["mode_unit"] == "no affordable units":
+        return float('NaN')
+    pct_index = ['Extremely Low Income Units', 'Very Low Income Units', 'Low Income Units', 'Moderate Income Units', 'Middle Income Units'].index(row["mode_unit"])
+    inc_levels = list(row[INC_COLS])
+    if level_index == 0:
+        med_inc = float(row['med_inc_nonfamily'])
+    else:
+        try:
+            med_inc = float(inc_levels[level_index-1])
+        except:
+            med_inc = 250000.00
+    if pct_index == 0:
+        return med_inc
+    else:
+        min_inc = pct_ami[pct_index] * ami_levels[level_index]
+        return (med_inc - min_inc)
+
+
+def calc_weighted_avg(row, ami_levels=AMI_LEVELS, pct_ami=PCT_AMI):
+    if row["mode_unit"] == "no affordable units":
+        return float('NaN')
+    pct_index = ['Extremely Low Income Units', 'Very Low Income Units', 'Low Income Units', 'Moderate Income Units', 'Middle Income Units'].index(row["mode_unit"])
+    weighted_avg = 0.00
+    inc_levels = list(row[INC_COLS])
+    fam_sizes = list(row[FAM_COLS])
+    for ami in ami_levels:
+        if ami_levels.index(ami) == 0:
+            weighted_avg += ((float(row['med_inc_nonfamily'])) - (pct_ami[pct_index]*ami)) * float(row['nonfamily_hh'])
+        else:
+            try:
+                weighted_avg += ((float(inc_levels[ami_levels.index(ami)-1])) - (pct_ami[pct_index]*ami)) * float(fam_sizes[ami_levels.index(ami)-1])
+            except:
+                weighted_avg += ((250000.00) - (pct_ami[pct_index]*ami)) * float(fam_sizes[ami_levels.index(ami)-1])
+    return weighted_avg
+
+
+def random_tracts(rng, n=200):
+    #family incomes may be missing ("-") or top coded; the original only parsed the nonfamily
+    #income with float(), so those stay plain numbers here
+    data = pd.DataFrame({col: rng.choice(["31250", "58000", "104375", "-", "250,000+"], n) for col in INC_COLS[:-1]})
+    data['med_inc_nonfamily'] = rng.choice(["18000", "42500.5", "96000"], n)
+    shares = rng.random((n, len(FAM_COLS)))
+    data[FAM_COLS] = shares / shares.sum(axis = 1, keepdims = True)
+    data['mode_family'] = rng.choice(HOUSEHOLD_LEVELS, n)
+    data['mode_unit'] = rng.choice(UNIT_BANDS + [NO_AFFORDABLE_UNITS], n)
+    return data
+
+
+def gaps(data, ami_levels=AMI_LEVELS, pct_ami=PCT_AMI):
+    income, shares, levels, bands = gap_inputs(data)
+    thresholds = threshold_matrix(ami_levels, pct_ami)
+    return mode_gap(income, levels, bands, thresholds), weighted_gap(income, shares, bands, thresholds)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_original(seed):
+    data = random_tracts(np.random.default_rng(seed))
+    mode, weighted = gaps(data)
+    assert np.allclose(mode, data.apply(calc_mode_diff, axis = 1), equal_nan = True, rtol = 0, atol = 1e-6)
+    assert np.allclose(weighted, data.apply(calc_weighted_avg, axis = 1), equal_nan = True, rtol = 0, atol = 1e-6)
+
+
+def test_unparsed_incomes_count_as_top_coded():
+    #"-" and "250,000+" both fall back to 250000, like float_converter
+    data = random_tracts(np.random.default_rng(0), 2)
+    data[INC_COLS[:-1]] = [["-"] * 6, ["250,000+"] * 6]
+    data['mode_family'] = 'four_person_hh'
+    data['mode_unit'] = UNIT_BANDS[2]
+    mode, weighted = gaps(data)
+    assert mode.tolist() == [250000 - 0.51 * 106700] * 2
+    assert np.allclose(weighted, data.apply(calc_weighted_avg, axis = 1))
+
+
+def test_top_coded_nonfamily_income():
+    #the original raised on a top coded nonfamily income; it is now 250000 like the others
+    data = random_tracts(np.random.default_rng(0), 1)
+    data['med_inc_nonfamily'] = "250,000+"
+    data['mode_family'] = 'nonfamily_hh'
+    data['mode_unit'] = UNIT_BANDS[1]
+    with pytest.raises(ValueError):
+        calc_mode_diff(data.iloc[0])
+    assert gaps(data)[0].tolist() == [250000 - 0.31 * 74700]
+
+
+def test_missing_modes():
+    #no affordable units leaves both gaps NaN; a tract without a mode household size still
+    #has a weighted gap
+    data = random_tracts(np.random.default_rng(1), 3)
+    data['mode_unit'] = [NO_AFFORDABLE_UNITS, UNIT_BANDS[0], UNIT_BANDS[4]]
+    data['mode_family'] = ['two_person_hh', None, 'two_person_hh']
+    mode, weighted = gaps(data)
+    assert np.isnan(mode[:2]).all() and not np.isnan(mode[2])
+    assert np.isnan(weighted[0]) and not np.isnan(weighted[1:]).any()
+    assert weighted[1] == pytest.approx(calc_weighted_avg(data.iloc[1]))
+
+
+def find_mode_unit(row):
+    # The original mode unit scan, on a row holding only the band columns: the last column
+    # equal to the maximum wins
+    max_value = row.max()
+    mode_series = "no affordable units"
+    if max_value > 0:
+        index = row.index
+        x = 0
+        for i in row:
+            if i == max_value:
+                mode_series = index[x]
+            x+=1
+    return mode_series
+
+
+def test_mode_ties_go_right():
+    units = pd.DataFrame([[3, 3, 0, 0, 0], [0, 2, 2, 2, 1], [5, 0, 0, 0, 5], [0, 0, 1, 0, 0]], columns = UNIT_BANDS)
+    modes = mode_designation(units, sentinel = NO_AFFORDABLE_UNITS)
+    assert modes.tolist() == [UNIT_BANDS[1], UNIT_BANDS[3], UNIT_BANDS[4], UNIT_BANDS[2]]
+    assert modes.tolist() == units.apply(find_mode_unit, axis = 1).tolist()
+
+
+def test_mode_all_zero_rows():
+    units = pd.DataFrame([[0, 0, 0, 0, 0], [np.nan] * 5, [0, 1, 0, 0, 0]], columns = UNIT_BANDS)
+    with_sentinel = mode_designation(units, sentinel = NO_AFFORDABLE_UNITS)
+    assert with_sentinel.tolist() == [NO_AFFORDABLE_UNITS, NO_AFFORDABLE_UNITS, UNIT_BANDS[1]]
+    assert with_sentinel.tolist() == units.fillna(0).apply(find_mode_unit, axis = 1).tolist()
+    #without one, every column ties at 0 (NaN counts as 0) and the last one wins
+    assert mode_designation(units).tolist() == [UNIT_BANDS[4], UNIT_BANDS[4], UNIT_BANDS[1]]
+
+
+def test_mode_rank():
+    units = pd.DataFrame([[1, 4, 2, 0, 0], [3, 3, 3, 0, 0], [0, 0, 0, 0, 7]], columns = UNIT_BANDS, index = [5, 6, 7])
+    second = mode_designation(units, rank = 2, sentinel = NO_AFFORDABLE_UNITS)
+    assert list(second.index) == [5, 6, 7]
+    #ties rank right to left; a second place of 0 takes the sentinel
+    assert second.tolist() == [UNIT_BANDS[2], UNIT_BANDS[1], NO_AFFORDABLE_UNITS]
+    assert mode_designation(units, rank = 3).tolist() == [UNIT_BANDS[0], UNIT_BANDS[0], UNIT_BANDS[2]]
+    assert rank_columns(units).tolist() == [[1, 2, 0, 4, 3], [2, 1, 0, 4, 3], [4, 3, 2, 1, 0]]
+
+
+def test_mode_of_strings():
+    #counts read from CSV as strings are compared as numbers, not as text ("10" > "9")
+    units = pd.DataFrame([["9", "10", "0", "0", "0"]], columns = UNIT_BANDS)
+    assert mode_designation(units).tolist() == [UNIT_BANDS[1]]
+
+
+AMI_SCHEDULES = {'2019': AMI_LEVELS, '2020': [78300, 89500, 100700, 111800, 120800, 129700, 143150], 'flat': [100000] * 7}
+PCT_SCHEDULES = {'current': PCT_AMI, 'deeper': [0, 0.25, 0.45, 0.75, 1.10]}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_scenario_slices(seed):
+    #slice (i, j) is mode_gap/weighted_gap under AMI schedule i and band definition j
+    data = random_tracts(np.random.default_rng(seed), 50)
+    income, shares, levels, bands = gap_inputs(data)
+    mode, weighted = scenario_gaps(income, shares, levels, bands, list(AMI_SCHEDULES.values()), list(PCT_SCHEDULES.values()))
+    assert mode.shape == weighted.shape == (len(AMI_SCHEDULES), len(PCT_SCHEDULES), len(data))
+    for i, ami_levels in enumerate(AMI_SCHEDULES.values()):
+        for j, pct_ami in enumerate(PCT_SCHEDULES.values()):
+            one_mode, one_weighted = gaps(data, ami_levels, pct_ami)
+            assert np.allclose(mode[i, j], one_mode, equal_nan = True, rtol = 0, atol = 1e-6)
+            assert np.allclose(weighted[i, j], one_weighted, equal_nan = True, rtol = 0, atol = 1e-6)
+            assert np.allclose(mode[i, j], data.apply(calc_mode_diff, axis = 1, ami_levels = ami_levels, pct_ami = pct_ami), equal_nan = True, rtol = 0, atol = 1e-6)
+
+
+def test_scenario_table():
+    data = random_tracts(np.random.default_rng(3), 4)
+    data['Tract Key'] = [1000100, 2017702, 3000301, 5000900]
+    table = scenario_table(data, AMI_SCHEDULES, PCT_SCHEDULES)
+    assert list(table.columns) == ['ami_schedule', 'pct_schedule', 'Tract Key', 'mode_diff', 'weighted_avg']
+    assert len(table) == len(AMI_SCHEDULES) * len(PCT_SCHEDULES) * len(data)
+    #schedule-major: every tract under each band definition, for each AMI schedule in turn
+    assert table['ami_schedule'].tolist() == [name for name in AMI_SCHEDULES for _ in range(len(PCT_SCHEDULES) * len(data))]
+    assert table['pct_schedule'].tolist() == [name for _ in AMI_SCHEDULES for name in PCT_SCHEDULES for _ in range(len(data))]
+    assert table['Tract Key'].tolist() == data['Tract Key'].tolist() * (len(AMI_SCHEDULES) * len(PCT_SCHEDULES))
+    for (ami_name, pct_name), rows in table.groupby(['ami_schedule', 'pct_schedule'], sort = False):
+        mode, weighted = gaps(data, AMI_SCHEDULES[ami_name], PCT_SCHEDULES[pct_name])
+        assert np.allclose(rows['mode_diff'], mode, equal_nan = True)
+        assert np.allclose(rows['weighted_avg'], weighted, equal_nan = True)
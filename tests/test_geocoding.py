@@ -0,0 +1,194 @@
+# GeocodeCache with a StaticGeocoder standing in for the Census geocoder, and CensusGeocoder
+# against a local mock of it. What the mock answers depends on the address: NOWHERE has no
+# match, SLOW answers after the client's timeout, FLAKY fails twice before answering and
+# anything else is in tract 017702.
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from geocoding import CensusGeocoder, GeocodeCache, StaticGeocoder
+
+
+class FailingGeocoder(StaticGeocoder):
+    #fails the first `failures` address lookups, then answers like a StaticGeocoder
+    def __init__(self, failures, **lookups):
+        StaticGeocoder.__init__(self, **lookups)
+        self.failures = failures
+
+    def address(self, address):
+        if self.failures:
+            self.failures -= 1
+            self.calls += 1
+            raise ConnectionError("geocoder unavailable")
+        return StaticGeocoder.address(self, address)
+
+
+@pytest.fixture
+def static():
+    return StaticGeocoder(coordinates = {(40.805, -73.895): "017702"}, addresses = {"1 Main St, Bronx, NY": "017702"})
+
+
+def test_batch_is_deduplicated(static, tmp_path):
+    geocoder = GeocodeCache(str(tmp_path / "cache.sqlite"), static)
+    addresses = ["1 Main St, Bronx, NY", "1 MAIN ST,  bronx, ny", "9 Nowhere Ave, Bronx, NY", "1 Main St, Bronx, NY"]
+    assert geocoder.address_tracts(addresses) == ["017702", "017702", None, "017702"]
+    #one lookup per normalized address
+    assert static.calls == 2
+
+    assert geocoder.address_tracts(["9 NOWHERE AVE, BRONX, NY"]) == [None]
+    #misses are cached too
+    assert static.calls == 2
+
+
+def test_coordinates(static, tmp_path):
+    geocoder = GeocodeCache(str(tmp_path / "cache.sqlite"), static)
+    assert geocoder.coordinate_tracts([40.805, 40.8050000001, float('nan')], [-73.895, -73.895, -73.9]) == ["017702", "017702", None]
+    #the same rounded point is looked up once, and a point without coordinates never
+    assert static.calls == 1
+
+
+def test_cache_persists(static, tmp_path):
+    GeocodeCache(str(tmp_path / "cache.sqlite"), static).address_tracts(["1 Main St, Bronx, NY"])
+    fresh = StaticGeocoder()
+    reopened = GeocodeCache(str(tmp_path / "cache.sqlite"), fresh)
+    assert reopened.address_tracts(["1 Main St, Bronx, NY"]) == ["017702"]
+    assert fresh.calls == 0
+    assert reopened.stats['cached'] == 1
+    assert reopened.stats['looked_up'] == 0
+
+
+def test_offline(static, tmp_path):
+    geocoder = GeocodeCache(str(tmp_path / "cache.sqlite"), static, offline = True)
+    assert geocoder.address_tracts(["1 Main St, Bronx, NY"]) == [None]
+    assert static.calls == 0
+
+
+def test_errors_are_not_cached(tmp_path):
+    failing = FailingGeocoder(1, addresses = {"1 Main St, Bronx, NY": "017702"})
+    geocoder = GeocodeCache(str(tmp_path / "cache.sqlite"), failing, retries = 0)
+    assert geocoder.address_tracts(["1 Main St, Bronx, NY"]) == [None]
+    #asked again on the next batch, which now gets an answer
+    assert geocoder.address_tracts(["1 Main St, Bronx, NY"]) == ["017702"]
+    assert failing.calls == 2
+
+
+TIMEOUT = 0.5
+
+
+class MockCensus(BaseHTTPRequestHandler):
+    calls = Counter()
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        address = parse_qs(url.query).get('address', [""])[0]
+        cls = type(self)
+        with cls.lock:
+            cls.calls[address] += 1
+            attempt = cls.calls[address]
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            time.sleep(0.02)
+            if "SLOW" in address:
+                time.sleep(TIMEOUT * 3)
+            if "FLAKY" in address and attempt <= 2:
+                self.send_response(500)
+                self.end_headers()
+                return
+            if url.path.endswith("/coordinates"):
+                tract = {'TRACT': "000100", 'CENTLAT': "40.7", 'CENTLON': "-73.9", 'INTPTLAT': "40.7", 'INTPTLON': "-73.9"}
+                result = {'geographies': {'Census Tracts': [tract]}}
+            elif "NOWHERE" in address:
+                result = {'addressMatches': []}
+            else:
+                result = {'addressMatches': [{'geographies': {'Census Tracts': [{'TRACT': "017702"}]}}]}
+            body = json.dumps({'result': result}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+
+@pytest.fixture
+def census():
+    MockCensus.calls = Counter()
+    MockCensus.active = MockCensus.max_active = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCensus)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield "http://127.0.0.1:" + str(server.server_address[1]) + "/geocoder"
+    server.shutdown()
+    server.server_close()
+
+
+def cache(url, tmp_path, **options):
+    options = {'retries': 2, 'backoff': 0.01, **options}
+    return GeocodeCache(str(tmp_path / "cache.sqlite"), CensusGeocoder(timeout = TIMEOUT, url = url), **options)
+
+
+def test_hit_miss_and_cache(census, tmp_path):
+    geocoder = cache(census, tmp_path)
+    tracts, statuses = geocoder.address_tracts(["1 Main St, Bronx, NY", "1 NOWHERE Ave, Bronx, NY"], with_status = True)
+    assert tracts == ["017702", None]
+    assert statuses == ['hit', 'miss']
+    assert geocoder.coordinate_tracts([40.7], [-73.9]) == ["000100"]
+
+    before = sum(MockCensus.calls.values())
+    tracts, statuses = geocoder.address_tracts(["1 MAIN ST,  bronx, ny"], with_status = True)
+    assert tracts == ["017702"]
+    assert statuses == ['hit']
+    assert geocoder.stats['cached'] == 1
+    assert sum(MockCensus.calls.values()) == before
+
+
+def test_flaky_endpoint_succeeds_after_retries(census, tmp_path):
+    tracts, statuses = cache(census, tmp_path).address_tracts(["2 FLAKY St, Bronx, NY"], with_status = True)
+    assert tracts == ["017702"]
+    assert statuses == ['hit']
+    assert MockCensus.calls["2 FLAKY ST, BRONX, NY"] == 3
+
+
+def test_errors_are_not_cached(census, tmp_path):
+    geocoder = cache(census, tmp_path, retries = 1)
+    assert geocoder.address_tracts(["2 FLAKY St, Bronx, NY"], with_status = True) == ([None], ['error'])
+    #the failure wasn't cached, so the next run asks again (and the mock now answers)
+    assert geocoder.address_tracts(["2 FLAKY St, Bronx, NY"], with_status = True) == (["017702"], ['hit'])
+
+
+def test_timeout(census, tmp_path):
+    tracts, statuses = cache(census, tmp_path, retries = 0).address_tracts(["3 SLOW St, Bronx, NY"], with_status = True)
+    assert tracts == [None]
+    assert statuses == ['timeout']
+
+
+def test_workers_are_bounded(census, tmp_path):
+    geocoder = cache(census, tmp_path, workers = 4)
+    addresses = [str(i) + " Main St, Bronx, NY" for i in range(24)]
+    assert geocoder.address_tracts(addresses) == ["017702"] * 24
+    assert 1 < MockCensus.max_active <= 4
+
+
+def test_rate_cap(census, tmp_path):
+    #a burst of `rate` lookups, then `rate` per second
+    rate = 20
+    geocoder = cache(census, tmp_path, workers = 8, rate = rate)
+    addresses = [str(i) + " Main St, Bronx, NY" for i in range(2 * rate)]
+    start = time.perf_counter()
+    geocoder.address_tracts(addresses)
+    assert time.perf_counter() - start >= (len(addresses) - rate) / rate * 0.9
+    assert geocoder.stats['looked_up'] == len(addresses)
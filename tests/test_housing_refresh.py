@@ -0,0 +1,132 @@
+# An incremental refresh (refresh_housing, then refresh_tracts) against a full rebuild of a
+# new release in which buildings were added, removed and changed. Six Bronx tracts side by
+# side stand in for the tract GeoJSON, and a StaticGeocoder for the Census geocoder.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loaders import HOUSING_COLUMNS
+from geocoding import GeocodeCache, StaticGeocoder
+from housing_refresh import diff_buildings, refresh_housing, refresh_tracts, row_hashes
+from housing_tracts import clean_housing
+from pipeline import combine_tracts, family_tracts, imputed_tracts
+from tract_geometry import TractLocator
+from tract_imputation import INC_COLS
+from tract_rollup import UNIT_COLS
+
+TRACTS = [1, 2, 3, 4, 5, 6]
+KEYS = [2000000 + 100 * tract for tract in TRACTS]
+
+
+def square(tract):
+    lon, lat = -73.95 + 0.01 * tract, 40.80
+    ring = [[lon, lat], [lon + 0.01, lat], [lon + 0.01, lat + 0.01], [lon, lat + 0.01], [lon, lat]]
+    ct2010 = "{:04d}00".format(tract)
+    return {'type': 'Feature', 'properties': {'ct2010': ct2010, 'boro_code': "2", 'boro_ct2010': "2" + ct2010},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+GEOJSON = {'type': 'FeatureCollection', 'features': [square(tract) for tract in TRACTS]}
+
+
+def inside(tract):
+    return (40.805, -73.945 + 0.01 * tract)
+
+
+def building(project, building_id, tract, units, located=None, address=(None, None)):
+    #one raw release row: the HPD tract (or "" to find it), its coordinates and an address
+    lat, lon = inside(located) if located else (np.nan, np.nan)
+    row = {'Project ID': project, 'Building ID': building_id, 'Number': address[0], 'Street': address[1], 'Borough': "Bronx", 'Postcode': 10451,
+           'Census Tract': tract, 'Latitude': lat, 'Longitude': lon, 'Building Completion Date': "06/30/2018"}
+    row.update({col: 0 for col in HOUSING_COLUMNS if col.endswith("Units")})
+    row.update(units)
+    return row
+
+
+def release(rows):
+    return pd.DataFrame(rows).astype(HOUSING_COLUMNS)
+
+
+BEFORE = [
+    building(1, 1, "1", {'Low Income Units': 10}),
+    building(1, 2, "2", {'Very Low Income Units': 5, 'Low Income Units': 3}),
+    building(2, 1, "", {'Middle Income Units': 8}, located = 2),
+    building(3, None, "3", {'Moderate Income Units': 4}),
+    building(4, 1, "", {'Extremely Low Income Units': 6}, address = ("1", "Main St")),
+    building(5, 1, "6", {'Low Income Units': 7, 'Studio Units': 7}),
+]
+AFTER = [
+    #building (1, 1) was removed, and with it the only building in tract 1
+    building(1, 2, "2", {'Very Low Income Units': 5, 'Low Income Units': 9}),            #more units
+    building(2, 1, "", {'Middle Income Units': 8}, located = 2),
+    building(3, None, "4", {'Moderate Income Units': 4}),                                #moved to tract 4
+    building(4, 1, "", {'Extremely Low Income Units': 6}, address = ("1", "Main St")),
+    building(5, 1, "6", {'Low Income Units': 7, 'Studio Units': 7}),
+    building(6, 1, "5", {'Middle Income Units': 2}),                                      #new, in a new tract
+    building(6, 2, "", {'Low Income Units': 1}, address = ("2", "Main St")),             #new, looked up
+    building(7, 1, "", {'Low Income Units': 1}),                                          #new, never found
+]
+
+
+@pytest.fixture
+def census():
+    income = pd.DataFrame({'Census Tract': ["BX{:04d}.00".format(tract) for tract in TRACTS], 'Tract Key': KEYS})
+    for i, col in enumerate(INC_COLS):
+        #tract 5 is missing incomes, imputed from its neighbors
+        income[col] = [str(20000 * tract + 1000 * i) if tract != 5 else "-" for tract in TRACTS]
+    income['Tract No Code'] = [float(tract) for tract in TRACTS]
+    income['Boro'] = "BX"
+    family = pd.DataFrame({'GEO_ID': ["1400000US36005{:04d}00".format(tract) for tract in TRACTS]})
+    for i, col in enumerate(['B11016_003E', 'B11016_004E', 'B11016_005E', 'B11016_006E', 'B11016_007E', 'B11016_008E', 'B11016_009E']):
+        family[col] = [(tract * (i + 3)) % 11 for tract in TRACTS]
+    family['B11016_001E'] = family.drop(columns = 'GEO_ID').sum(axis = 1)
+    return income, family_tracts(family)
+
+
+@pytest.fixture
+def geocoder():
+    static = StaticGeocoder(addresses = {"1 Main St, Bronx, NY": "000300", "2 Main St, Bronx, NY": "000500"})
+    return GeocodeCache(":memory:", static)
+
+
+def rebuild(data, income, family, geocoder):
+    #the full build, as pipeline.build_tables does it
+    data = data.copy()
+    data['Row Hash'] = row_hashes(data)
+    housing = clean_housing(data, TractLocator(GEOJSON), geocoder)
+    return housing, combine_tracts(housing, imputed_tracts(housing, income), family)
+
+
+def test_diff_buildings():
+    before, after = release(BEFORE), release(AFTER)
+    before['Row Hash'] = row_hashes(before)
+    #unchanged buildings point at their previous rows, even without a Building ID
+    assert diff_buildings(before, after).tolist() == [-1, 2, -1, 4, 5, -1, -1, -1]
+
+
+def test_refresh_matches_rebuild(census, geocoder):
+    income, family = census
+    previous, previous_combined = rebuild(release(BEFORE), income, family, geocoder)
+    assert previous_combined['Tract Key'].tolist() == [2000100, 2000200, 2000300, 2000600]
+
+    looked_up = geocoder.stats['looked_up']
+    housing, affected = refresh_housing(previous, release(AFTER), geocoder, TractLocator(GEOJSON))
+    #only the new address was sent to the geocoder
+    assert geocoder.stats['looked_up'] == looked_up + 1
+    assert sorted(affected) == [2000100, 2000200, 2000300, 2000400, 2000500]
+    combined = refresh_tracts(previous_combined, housing, income, family, affected)
+
+    expected_housing, expected = rebuild(release(AFTER), income, family, geocoder)
+    pd.testing.assert_frame_equal(housing[expected_housing.columns], expected_housing)
+    pd.testing.assert_frame_equal(combined, expected)
+    assert combined['Tract Key'].tolist() == [2000200, 2000300, 2000400, 2000500, 2000600]
+
+
+def test_nothing_changed(census, geocoder):
+    income, family = census
+    previous, previous_combined = rebuild(release(BEFORE), income, family, geocoder)
+    housing, affected = refresh_housing(previous, release(BEFORE), geocoder, TractLocator(GEOJSON))
+    assert len(affected) == 0
+    pd.testing.assert_frame_equal(housing, previous)
+    pd.testing.assert_frame_equal(refresh_tracts(previous_combined, housing, income, family, affected), previous_combined)
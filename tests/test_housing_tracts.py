@@ -0,0 +1,80 @@
+# clean_housing offline: a two-tract TractLocator and a StaticGeocoder stand in for the tract
+# GeoJSON and the Census geocoder.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from geocoding import GeocodeCache, StaticGeocoder
+from housing_tracts import clean_housing
+from tract_geometry import TractLocator
+
+
+def square(ct2010, lon, lat, size=0.01):
+    ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+    return {'type': 'Feature', 'properties': {'ct2010': ct2010, 'boro_code': "2", 'boro_ct2010': "2" + ct2010},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+#Bronx tract 177.02 and tract 3.01 side by side
+GEOJSON = {'type': 'FeatureCollection', 'features': [square("017702", -73.90, 40.80), square("000301", -73.89, 40.80)]}
+IN_17702 = (40.805, -73.895)
+IN_301 = (40.805, -73.885)
+
+
+@pytest.fixture
+def cleaned():
+    rows = [
+        #tract, (lat, lon), number, street
+        ("", IN_17702, None, None),                     #missing, located from the coordinates
+        ("Not Found", (np.nan, np.nan), "1", "Main St"),  #missing, looked up by address
+        ("", (np.nan, np.nan), "9", "Nowhere Ave"),       #missing, and the geocoder has no answer
+        ("1702", IN_17702, "2", "Main St"),               #ambiguous (17.02 or 1702)
+        ("301", IN_301, "3", "Main St"),                  #ambiguous (3.01 or 301)
+        ("46201", IN_301, "4", "Main St"),                #unambiguous, kept even though it's elsewhere
+        (np.nan, (np.nan, np.nan), None, None),          #no tract and nothing to find it with
+    ]
+    data = pd.DataFrame({
+        'Census Tract': [row[0] for row in rows],
+        'Latitude': [row[1][0] for row in rows],
+        'Longitude': [row[1][1] for row in rows],
+        'Number': [row[2] for row in rows],
+        'Street': [row[3] for row in rows],
+        'Borough': "Bronx",
+    }, index = np.arange(10, 10 + len(rows)))
+    static = StaticGeocoder(addresses = {"1 Main St, Bronx, NY": "004400"})
+    geocoder = GeocodeCache(":memory:", static)
+    return clean_housing(data, TractLocator(GEOJSON), geocoder), static, geocoder
+
+
+def test_filled_tracts(cleaned):
+    data, static, geocoder = cleaned
+    #only the building without any tract is dropped
+    assert list(data.index) == [10, 11, 12, 13, 14, 15]
+    found = data.drop(index = 12)
+    assert found['Tract Key'].tolist() == [2017702, 2004400, 2017702, 2000301, 2046201]
+    assert found['Census Tract'].tolist() == ["BX0177.02", "BX0044.00", "BX0177.02", "BX0003.01", "BX0462.01"]
+
+
+def test_unfound_tract_has_no_key(cleaned):
+    #as in the original script, a blank tract that couldn't be found is kept, but without a
+    #tract key it never joins onto the tract tables
+    data, static, geocoder = cleaned
+    assert pd.isna(data.loc[12, 'Tract Key'])
+    assert data.loc[12, 'Geocode Status'] == 'miss'
+
+
+def test_geocoder_only_gets_addresses(cleaned):
+    data, static, geocoder = cleaned
+    #the located building never reaches the geocoder, the two address-only ones do
+    assert static.calls == 2
+    assert geocoder.stats['looked_up'] == 2
+
+
+def test_statuses(cleaned):
+    data, static, geocoder = cleaned
+    assert data.loc[10, 'Geocode Status'] == 'hit'
+    assert data.loc[11, 'Geocode Status'] == 'hit'
+    #buildings that already had a tract weren't geocoded
+    assert data.loc[[13, 14, 15], 'Geocode Status'].isna().all()
+    assert geocoder.stats['miss'] == 1
@@ -0,0 +1,46 @@
+# Imputing every tract or only the ones with buildings: the imputed table changes, the
+# combined tract table doesn't.
+
+import numpy as np
+import pandas as pd
+
+from pipeline import IMPUTED_COLUMNS, combine_tracts, imputed_tracts
+from tract_imputation import INC_COLS
+from tract_rollup import UNIT_COLS
+
+
+def income_data():
+    keys = [2000100, 2000200, 2000300, 2000400]
+    data = pd.DataFrame({'Census Tract': ["BX0001.00", "BX0002.00", "BX0003.00", "BX0004.00"], 'Tract Key': keys})
+    for i, col in enumerate(INC_COLS):
+        data[col] = [str(10000 * (i + 1)), "-", str(30000 * (i + 1)), "-"]
+    data['Tract No Code'] = [1.0, 2.0, 3.0, 4.0]
+    data['Boro'] = "BX"
+    return data
+
+
+def family_data(keys):
+    return pd.DataFrame({'Census Tract': "", 'Tract Key': keys, 'mode_family': 'two_person_hh'})
+
+
+def housing_data():
+    data = pd.DataFrame({'Tract Key': [2000200, 2000200, 2000300]})
+    for col in UNIT_COLS:
+        data[col] = 1
+    return data
+
+
+def test_impute_all_tracts():
+    income = income_data()
+    some = imputed_tracts(housing_data(), income)
+    every = imputed_tracts(housing_data(), income, impute_all_tracts = True)
+    assert some['Tract Key'].tolist() == [2000200, 2000300]
+    assert every['Tract Key'].tolist() == [2000100, 2000200, 2000300, 2000400]
+    #tract 2 is the average of tracts 1 and 3; tract 4 gets tract 3 alone, since the original
+    #scan replaces the nearest tract without keeping it as the runner-up
+    assert every.loc[1, INC_COLS[0]] == 20000.0
+    assert every.loc[3, INC_COLS[0]] == 30000.0
+    assert every.loc[some.index, IMPUTED_COLUMNS].equals(some[IMPUTED_COLUMNS])
+
+    family = family_data(income['Tract Key'])
+    assert combine_tracts(housing_data(), some, family).equals(combine_tracts(housing_data(), every, family))
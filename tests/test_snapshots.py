@@ -0,0 +1,77 @@
+# Snapshot keys and the SnapshotCache, in a temporary directory.
+
+import os
+
+import pandas as pd
+import pytest
+
+from snapshots import SnapshotCache, snapshot_key
+
+pytest.importorskip('pyarrow')
+
+
+def tables(n=3):
+    return {'housing_data': pd.DataFrame({'Tract Key': pd.array(range(n), dtype = 'Int64'), 'Borough': "Bronx"}),
+            'combined_data': pd.DataFrame({'mode_diff': [float(i) for i in range(n)]})}
+
+
+def test_key_changes_with_inputs_code_and_params(tmp_path):
+    data, code = tmp_path / "data.csv", tmp_path / "module.py"
+    data.write_text("a,b\n1,2\n")
+    code.write_text("x = 1\n")
+    key = snapshot_key([str(data)], code = [str(code)], params = [False])
+    assert snapshot_key([str(data)], code = [str(code)], params = [False]) == key
+    assert snapshot_key([str(data)], code = [str(code)], params = [True]) != key
+    assert snapshot_key([str(data)], code = [], params = [False]) != key
+
+    code.write_text("x = 2\n")
+    changed = snapshot_key([str(data)], code = [str(code)], params = [False])
+    assert changed != key
+    data.write_text("a,b\n1,3\n")
+    assert snapshot_key([str(data)], code = [str(code)], params = [False]) not in (key, changed)
+
+
+def test_missing_inputs_hash_as_empty(tmp_path):
+    data = tmp_path / "data.csv"
+    missing = snapshot_key([str(data)], code = [])
+    data.write_text("")
+    assert snapshot_key([str(data)], code = []) == missing
+    data.write_text("a\n")
+    assert snapshot_key([str(data)], code = []) != missing
+
+
+def test_round_trip(tmp_path):
+    cache = SnapshotCache("base-1", str(tmp_path))
+    names = list(tables())
+    assert cache.load(names) is None
+    cache.save(tables())
+    for loaded, table in zip(cache.load(names), tables().values()):
+        pd.testing.assert_frame_equal(loaded, table)
+    #every name has to be there
+    assert cache.load(names + ['family_data']) is None
+
+
+def test_save_removes_other_keys(tmp_path):
+    SnapshotCache("base-1", str(tmp_path)).save(tables())
+    SnapshotCache("base-2", str(tmp_path)).save({'housing_data': tables()['housing_data']})
+    #only the table that was saved again loses its old snapshot
+    assert sorted(os.listdir(tmp_path)) == ["combined_data-base-1.arrow", "housing_data-base-2.arrow"]
+    assert SnapshotCache("base-1", str(tmp_path)).load(['housing_data']) is None
+
+
+def test_previous(tmp_path):
+    names = list(tables())
+    SnapshotCache("base-1", str(tmp_path)).save(tables(2))
+    current = SnapshotCache("base-2", str(tmp_path))
+    previous = current.previous(names, "base-")
+    assert [len(table) for table in previous] == [2, 2]
+    #not for another prefix, and never the cache's own snapshots
+    assert current.previous(names, "other-") is None
+    current.save(tables(4))
+    assert current.previous(names, "base-") is None
+    assert SnapshotCache("base-3", str(tmp_path)).previous(names, "base-")[0]['Tract Key'].tolist() == [0, 1, 2, 3]
+
+
+def test_previous_needs_every_table(tmp_path):
+    SnapshotCache("base-1", str(tmp_path)).save({'housing_data': tables()['housing_data']})
+    assert SnapshotCache("base-2", str(tmp_path)).previous(list(tables()), "base-") is None
@@ -0,0 +1,80 @@
+# Crosswalk on a hand-built relationship table: 2010 tract 1.00 was split into 2020 tracts
+# 1.01 and 1.02, and 2010 tracts 2.00 and 3.00 were merged into 2020 tract 2.00.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tract_crosswalk import Crosswalk
+
+#2020 tract, 2010 tract, land area of the piece
+PIECES = [
+    (2000101, 2000100, 30),
+    (2000102, 2000100, 10),
+    (2000200, 2000200, 20),
+    (2000200, 2000300, 60),
+]
+RELATIONSHIP = "GEOID_TRACT_20|GEOID_TRACT_10|AREALAND_PART|AREAWATER_PART\n" + "".join(
+    "36005{:06d}|36005{:06d}|{}|5\n".format(new % 10 ** 6, old % 10 ** 6, land) for new, old, land in PIECES)
+
+
+@pytest.fixture
+def forward():
+    return Crosswalk([row[1] for row in PIECES], [row[0] for row in PIECES], [row[2] for row in PIECES])
+
+
+def test_counts_keep_totals(forward):
+    data = pd.DataFrame({'Tract Key': [2000100, 2000200, 2000300], 'units': [100, 40, 60], 'households': [8, 0, 4]})
+    counts = forward.counts(data, ['units', 'households'])
+    assert list(counts.index) == [2000101, 2000102, 2000200]
+    #the split tract by area (30:10), the merged ones added up
+    assert counts['units'].tolist() == [75, 25, 100]
+    assert counts['households'].tolist() == [6, 2, 4]
+    assert counts.sum().tolist() == data[['units', 'households']].sum().tolist()
+
+
+def test_counts_missing_sources(forward):
+    #keyed by the index this time; a missing tract contributes nothing, and a target with
+    #no source values at all is NaN rather than 0
+    data = pd.DataFrame({'units': [100, np.nan]}, index = [2000100, 2000300])
+    counts = forward.counts(data, ['units'])
+    assert counts['units'].tolist()[:2] == [75, 25]
+    assert np.isnan(counts.loc[2000200, 'units'])
+
+
+def test_averages_weight_by_area(forward):
+    data = pd.DataFrame({'Tract Key': [2000100, 2000200, 2000300], 'income': [50000, 40000, 80000]})
+    averages = forward.averages(data, ['income'])
+    #both halves of the split tract get its value; the merged tract is weighted 20:60
+    assert averages['income'].tolist() == [50000, 50000, pytest.approx((20 * 40000 + 60 * 80000) / 80)]
+
+
+def test_averages_weight_by_area_and_weights(forward):
+    data = pd.DataFrame({'Tract Key': [2000100, 2000200, 2000300], 'income': [50000, 40000, 80000]})
+    households = pd.Series([10, 300, 100], index = [2000100, 2000200, 2000300])
+    averages = forward.averages(data, ['income'], weights = households)
+    assert averages.loc[2000200, 'income'] == pytest.approx((20 * 300 * 40000 + 60 * 100 * 80000) / (20 * 300 + 60 * 100))
+    assert averages.loc[2000101, 'income'] == 50000
+
+
+def test_averages_fallbacks(forward):
+    data = pd.DataFrame({'Tract Key': [2000100, 2000200, 2000300], 'income': [50000, 40000, np.nan]})
+    #a missing value is left out of the average
+    assert forward.averages(data, ['income']).loc[2000200, 'income'] == 40000
+    #sources that all weigh 0 fall back to area weights
+    data['income'] = [50000, 40000, 80000]
+    averages = forward.averages(data, ['income'], weights = pd.Series([0, 0, 0], index = [2000100, 2000200, 2000300]))
+    assert averages.loc[2000200, 'income'] == pytest.approx((20 * 40000 + 60 * 80000) / 80)
+
+
+def test_from_relationship_file(tmp_path):
+    path = tmp_path / "relationship.txt"
+    path.write_text(RELATIONSHIP)
+    data = pd.DataFrame({'Tract Key': [2000101, 2000102, 2000200], 'units': [75, 25, 100]})
+    backward = Crosswalk.from_relationship_file('2020', path = str(path))
+    #the two pieces of the split tract come back together, the merged tract splits 20:60
+    assert backward.counts(data, ['units'])['units'].tolist() == [100, 25, 75]
+    forward = Crosswalk.from_relationship_file('2010', path = str(path))
+    assert forward.counts(pd.DataFrame({'Tract Key': [2000100], 'units': [100]}), ['units'])['units'].tolist()[:2] == [75, 25]
+    with pytest.raises(ValueError):
+        Crosswalk.from_relationship_file('2000', path = str(path))
@@ -0,0 +1,187 @@
+# impute_income against a literal port of the original row-by-row nearest tract scan
+# (impute_inc in the first version of the notebook), on small synthetic boroughs, and the
+# fallback and borough bound of impute_income_knn.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tract_imputation import BORO_SEPARATION, INC_COLS, impute_income, impute_income_knn
+
+
+def float_converter(string):
+    string = string.replace(",", "")
+    string = string.replace("+", "")
+    try:
+        flt = float(string)
+    except ValueError:
+        flt = 250000.00
+    return flt
+
+
+def old_impute(boro_inc, row):
+    # The original scan for one row: two slots, filled in row order, where a closer eligible
+    # tract replaces slot 0 without moving it to slot 1, and label 0 means "no tract"
+    inc_vals = [row[col] for col in INC_COLS]
+    missing_vals = [x for x, val in enumerate(inc_vals) if str(val).find("-") != -1]
+    if not missing_vals:
+        return inc_vals
+    tract = row['Tract No Code']
+    min_diff = [999.99, 999.99]
+    comparison_ct = [0, 0]
+    for index, ct in boro_inc['Tract No Code'].items():
+        diff = abs(ct - tract)
+        eligible = not any(str(boro_inc.loc[index, col]).find("-") != -1 and z in missing_vals for z, col in enumerate(INC_COLS))
+        if diff < min_diff[0]:
+            if eligible:
+                min_diff[0] = diff
+                comparison_ct[0] = index
+        elif diff < min_diff[1]:
+            if eligible:
+                min_diff[1] = diff
+                comparison_ct[1] = index
+    if comparison_ct[0] != 0 and comparison_ct[1] != 0:
+        imputed = [(float_converter(boro_inc.loc[comparison_ct[0], INC_COLS[i]]) + float_converter(boro_inc.loc[comparison_ct[1], INC_COLS[i]])) / 2 for i in missing_vals]
+    elif comparison_ct[0] != 0:
+        imputed = [float_converter(boro_inc.loc[comparison_ct[0], INC_COLS[i]]) for i in missing_vals]
+    else:
+        return inc_vals
+    return [imputed[missing_vals.index(y)] if y in missing_vals else val for y, val in enumerate(inc_vals)]
+
+
+def borough(codes, values, boro=2):
+    # An income table for one borough in census order, with labels from 1 (the original
+    # scan can't use a tract labelled 0)
+    codes = np.asarray(codes, dtype = float)
+    keys = boro * 10 ** 6 + np.round(codes * 100).astype(np.int64)
+    prefix = {1: 'M', 2: 'BX', 3: 'BK', 4: 'Q', 5: 'SI'}[boro]
+    data = pd.DataFrame(values, columns = INC_COLS, index = np.arange(1, len(codes) + 1))
+    data.insert(0, 'Tract Key', keys)
+    data.insert(1, 'Census Tract', [prefix + "{:07.2f}".format(code) for code in codes])
+    data.insert(2, 'Boro', prefix)
+    data['Tract No Code'] = codes
+    return data
+
+
+def assert_matches_old_scan(data):
+    imputed, filled = impute_income(data)
+    for pos, (label, row) in enumerate(data.iterrows()):
+        expected = old_impute(data, row)
+        for i, value in enumerate(expected):
+            if isinstance(value, str):
+                #left missing (or never missing) by the original scan
+                assert not filled[pos, i] or str(row[INC_COLS[i]]).find("-") == -1
+            else:
+                assert filled[pos, i]
+                assert imputed[pos, i] == pytest.approx(value)
+
+
+def random_borough(rng, n=40):
+    codes = np.sort(rng.choice(np.arange(1, 400) + rng.choice([0, 0.01, 0.02], 399), n, replace = False))
+    #a few tracts share a code with their neighbor
+    codes[5] = codes[4]
+    codes[20] = codes[21] = codes[19]
+    values = rng.choice([25000, 41250, 250000, 98765], size = (n, len(INC_COLS))).astype(object)
+    values = np.vectorize(lambda v: "250,000+" if v == 250000 else "{:,}".format(v))(values).astype(object)
+    values[rng.random(values.shape) < 0.2] = "-"
+    values[rng.random(values.shape) < 0.03] = "2,500-"
+    return borough(codes, values)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_boroughs(seed):
+    assert_matches_old_scan(random_borough(np.random.default_rng(seed)))
+
+
+def test_duplicate_codes():
+    #the second tract sharing a code is kept as the runner-up, even with a closer tract later
+    values = [["10,000"] * 7, ["20,000"] * 7, ["-"] + ["1"] * 6, ["30,000"] * 7, ["40,000"] * 7]
+    data = borough([1.0, 1.0, 2.0, 2.5, 3.0], values)
+    assert_matches_old_scan(data)
+    imputed, filled = impute_income(data)
+    assert filled[2, 0]
+
+
+def test_no_eligible_neighbor():
+    #every other tract is missing the same column, so nothing is filled, and a neighbor
+    #needs data for every column the target is missing
+    values = [["-"] + ["1"] * 6, ["-"] + ["2"] * 6, ["-", "-"] + ["3"] * 5]
+    data = borough([1.0, 2.0, 3.0], values)
+    assert_matches_old_scan(data)
+    imputed, filled = impute_income(data)
+    assert not filled.any()
+
+
+def test_cutoff():
+    #tracts 999.99 or more apart are never neighbors
+    values = [["10,000"] * 7, ["-"] * 7, ["30,000"] * 7]
+    data = borough([1.0, 1001.0, 2001.5], values)
+    assert_matches_old_scan(data)
+    assert not impute_income(data)[1][1].any()
+
+    data = borough([1.0, 1000.5, 2001.0], values)
+    assert_matches_old_scan(data)
+    imputed, filled = impute_income(data)
+    assert filled[1].all()
+    assert imputed[1, 0] == 10000.0
+
+
+def test_targets():
+    data = random_borough(np.random.default_rng(42))
+    every, every_filled = impute_income(data)
+    rows = [3, 10, 17]
+    some, some_filled = impute_income(data, data.index[rows])
+    assert np.array_equal(some_filled, every_filled[rows])
+    assert np.allclose(some, every[rows], equal_nan = True)
+
+
+def centroids_of(data, points):
+    return pd.DataFrame(points, columns = ['x', 'y'], index = pd.Index(data['Tract Key'].to_numpy(), dtype = np.int64))
+
+
+def test_knn_without_centroid_falls_back():
+    #the target has no centroid, so it gets the tract number method's values
+    values = [["10,000"] * 7, ["-"] * 7, ["30,000"] * 7, ["50,000"] * 7]
+    data = borough([1.0, 2.0, 3.0, 40.0], values)
+    centroids = centroids_of(data, [[0, 0], [np.nan, np.nan], [500, 0], [1, 0]])
+    imputed, filled = impute_income_knn(data, centroids = centroids)
+    expected, expected_filled = impute_income(data)
+    assert np.array_equal(filled, expected_filled)
+    assert np.allclose(imputed, expected, equal_nan = True)
+    assert imputed[1, 0] == 20000.0
+
+    #or is left out of the centroids altogether
+    imputed, filled = impute_income_knn(data, centroids = centroids.drop(data['Tract Key'].iloc[1]))
+    assert filled[1].all()
+    assert imputed[1, 0] == 20000.0
+
+
+def test_knn_stays_in_borough():
+    #the nearest tract with data is across the borough line; without cross_boro the target
+    #uses the farther one in its own borough
+    bronx = borough([1.0, 2.0], [["-"] * 7, ["20,000"] * 7], boro=2)
+    brooklyn = borough([1.0], [["90,000"] * 7], boro=3)
+    data = pd.concat([bronx, brooklyn], ignore_index = True)
+    centroids = centroids_of(data, [[0, 0], [BORO_SEPARATION * 0.4, 0], [1, 0]])
+
+    imputed, filled = impute_income_knn(data, k = 1, centroids = centroids)
+    assert filled[0].all()
+    assert imputed[0, 0] == 20000.0
+    imputed, filled = impute_income_knn(data, k = 2, centroids = centroids)
+    assert imputed[0, 0] == 20000.0
+
+    imputed, filled = impute_income_knn(data, k = 1, cross_boro = True, centroids = centroids)
+    assert imputed[0, 0] == 90000.0
+
+
+def test_knn_no_neighbor_in_borough():
+    #the only tract with data is in another borough: nothing is filled without cross_boro
+    bronx = borough([1.0, 2.0], [["-"] * 7, ["-"] * 7], boro=2)
+    brooklyn = borough([1.0], [["90,000"] * 7], boro=3)
+    data = pd.concat([bronx, brooklyn], ignore_index = True)
+    centroids = centroids_of(data, [[0, 0], [5, 0], [1, 0]])
+    imputed, filled = impute_income_knn(data, centroids = centroids)
+    assert not filled[:2].any()
+    imputed, filled = impute_income_knn(data, cross_boro = True, centroids = centroids)
+    assert filled[:2].all()
+    assert imputed[0, 0] == 90000.0
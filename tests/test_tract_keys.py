@@ -0,0 +1,107 @@
+# Tract keys to and from each of the formats the datasets use, for a tract in every borough,
+# with and without a decimal part.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tract_keys import (BORO_CODES, boro_code, from_boro_ct2010, from_geo_id, from_hpd, from_tract_name, parse_tract, to_boro_ct2010,
+                        to_geo_id, to_tract_name, tract_name, tract_number)
+
+#key, tract name, ACS GEO_ID, HPD tract, borough
+TRACTS = [
+    (1000100, "M0001.00", "1400000US36061000100", "1", "Manhattan"),
+    (2017702, "BX0177.02", "1400000US36005017702", "17702", "Bronx"),
+    (3000301, "BK0003.01", "1400000US36047000301", "301", "Brooklyn"),
+    (4157101, "Q1571.01", "1400000US36081157101", "157101", "Queens"),
+    (5002900, "SI0029.00", "1400000US36085002900", "29", "Staten Island"),
+]
+KEYS = pd.Series([row[0] for row in TRACTS], dtype = 'Int64')
+NAMES = [row[1] for row in TRACTS]
+GEO_IDS = [row[2] for row in TRACTS]
+
+
+def test_key_parts():
+    assert boro_code(KEYS).tolist() == [1, 2, 3, 4, 5]
+    assert tract_number(KEYS).tolist() == [100, 17702, 301, 157101, 2900]
+    assert sorted(BORO_CODES.values()) == [1, 2, 3, 4, 5]
+
+
+def test_tract_names():
+    assert to_tract_name(KEYS).tolist() == NAMES
+    assert from_tract_name(NAMES).tolist() == KEYS.tolist()
+    assert [tract_name(key) for key in KEYS] == NAMES
+
+
+def test_geo_ids():
+    assert to_geo_id(KEYS).tolist() == GEO_IDS
+    assert from_geo_id(GEO_IDS).tolist() == KEYS.tolist()
+    #the plain 11 digit GEOID too
+    assert from_geo_id([geo_id[9:] for geo_id in GEO_IDS]).tolist() == KEYS.tolist()
+
+
+def test_boro_ct2010():
+    codes = to_boro_ct2010(KEYS)
+    assert codes.tolist() == ["1000100", "2017702", "3000301", "4157101", "5002900"]
+    assert from_boro_ct2010(codes).tolist() == KEYS.tolist()
+    assert from_boro_ct2010(KEYS.astype(int)).tolist() == KEYS.tolist()
+
+
+def test_unparseable_values_are_missing():
+    assert from_tract_name(["BX177.02", "XX0001.00", None]).isna().all()
+    #only the five NYC counties
+    assert from_geo_id(["1400000US36001000100", "1400000US06005017702", "bad"]).isna().all()
+    assert from_boro_ct2010(["6000100", "201770", " ", None]).isna().all()
+
+
+def test_missing_keys_stay_missing():
+    keys = pd.Series([2017702, None], dtype = 'Int64')
+    assert to_tract_name(keys).isna().tolist() == [False, True]
+    assert to_geo_id(keys).isna().tolist() == [False, True]
+    assert to_boro_ct2010(keys).isna().tolist() == [False, True]
+
+
+def test_from_hpd():
+    tracts = pd.Series([row[3] for row in TRACTS], index = [7, 8, 9, 10, 11])
+    boroughs = pd.Series([row[4] for row in TRACTS], index = tracts.index)
+    keys = from_hpd(tracts, boroughs, located = pd.Series(["000301"], index = [9]))
+    assert list(keys.index) == list(tracts.index)
+    assert keys.tolist() == KEYS.tolist()
+    #without a located tract, the ambiguous 301 (3.01 or 301) has no key
+    assert from_hpd(tracts, boroughs).isna().tolist() == [False, False, True, False, False]
+
+
+@pytest.mark.parametrize('tract, located, key', [
+    ("1702", "170200", 2170200),   #17.02 or 1702: located decides
+    ("1702", None, None),
+    ("1700", "000700", 2170000),   #ends in 00, so whole
+    ("120", None, 2012000),        #1.20 isn't a tract name, so 120
+    ("45", None, 2004500),
+    (" 17702 ", None, 2017702),
+    ("Not Found", "017702", None),
+    ("", "017702", None),
+    (np.nan, None, None),
+    ("1234567", None, None),
+])
+def test_hpd_tracts(tract, located, key):
+    keys = from_hpd(pd.Series([tract]), pd.Series(["bronx "]), located = pd.Series([located]))
+    assert (pd.isna(keys[0]) if key is None else keys[0] == key)
+
+
+def test_hpd_unknown_borough():
+    assert from_hpd(pd.Series(["17702"]), pd.Series(["New Jersey"])).isna().all()
+
+
+@pytest.mark.parametrize('key, name, geo_id, hpd, borough', TRACTS)
+def test_parse_tract(key, name, geo_id, hpd, borough):
+    assert parse_tract(key) == key
+    assert parse_tract(str(key)) == key
+    assert parse_tract(name) == key
+    assert parse_tract(name.lower()) == key
+    assert parse_tract(geo_id) == key
+    assert parse_tract(" " + geo_id[9:] + " ") == key
+
+
+def test_parse_tract_rejects():
+    for value in [None, True, 2017702.0, "", "Not Found", "36001000100", "BX177.02", "6000100"]:
+        assert parse_tract(value) is None
@@ -0,0 +1,78 @@
+# TractAllocation rollups: whole buildings against the groupby they replaced, buildings
+# split between tracts, and allocations moved onto other tracts through a Crosswalk.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tract_crosswalk import Crosswalk
+from tract_rollup import INCOME_UNIT_COLS, UNIT_COLS, TractAllocation, tract_unit_totals
+
+
+def buildings(rng, n=300):
+    data = pd.DataFrame({'Tract Key': pd.array(rng.choice([2017702, 2000301, 3044100, 1000100, None], n), dtype = 'Int64')})
+    for col in UNIT_COLS:
+        data[col] = rng.integers(0, 40, n)
+    #a float column with missing counts
+    data['Unknown-BR Units'] = np.where(rng.random(n) < 0.2, np.nan, rng.integers(0, 5, n))
+    return data
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_unit_totals_match_groupby(seed):
+    data = buildings(np.random.default_rng(seed))
+    expected = data.groupby('Tract Key')[UNIT_COLS].sum()
+    pd.testing.assert_frame_equal(tract_unit_totals(data), expected)
+
+
+def test_unit_totals_of_one_tract():
+    data = pd.DataFrame({'Tract Key': pd.array([2017702, 2017702], dtype = 'Int64'), 'Low Income Units': [3, 4]})
+    totals = tract_unit_totals(data, ['Low Income Units'])
+    assert totals['Low Income Units'].tolist() == [7]
+    assert totals['Low Income Units'].dtype == np.int64
+
+
+def test_from_pieces_normalises_rows():
+    #building 0 split 3:1, building 1 given shares that already add to 1, building 2 all
+    #zero shares, building 3 without any piece
+    allocation = TractAllocation.from_pieces([0, 0, 1, 1, 2], [2017702, 2000301, 2000301, 3044100, 3044100], [3, 1, 0.25, 0.75, 0], 4)
+    matrix = allocation.matrix.toarray()
+    assert allocation.tracts.tolist() == [2000301, 2017702, 3044100]
+    assert matrix.tolist() == [[0.25, 0.75, 0], [0.25, 0, 0.75], [0, 0, 0], [0, 0, 0]]
+
+    data = pd.DataFrame({'Low Income Units': [100, 40, 7, 9]})
+    totals = allocation.rollup(data, ['Low Income Units'])
+    assert totals['Low Income Units'].to_dict() == {2000301: 35, 2017702: 75, 3044100: 30}
+    #units of buildings with a share are all kept
+    assert totals['Low Income Units'].sum() == 140
+
+
+def test_repeated_pieces_add_up():
+    allocation = TractAllocation.from_pieces([0, 0, 0], [2017702, 2017702, 2000301], [1, 1, 2], 1)
+    assert allocation.matrix.toarray().tolist() == [[0.5, 0.5]]
+
+
+def test_rollup_checks_length():
+    allocation = TractAllocation.from_keys(pd.Series([2017702, None], dtype = 'Int64'))
+    with pytest.raises(ValueError):
+        allocation.rollup(pd.DataFrame({'Low Income Units': [1, 2, 3]}), ['Low Income Units'])
+    #the building without a tract counts nowhere
+    totals = allocation.rollup(pd.DataFrame({'Low Income Units': [1, 2]}), ['Low Income Units'])
+    assert totals['Low Income Units'].to_dict() == {2017702: 1}
+
+
+def test_to_geography():
+    #tract 1.00 splits 30:10 into 1.01 and 1.02, tracts 2.00 and 3.00 merge into 2.00; 9.00
+    #isn't in the crosswalk
+    crosswalk = Crosswalk([2000100, 2000100, 2000200, 2000300], [2000101, 2000102, 2000200, 2000200], [30, 10, 20, 60])
+    allocation = TractAllocation.from_pieces([0, 1, 2, 2, 3], [2000100, 2000200, 2000200, 2000300, 2000900], [1, 1, 1, 1, 1], 4)
+    moved = allocation.to_geography(crosswalk)
+    assert moved.tracts.tolist() == [2000101, 2000102, 2000200]
+    assert moved.matrix.toarray().tolist() == [[0.75, 0.25, 0], [0, 0, 1], [0, 0, 1], [0, 0, 0]]
+
+    data = pd.DataFrame({col: [8, 4, 6, 10] for col in INCOME_UNIT_COLS})
+    totals = moved.rollup(data, INCOME_UNIT_COLS)
+    assert totals[INCOME_UNIT_COLS[0]].to_dict() == {2000101: 6, 2000102: 2, 2000200: 10}
+    #rolling up then crosswalking the tract totals gives the same counts
+    through = crosswalk.counts(allocation.rollup(data, INCOME_UNIT_COLS), INCOME_UNIT_COLS)
+    assert np.allclose(through.loc[totals.index], totals)
@@ -0,0 +1,93 @@
+# TractStore round trips: the modes, incomes and shares of a tract table survive the store,
+# "no affordable units" stays apart from modes the store was never given, and only incomes
+# that were the ACS top code are flagged as top coded.
+
+import numpy as np
+import pandas as pd
+
+from affordability import HOUSEHOLD_LEVELS, LEVEL_INC_COLS, LEVEL_SHARE_COLS, NO_AFFORDABLE_UNITS, UNIT_BANDS
+from data_loaders import parse_income
+from pipeline import imputed_income
+from tract_imputation import INC_COLS
+from tract_store import TractStore
+
+
+def tracts(**modes):
+    data = pd.DataFrame({'Tract Key': [2017702, 2000301, 3044100]})
+    data[LEVEL_INC_COLS] = 50000.0
+    data[LEVEL_SHARE_COLS] = 1.0 / len(LEVEL_SHARE_COLS)
+    for name, values in modes.items():
+        data[name] = values
+    return data
+
+
+def test_modes_round_trip():
+    data = tracts(mode_family = [HOUSEHOLD_LEVELS[0], None, HOUSEHOLD_LEVELS[3]], mode_unit = [UNIT_BANDS[1], NO_AFFORDABLE_UNITS, UNIT_BANDS[4]])
+    store = TractStore.from_frame(data)
+    frame = store.frame()
+    assert list(frame['mode_family']) == list(data['mode_family'])
+    assert list(frame['mode_unit']) == list(data['mode_unit'])
+    assert list(store.levels()) == [0, -1, 3]
+    assert list(store.bands()) == [1, -1, 4]
+
+
+def test_values_round_trip():
+    data = tracts()
+    data.loc[1, LEVEL_INC_COLS[2]] = np.nan
+    store = TractStore.from_frame(data)
+    frame = store.frame()
+    assert frame['Tract Key'].tolist() == [2017702, 2000301, 3044100]
+    assert frame['Census Tract'].tolist() == ["BX0177.02", "BX0003.01", "BK0441.00"]
+    assert np.allclose(frame[LEVEL_INC_COLS], data[LEVEL_INC_COLS], equal_nan = True)
+    assert np.allclose(frame[LEVEL_SHARE_COLS], data[LEVEL_SHARE_COLS])
+    assert store.missing.tolist() == [0, 1 << 2, 0]
+    assert store.take([0, 2]).frame()['Tract Key'].tolist() == [2017702, 3044100]
+
+
+def test_absent_modes():
+    #a store built without the modes doesn't claim the tracts have no affordable units
+    store = TractStore.from_frame(tracts())
+    frame = store.frame()
+    assert frame['mode_unit'].isna().all()
+    assert frame['mode_family'].isna().all()
+    assert list(store.bands()) == [-1, -1, -1]
+    assert np.isnan(store.gaps(np.full(len(HOUSEHOLD_LEVELS), 100000.0), np.linspace(0.3, 1.65, len(UNIT_BANDS)))[0]).all()
+
+    store = TractStore.from_frame(tracts(mode_unit = [NO_AFFORDABLE_UNITS, UNIT_BANDS[0], UNIT_BANDS[2]]))
+    frame = store.frame()
+    assert list(frame['mode_unit']) == [NO_AFFORDABLE_UNITS, UNIT_BANDS[0], UNIT_BANDS[2]]
+    assert frame['mode_family'].isna().all()
+    assert list(store.take([0, 2]).frame()['mode_unit']) == [NO_AFFORDABLE_UNITS, UNIT_BANDS[2]]
+
+
+def flagged(store):
+    return ((store.top_coded[:, None] & (1 << np.arange(len(LEVEL_INC_COLS)))) != 0).tolist()
+
+
+def test_top_codes_from_strings():
+    data = tracts()
+    data[LEVEL_INC_COLS[1]] = ["250,000+", "250000", "-"]
+    store = TractStore.from_frame(data)
+    assert store.income[:2, 1].tolist() == [250000, 250000]
+    #only the top code itself, not a real income of 250000
+    assert [row[1] for row in flagged(store)] == [True, False, False]
+    assert sum(map(sum, flagged(store))) == 1
+
+
+def test_imputed_top_code_is_not_flagged():
+    #tract 2's missing incomes are imputed from tracts 1 and 3, which are both top coded
+    income = pd.DataFrame({'Census Tract': ["BX0001.00", "BX0002.00", "BX0003.00"], 'Tract Key': [2000100, 2000200, 2000300]})
+    top_coded = {}
+    for col in INC_COLS:
+        income[col], top_coded[col] = parse_income(pd.Series(["250,000+", "-", "250,000+"]), with_top_coded = True)
+    income['Tract No Code'] = [1.0, 2.0, 3.0]
+    income['Boro'] = "BX"
+    top_coded = pd.DataFrame(top_coded).set_index(income['Tract Key'])
+
+    data = imputed_income(income)
+    data[LEVEL_SHARE_COLS] = 1.0 / len(LEVEL_SHARE_COLS)
+    assert (data[LEVEL_INC_COLS] == 250000).all().all()
+    store = TractStore.from_frame(data, top_coded = top_coded)
+    assert flagged(store) == [[True] * 7, [False] * 7, [True] * 7]
+    #the parsed numbers alone don't say which incomes were top coded
+    assert TractStore.from_frame(data).top_coded.tolist() == [0, 0, 0]
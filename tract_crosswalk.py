@@ -0,0 +1,120 @@
+# Crosswalks between 2010 and 2020 census tracts, as sparse weight matrices.
+#
+# The Census Bureau's tract relationship file lists every piece where a 2020 tract overlaps
+# a 2010 tract, with the piece's land and water area. A Crosswalk holds those pieces as a
+# targets x sources sparse matrix, so a whole table of tract values moves from one
+# geography to the other in a single sparse matrix product:
+#
+#   counts (households, units)   split between the target tracts in proportion to the area
+#                                of each piece, so every source tract's total is kept
+#   medians and shares           averaged over the overlapping source tracts, weighted by
+#                                the area of each piece times a per-tract weight such as
+#                                the household count
+#
+# Area weights assume people and buildings are spread evenly over each tract's land, the
+# usual default when nothing finer is available. Tracts use the same integer keys in both
+# geographies (see tract_keys). scipy is only imported once a Crosswalk is built.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tract_keys import from_geo_id
+
+RELATIONSHIP_URL = 'https://www2.census.gov/geo/docs/maps-data/data/rel2020/tract/tab20_tract20_tract10_natl.txt'
+RELATIONSHIP_PATH = "./tab20_tract20_tract10_natl.txt"
+
+GEOGRAPHIES = ['2010', '2020']
+
+RELATIONSHIP_COLUMNS = {'GEOID_TRACT_20': 'str', 'GEOID_TRACT_10': 'str', 'AREALAND_PART': 'int64', 'AREAWATER_PART': 'int64'}
+
+#parsed relationship files by path, shared by every crosswalk built from them
+_relationships = {}
+
+
+def load_relationship_file(path=RELATIONSHIP_PATH, url=RELATIONSHIP_URL):
+    # The NYC pieces of the tract relationship file (downloading it the first time): the 2020
+    # and 2010 tract keys of every piece, and its land and water area in square meters
+    if path not in _relationships:
+        if not os.path.exists(path):
+            import requests
+            response = requests.get(url, timeout = 120)
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                f.write(response.content)
+        data = pd.read_csv(path, sep = "|", usecols = list(RELATIONSHIP_COLUMNS), dtype = RELATIONSHIP_COLUMNS, encoding = 'utf-8-sig')
+        pieces = pd.DataFrame({'2020': from_geo_id(data['GEOID_TRACT_20']), '2010': from_geo_id(data['GEOID_TRACT_10']),
+                               'land': data['AREALAND_PART'], 'water': data['AREAWATER_PART']})
+        #pieces outside the five boroughs get no key
+        _relationships[path] = pieces.dropna(subset = ['2020', '2010']).reset_index(drop = True)
+    return _relationships[path]
+
+
+def _aligned(data, columns, key, keys):
+    #the values of columns in data for each of keys (one row per key, NaN where data has none)
+    index = data[key] if key in data.columns else data.index
+    values = pd.DataFrame(data[columns].to_numpy(dtype = float, na_value = np.nan), index = pd.Index(index, dtype = 'int64'), columns = columns)
+    return values[~values.index.duplicated()].reindex(keys).to_numpy()
+
+
+class Crosswalk:
+    # Overlap weights from the tracts of one geography (sources) to another (targets), as a
+    # targets x sources scipy sparse matrix. Source tracts missing from a table contribute
+    # nothing, and targets without any contribution come back as NaN.
+
+    def __init__(self, source_keys, target_keys, weights):
+        from scipy import sparse
+
+        source_keys = np.asarray(source_keys, dtype = np.int64)
+        target_keys = np.asarray(target_keys, dtype = np.int64)
+        weights = np.asarray(weights, dtype = float)
+        self.sources, source_pos = np.unique(source_keys, return_inverse = True)
+        self.targets, target_pos = np.unique(target_keys, return_inverse = True)
+        self.matrix = sparse.csr_matrix((weights, (target_pos, source_pos)), shape = (len(self.targets), len(self.sources)))
+        self.matrix.sum_duplicates()
+
+        #the same weights scaled so each source tract's pieces add up to 1, for splitting counts
+        totals = np.asarray(self.matrix.sum(axis = 0)).ravel()
+        self.split = (self.matrix @ sparse.diags(np.divide(1.0, totals, out = np.zeros(len(totals)), where = totals > 0))).tocsr()
+
+    @classmethod
+    def from_relationship_file(cls, source='2020', path=RELATIONSHIP_PATH, url=RELATIONSHIP_URL):
+        # Crosswalk from the `source` tracts ('2020' or '2010') to the other geography, by land
+        # area (water area for the pieces of source tracts with no land at all)
+        if source not in GEOGRAPHIES:
+            raise ValueError("unknown tract geography: " + str(source) + " (choose from " + ", ".join(GEOGRAPHIES) + ")")
+        target = GEOGRAPHIES[1 - GEOGRAPHIES.index(source)]
+        pieces = load_relationship_file(path, url)
+        land = pieces.groupby(source)['land'].transform('sum')
+        weights = np.where(land > 0, pieces['land'], pieces['water'])
+        return cls(pieces[source], pieces[target], weights)
+
+    def counts(self, data, columns, key='Tract Key'):
+        # Count columns of data (one row per source tract, keyed by the key column or the
+        # index) split between the target tracts, as floats indexed by target tract key
+        values = _aligned(data, columns, key, self.sources)
+        present = ~np.isnan(values)
+        result = self.split @ np.column_stack([np.where(present, values, 0.0), present])
+        counts, reached = result[:, :len(columns)], result[:, len(columns):]
+        return pd.DataFrame(np.where(reached > 0, counts, np.nan), index = pd.Index(self.targets, name = key), columns = columns)
+
+    def averages(self, data, columns, weights=None, key='Tract Key'):
+        # Medians, shares or rates in columns averaged over the source tracts overlapping each
+        # target tract, weighted by overlap area times weights (a Series by source tract key,
+        # e.g. households; equal weights by default). Missing values are left out, and targets
+        # whose sources all have zero weight (e.g. no households) fall back to area weights.
+        values = _aligned(data, columns, key, self.sources)
+        if weights is None:
+            source_weights = np.ones(len(self.sources))
+        else:
+            source_weights = np.nan_to_num(pd.Series(weights).groupby(level = 0).first().reindex(self.sources).to_numpy(dtype = float, na_value = np.nan))
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        weighted = source_weights[:, None] * present
+        n = len(columns)
+        result = self.matrix @ np.column_stack([filled * weighted, weighted, filled, present])
+        total, weight, area_total, area = result[:, :n], result[:, n:2 * n], result[:, 2 * n:3 * n], result[:, 3 * n:]
+        averages = np.divide(area_total, area, out = np.full(total.shape, np.nan), where = area > 0)
+        averages = np.divide(total, weight, out = averages, where = weight > 0)
+        return pd.DataFrame(averages, index = pd.Index(self.targets, name = key), columns = columns)
@@ -0,0 +1,135 @@
+# NYC 2010 census tract polygons (the boro_ct2010 GeoJSON the heatmaps use), their centroids
+# and a local point-in-polygon engine for assigning buildings to tracts without the Census
+# geocoder.
+# numpy, pandas, shapely and requests are only imported by the functions that use them.
+
+import json
+import os
+
+GEOJSON_URL = 'https://data.cityofnewyork.us/api/geospatial/fxpq-c8ku?method=export&format=GeoJSON'
+GEOJSON_PATH = "./nyct2010.geojson"
+
+#default simplification tolerance for mapping, in degrees (about 10 m)
+SIMPLIFY_TOLERANCE = 0.0001
+
+#parsed GeoJSON by path, so every map and the locator share one copy per run
+_geojson = {}
+
+#(lat, lon) the tract centroids are projected around, roughly the middle of the city
+PROJECTION_CENTER = (40.7, -73.95)
+KM_PER_DEGREE = 111.32
+
+#projected tract centroids by GeoJSON path
+_centroids = {}
+
+
+def load_tracts_geojson(path=GEOJSON_PATH, url=GEOJSON_URL):
+    # Read the tract GeoJSON from disk, downloading it the first time. The parsed GeoJSON is
+    # kept in memory and shared between callers, so treat it as read-only.
+    if path not in _geojson:
+        if not os.path.exists(path):
+            import requests
+            response = requests.get(url, timeout = 60)
+            response.raise_for_status()
+            with open(path, 'w') as f:
+                f.write(response.text)
+        with open(path) as f:
+            _geojson[path] = json.load(f)
+    return _geojson[path]
+
+
+def prune_geojson(geojson, tracts, featureidkey='boro_ct2010'):
+    #only the features whose featureidkey property is one of tracts
+    keep = set(str(tract) for tract in tracts)
+    features = [feature for feature in geojson['features'] if str(feature['properties'][featureidkey]) in keep]
+    return {**geojson, 'features': features}
+
+
+def simplify_geojson(geojson, tolerance=SIMPLIFY_TOLERANCE):
+    # Simplify every polygon in one vectorized call (Douglas-Peucker, preserving topology so
+    # polygons stay valid). Coordinates are also rounded to 6 decimal places (about 0.1 m).
+    import numpy as np
+    import shapely
+
+    if tolerance is None or tolerance <= 0 or not geojson['features']:
+        return geojson
+    shapes = shapely.simplify(np.array([shapely.geometry.shape(feature['geometry']) for feature in geojson['features']]), tolerance, preserve_topology = True)
+    shapes = shapely.set_precision(shapes, 1e-6)
+    features = [{**feature, 'geometry': shapely.geometry.mapping(shape)} for feature, shape in zip(geojson['features'], shapes)]
+    return {**geojson, 'features': features}
+
+
+def tract_geojson(tracts=None, tolerance=SIMPLIFY_TOLERANCE, path=GEOJSON_PATH, url=GEOJSON_URL):
+    #the cached tract GeoJSON, pruned to the given boro_ct2010 tracts (all of them by default) and simplified, ready to map
+    geojson = load_tracts_geojson(path, url)
+    if tracts is not None:
+        import pandas as pd
+        geojson = prune_geojson(geojson, pd.Series(tracts).dropna())
+    return simplify_geojson(geojson, tolerance)
+
+
+def tract_centroids(path=GEOJSON_PATH, url=GEOJSON_URL):
+    # Centroid of every tract as x/y kilometers east and north of PROJECTION_CENTER, indexed by
+    # tract key. An equirectangular projection is good to a fraction of a percent at the
+    # scale of the city, so plain euclidean distances between centroids can be used.
+    if path not in _centroids:
+        import numpy as np
+        import pandas as pd
+        import shapely
+        from tract_keys import from_boro_ct2010
+
+        features = load_tracts_geojson(path, url)['features']
+        points = shapely.centroid(np.array([shapely.geometry.shape(feature['geometry']) for feature in features]))
+        lat, lon = PROJECTION_CENTER
+        keys = from_boro_ct2010([feature['properties']['boro_ct2010'] for feature in features])
+        centroids = pd.DataFrame({'x': (shapely.get_x(points) - lon) * KM_PER_DEGREE * np.cos(np.radians(lat)), 'y': (shapely.get_y(points) - lat) * KM_PER_DEGREE},
+                                 index = pd.Index(keys, name = 'Tract Key'))
+        _centroids[path] = centroids[centroids.index.notna() & ~centroids.index.duplicated()]
+    return _centroids[path]
+
+
+class TractLocator:
+    # Point-in-polygon tract lookups over an STRtree of the tract polygons. Every point is
+    # located in one vectorized query. Tracts come back as the 6 digit ct2010 code, the same
+    # form as the Census geocoder's TRACT, and None for points outside every tract.
+
+    def __init__(self, geojson):
+        import numpy as np
+        import shapely
+
+        features = geojson['features']
+        self.polygons = np.array([shapely.geometry.shape(feature['geometry']) for feature in features])
+        self.tracts = np.array([str(feature['properties']['ct2010']) for feature in features], dtype=object)
+        self.boro_codes = np.array([str(feature['properties']['boro_code']) for feature in features], dtype=object)
+        self.tree = shapely.STRtree(self.polygons)
+
+    @classmethod
+    def from_geojson(cls, path=GEOJSON_PATH, url=GEOJSON_URL):
+        return cls(load_tracts_geojson(path, url))
+
+    def locate_index(self, lats, lons):
+        #position of the containing polygon for each point, -1 if there is none
+        import numpy as np
+        import shapely
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.full(len(lats), -1, dtype=np.int64)
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        if len(valid) == 0:
+            return result
+
+        #points on a shared boundary intersect more than one tract; keep the first match
+        points, polygons = self.tree.query(shapely.points(lons[valid], lats[valid]), predicate='intersects')
+        points, first = np.unique(points, return_index=True)
+        result[valid[points]] = polygons[first]
+        return result
+
+    def locate(self, lats, lons):
+        import numpy as np
+        index = self.locate_index(lats, lons)
+        return np.where(index >= 0, self.tracts[np.maximum(index, 0)], None)
+
+    def coordinates(self, lat, lon):
+        #single point lookup, so the locator can also be used as a GeocodeCache geocoder
+        return self.locate([lat], [lon])[0]
@@ -0,0 +1,231 @@
+# Helpers for imputing missing ACS median income values from neighboring census tracts.
+#
+# "Nearest" follows the original analysis by default: tracts within a borough are compared by
+# the numeric tract code (the 'Tract No Code' column), and a tract can only be used as a
+# neighbor if it has data for every column the target tract is missing. method='centroid'
+# measures the distance between tract centroids instead (see impute_income_knn), since
+# numerically adjacent tracts can be far apart.
+
+import numpy as np
+import pandas as pd
+
+INC_COLS = ['med_inc_family_2', 'med_inc_family_3', 'med_inc_family_4', 'med_inc_family_5', 'med_inc_family_6', 'med_inc_family_7', 'med_inc_nonfamily']
+
+IMPUTE_METHODS = ['tract_number', 'centroid']
+
+#tracts further apart than this were never considered neighbors
+MAX_TRACT_DIFF = 999.99
+
+#third KD-tree coordinate (km) per borough code, far enough apart that a neighbor search
+#capped at half of it never leaves the borough
+BORO_SEPARATION = 1000.0
+
+#inverse distance weights treat centroids closer than this (km) as this far apart
+MIN_DISTANCE = 0.01
+
+
+def missing_mask(values):
+    #bit i is set when column i is empty (NaN, as parsed by data_loaders) or holds a census
+    #missing/bottom-coded marker such as "-" or "2,500-"
+    mask = np.zeros(len(values), dtype=np.int64)
+    for i, col in enumerate(values.columns):
+        missing = values[col].isna() | values[col].astype(str).str.contains("-", regex=False)
+        mask |= missing.to_numpy().astype(np.int64) << i
+    return mask
+
+
+def income_values(values):
+    #parse the income strings into a float matrix the same way float_converter did: commas are
+    #dropped, the "250,000+" top code becomes 250000, and missing values become NaN
+    matrix = np.full(values.shape, np.nan)
+    for i, col in enumerate(values.columns):
+        strs = values[col].astype(str)
+        parsed = pd.to_numeric(strs.str.replace(",", "", regex=False).str.replace("+", "", regex=False), errors='coerce')
+        matrix[:, i] = parsed.fillna(250000.00).to_numpy(dtype=float)
+    matrix[missing_mask(values)[:, None] & (1 << np.arange(values.shape[1])) != 0] = np.nan
+    return matrix
+
+
+class TractNeighborIndex:
+    # Sorted tract codes for one borough. For every pattern of missing columns the
+    # candidate tracts with complete data are kept as a sorted array, so a lookup is a
+    # binary search instead of a scan over the whole borough.
+
+    def __init__(self, boro_data, inc_cols=INC_COLS, masks=None):
+        if masks is None:
+            masks = missing_mask(boro_data[inc_cols])
+        self.order = np.argsort(boro_data['Tract No Code'].to_numpy(dtype=float), kind='stable')
+        self.labels = boro_data.index.to_numpy()[self.order]
+        self.codes = boro_data['Tract No Code'].to_numpy(dtype=float)[self.order]
+        self.masks = np.asarray(masks)[self.order]
+        self._candidates = {}
+
+    def candidates(self, pattern):
+        if pattern not in self._candidates:
+            keep = (self.masks & pattern) == 0
+            codes = self.codes[keep]
+            n = len(codes)
+
+            #position of the second tract sharing a code, carried forward; the original
+            #scan kept that tract as a runner-up even when a closer tract came later
+            second = np.zeros(n, dtype=bool)
+            if n > 1:
+                second[1:] = codes[1:] == codes[:-1]
+                second[2:] &= codes[1:-1] != codes[:-2]
+            dup_before = np.where(second, np.arange(n), -1)
+            dup_before = np.concatenate([[-1], np.maximum.accumulate(dup_before)])[:n]
+
+            #rows are positions in the borough data the index was built from
+            self._candidates[pattern] = (self.labels[keep], codes, dup_before, self.order[keep])
+        return self._candidates[pattern]
+
+    def nearest_two(self, tract, pattern):
+        #returns the row labels of the two nearest tracts with data for the missing columns,
+        #or None where no such tract exists
+        labels, codes, dup_before, rows = self.candidates(pattern)
+        nearest = neighbor_positions(codes, dup_before, np.array([tract], dtype=float))
+        return tuple(None if pos < 0 else labels[pos] for pos in nearest[0])
+
+
+def neighbor_positions(codes, dup_before, tracts):
+    # Positions in the sorted candidate array of the first and second neighbor for each
+    # tract (-1 if none). This reproduces the original two-slot nearest tract scan,
+    # including its tie handling, with binary searches.
+    n = len(codes)
+    result = np.full((len(tracts), 2), -1, dtype=np.int64)
+    if n == 0:
+        return result
+
+    above = np.searchsorted(codes, tracts, side='right')
+    below = np.searchsorted(codes, codes[np.maximum(above - 1, 0)], side='left')
+    has_below = above > 0
+    has_above = above < n
+
+    diff_below = np.where(has_below, np.abs(codes[below] - tracts), np.inf)
+    diff_above = np.where(has_above, np.abs(codes[np.minimum(above, n - 1)] - tracts), np.inf)
+
+    first = np.where(diff_below <= diff_above, below, above)
+    first_diff = np.minimum(diff_below, diff_above)
+
+    nxt = first + 1
+    diff_next = np.where(nxt < n, np.abs(codes[np.minimum(nxt, n - 1)] - tracts), np.inf)
+    dup = dup_before[np.minimum(first, n - 1)]
+    diff_dup = np.where(dup >= 0, np.abs(codes[np.maximum(dup, 0)] - tracts), np.inf)
+
+    second = np.where(diff_dup <= diff_next, dup, nxt)
+    second_diff = np.minimum(diff_dup, diff_next)
+
+    found = first_diff < MAX_TRACT_DIFF
+    result[:, 0] = np.where(found, first, -1)
+    result[:, 1] = np.where(found & (second_diff < MAX_TRACT_DIFF), second, -1)
+    return result
+
+
+def impute_income(income_data, targets=None, inc_cols=INC_COLS, method='tract_number', **options):
+    # Impute every missing income value for the target rows (all rows by default) with the
+    # average of the two nearest tracts in the same borough. Works one borough and one
+    # pattern of missing columns at a time, so each gap is filled by a single gather.
+    # Returns the target income matrix and a mask of the cells that were filled.
+    # method='centroid' hands off to impute_income_knn with the given options.
+    if method not in IMPUTE_METHODS:
+        raise ValueError("unknown imputation method: " + str(method) + " (choose from " + ", ".join(IMPUTE_METHODS) + ")")
+    if method == 'centroid':
+        return impute_income_knn(income_data, targets, inc_cols, **options)
+    if options:
+        raise TypeError("tract_number imputation takes no options, got " + ", ".join(options))
+    values = income_values(income_data[inc_cols])
+    masks = missing_mask(income_data[inc_cols])
+    keys = income_data['Tract Key'].to_numpy(dtype = np.int64)
+    tracts = (keys % 10 ** 6) / 100
+    boros = keys // 10 ** 6
+
+    if targets is None:
+        target_rows = np.arange(len(income_data))
+    else:
+        target_rows = income_data.index.get_indexer(targets)
+    target_masks = masks[target_rows]
+
+    imputed = values[target_rows]
+    filled = np.zeros(imputed.shape, dtype=bool)
+
+    for boro in pd.unique(boros[target_rows]):
+        boro_rows = np.flatnonzero(boros == boro)
+        index = TractNeighborIndex(income_data.iloc[boro_rows], inc_cols, masks[boro_rows])
+        in_boro = np.flatnonzero((boros[target_rows] == boro) & (target_masks != 0))
+
+        for pattern in np.unique(target_masks[in_boro]):
+            rows = in_boro[target_masks[in_boro] == pattern]
+            labels, codes, dup_before, cand_rows = index.candidates(int(pattern))
+            nearest = neighbor_positions(codes, dup_before, tracts[target_rows[rows]])
+            found = nearest >= 0
+            neighbors = boro_rows[cand_rows[np.maximum(nearest, 0)]] if len(cand_rows) else np.zeros(nearest.shape, dtype=np.int64)
+
+            cols = np.flatnonzero(int(pattern) & (1 << np.arange(len(inc_cols))))
+            neighbor_vals = np.where(found[:, :, None], values[neighbors][:, :, cols], 0.0)
+            count = found.sum(axis=1)
+
+            has = count > 0
+            imputed[np.ix_(rows[has], cols)] = neighbor_vals[has].sum(axis=1) / count[has, None]
+            filled[np.ix_(rows[has], cols)] = True
+
+    return imputed, filled
+
+
+def impute_income_knn(income_data, targets=None, inc_cols=INC_COLS, k=2, idw=False, power=1, cross_boro=False, centroids=None):
+    # Impute the missing income values of the target rows from the k tracts with the nearest
+    # centroids (tract_geometry.tract_centroids by default) that have data for every column
+    # the target is missing: their plain average, or with idw weighted by 1 / distance**power.
+    # One KD-tree query per pattern of missing columns covers every target with that
+    # pattern. Neighbors stay in the target's borough unless cross_boro. Targets without a
+    # centroid or any neighbor with one fall back to the tract number method. Returns the
+    # same as impute_income.
+    from scipy.spatial import cKDTree
+
+    if centroids is None:
+        from tract_geometry import tract_centroids
+        centroids = tract_centroids()
+    values = income_values(income_data[inc_cols])
+    masks = missing_mask(income_data[inc_cols])
+    keys = income_data['Tract Key'].to_numpy(dtype=np.int64)
+    points = centroids.reindex(pd.Index(keys, dtype=centroids.index.dtype))[['x', 'y']].to_numpy(dtype=float, na_value=np.nan)
+    located = ~np.isnan(points).any(axis=1)
+    boro_axis = np.zeros(len(keys)) if cross_boro else (keys // 10 ** 6) * BORO_SEPARATION
+    coords = np.column_stack([np.nan_to_num(points), boro_axis])
+    bound = np.inf if cross_boro else BORO_SEPARATION / 2
+
+    if targets is None:
+        target_rows = np.arange(len(income_data))
+    else:
+        target_rows = income_data.index.get_indexer(targets)
+    target_masks = masks[target_rows]
+
+    imputed = values[target_rows]
+    filled = np.zeros(imputed.shape, dtype=bool)
+
+    todo = np.flatnonzero((target_masks != 0) & located[target_rows])
+    for pattern in np.unique(target_masks[todo]):
+        rows = todo[target_masks[todo] == pattern]
+        candidates = np.flatnonzero(((masks & pattern) == 0) & located)
+        if len(candidates) == 0:
+            continue
+        distance, nearest = cKDTree(coords[candidates]).query(coords[target_rows[rows]], k=k, distance_upper_bound=bound)
+        distance, nearest = distance.reshape(len(rows), -1), nearest.reshape(len(rows), -1)
+        #missing neighbors come back as index len(candidates)
+        found = nearest < len(candidates)
+        weights = np.where(found, 1 / np.maximum(distance, MIN_DISTANCE) ** power, 0.0) if idw else found.astype(float)
+
+        cols = np.flatnonzero(int(pattern) & (1 << np.arange(len(inc_cols))))
+        neighbor_vals = values[candidates[np.minimum(nearest, len(candidates) - 1)]][:, :, cols]
+        total = weights.sum(axis=1)
+        has = total > 0
+        imputed[np.ix_(rows[has], cols)] = (np.where(found[:, :, None], neighbor_vals, 0.0) * weights[:, :, None]).sum(axis=1)[has] / total[has, None]
+        filled[np.ix_(rows[has], cols)] = True
+
+    #tracts missing from the tract polygons, or whose candidates all are
+    fallback = np.flatnonzero((target_masks != 0) & ~filled.any(axis=1))
+    if len(fallback):
+        fallback_imputed, fallback_filled = impute_income(income_data, income_data.index[target_rows[fallback]], inc_cols)
+        imputed[fallback] = np.where(fallback_filled, fallback_imputed, imputed[fallback])
+        filled[fallback] = fallback_filled
+
+    return imputed, filled
@@ -0,0 +1,144 @@
+# Census tract keys shared by every dataset in the analysis.
+#
+# A tract key is a single integer: borough code * 10^6 + the 6 digit tract number, e.g.
+# Bronx tract 177.02 is 2017702. That is also the boro_ct2010 value used by the tract
+# GeoJSON. Most functions work on whole pandas Series and return nullable Int64 keys, with
+# <NA> for anything that can't be parsed.
+#
+#   ACS GEO_ID      1400000US36005017702 (or the plain 11 digit GEOID 36005017702)
+#   tract name      BX0177.02
+#   HPD tract       17702 (plus the Borough column)
+#   boro_ct2010     2017702
+#
+# pandas is only imported (through _pd) once one of the Series functions is called, so the
+# single tract helpers at the bottom (parse_tract, tract_name) can be used without loading it.
+
+import re
+
+#borough codes 1-5, in NYC's usual order
+BORO_CODES = {'MANHATTAN': 1, 'BRONX': 2, 'BROOKLYN': 3, 'QUEENS': 4, 'STATEN ISLAND': 5}
+BORO_PREFIXES = {1: 'M', 2: 'BX', 3: 'BK', 4: 'Q', 5: 'SI'}
+BORO_COUNTIES = {1: '061', 2: '005', 3: '047', 4: '081', 5: '085'}
+
+TRACT_SCALE = 10 ** 6
+
+
+def _pd():
+    import pandas
+    return pandas
+
+
+def make_keys(boro_codes, tracts):
+    return _pd().array(boro_codes, dtype='Int64') * TRACT_SCALE + _pd().array(tracts, dtype='Int64')
+
+
+def boro_code(keys):
+    return _pd().Series(keys, dtype='Int64') // TRACT_SCALE
+
+
+def tract_number(keys):
+    return _pd().Series(keys, dtype='Int64') % TRACT_SCALE
+
+
+def _as_series(values):
+    return values if isinstance(values, _pd().Series) else _pd().Series(values)
+
+
+def from_geo_id(geo_ids):
+    geo_ids = _as_series(geo_ids)
+    parts = geo_ids.astype(str).str.extract(r'(?:^|US)36(\d{3})(\d{6})$')
+    counties = {county: code for code, county in BORO_COUNTIES.items()}
+    boros = parts[0].map(counties)
+    keys = make_keys(boros, _pd().to_numeric(parts[1]))
+    return _pd().Series(keys, index = geo_ids.index)
+
+
+def from_tract_name(names):
+    names = _as_series(names)
+    parts = names.astype(str).str.extract(r'^(BX|BK|SI|M|Q)(\d{4})\.(\d{2})$')
+    prefixes = {prefix: code for code, prefix in BORO_PREFIXES.items()}
+    boros = parts[0].map(prefixes)
+    keys = make_keys(boros, _pd().to_numeric(parts[1] + parts[2]))
+    return _pd().Series(keys, index = names.index)
+
+
+def from_boro_ct2010(codes):
+    codes = _as_series(codes)
+    strs = codes.astype(str).str.strip()
+    valid = strs.str.fullmatch(r'[1-5]\d{6}').fillna(False).astype(bool)
+    return _pd().to_numeric(strs.where(valid), errors='coerce').astype('Int64')
+
+
+def from_hpd(tracts, boroughs, located=None):
+    # HPD tract numbers drop the decimal point and leading zeros, so 177.02 shows up as 17702
+    # and 1 as 1. 1-2 digit and 5-6 digit values are unambiguous. A 3-4 digit value ending in
+    # zero then a non-zero digit (e.g. 1702) could be 17.02 or 1702, so those take the 6 digit
+    # tract located from the building's coordinates instead, when one is given.
+    tracts = _as_series(tracts)
+    strs = tracts.astype(str).str.strip()
+    digits = strs.str.fullmatch(r'\d+').fillna(False).astype(bool)
+    length = strs.str.len().where(digits, 0)
+    number = _pd().to_numeric(strs.where(digits), errors='coerce')
+
+    ambiguous = ((length == 3) & (strs.str[1] == '0') & (strs.str[2] != '0')) | ((length == 4) & (strs.str[2] == '0') & (strs.str[3] != '0'))
+    tract = _pd().Series(float('nan'), index = tracts.index)
+    tract = tract.mask(length.between(1, 4) & ~ambiguous, number * 100)
+    tract = tract.mask(length.between(5, 6), number)
+    if located is not None:
+        located = _pd().to_numeric(_as_series(located).reindex(tracts.index), errors='coerce')
+        tract = tract.mask(ambiguous, located)
+
+    boros = _as_series(boroughs).reindex(tracts.index).astype(str).str.strip().str.upper().map(BORO_CODES)
+    return _pd().Series(make_keys(boros, tract), index = tracts.index)
+
+
+def to_tract_name(keys):
+    keys = _pd().Series(keys, dtype = 'Int64')
+    prefix = boro_code(keys).map(BORO_PREFIXES)
+    tract = tract_number(keys)
+    whole = (tract // 100).astype(str).str.zfill(4)
+    part = (tract % 100).astype(str).str.zfill(2)
+    return (prefix + whole + "." + part).where(keys.notna())
+
+
+def to_boro_ct2010(keys):
+    keys = _pd().Series(keys, dtype = 'Int64')
+    return keys.astype(str).where(keys.notna())
+
+
+def to_geo_id(keys):
+    keys = _pd().Series(keys, dtype = 'Int64')
+    county = boro_code(keys).map(BORO_COUNTIES)
+    return ("1400000US36" + county + tract_number(keys).astype(str).str.zfill(6)).where(keys.notna())
+
+
+#single tract versions, in plain Python
+
+_PARSERS = [
+    (re.compile(r'[1-5]\d{6}'), lambda m: int(m.group(0))),
+    (re.compile(r'(?:1400000US)?36(\d{3})(\d{6})'), lambda m: _key({county: code for code, county in BORO_COUNTIES.items()}.get(m.group(1)), int(m.group(2)))),
+    (re.compile(r'(BX|BK|SI|M|Q)(\d{4})\.(\d{2})'), lambda m: _key({prefix: code for code, prefix in BORO_PREFIXES.items()}[m.group(1)], int(m.group(2) + m.group(3)))),
+]
+
+
+def _key(boro, tract):
+    return None if boro is None else boro * TRACT_SCALE + tract
+
+
+def parse_tract(value):
+    #the key of one tract given as a key, boro_ct2010, ACS GEO_ID or tract name, or None
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip().upper()
+    for pattern, parse in _PARSERS:
+        match = pattern.fullmatch(value)
+        if match:
+            return parse(match)
+    return None
+
+
+def tract_name(key):
+    boro, tract = divmod(key, TRACT_SCALE)
+    return BORO_PREFIXES[boro] + str(tract // 100).zfill(4) + "." + str(tract % 100).zfill(2)
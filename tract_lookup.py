@@ -0,0 +1,77 @@
+# On-demand tract lookups against the gaps CSV written by the batch job (cli.py --outputs gaps),
+# e.g. for an API worker:
+#
+#   gaps = TractGaps.from_csv("tract_gaps.csv")
+#   gaps.get("BX0177.02")        {'Tract Key': 2017702, 'Census Tract': 'BX0177.02', 'mode_diff': ...}
+#   gaps.locate(40.84, -73.91)   the same, for the tract containing a point
+#
+# Importing this only loads the standard library and tract_keys, so a worker can start in a
+# few tens of milliseconds. locate() builds a TractLocator (shapely and numpy) the first time
+# it is called.
+
+import csv
+
+from tract_keys import parse_tract, tract_name
+
+GAPS_PATH = "tract_gaps.csv"
+
+#how each gaps CSV column is read back, anything else stays a string
+FLOAT_COLUMNS = ['mode_diff', 'weighted_avg']
+BOOL_COLUMNS = ['mode_diff_zero', 'avg_diff_zero']
+
+
+def _parse_row(row):
+    row = dict(row)
+    row['Tract Key'] = int(row['Tract Key'])
+    for col in FLOAT_COLUMNS:
+        if col in row:
+            row[col] = float(row[col]) if row[col] != "" else None
+    for col in BOOL_COLUMNS:
+        if col in row:
+            row[col] = row[col] == "True"
+    return row
+
+
+class TractGaps:
+    # The rows of the gaps CSV by tract key. Tracts can be given in any form parse_tract
+    # understands; get() returns None for tracts that aren't in the table.
+
+    def __init__(self, rows):
+        self.rows = {row['Tract Key']: row for row in rows}
+        self._locator = None
+
+    @classmethod
+    def from_csv(cls, path=GAPS_PATH):
+        with open(path, newline = "") as f:
+            return cls([_parse_row(row) for row in csv.DictReader(f)])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, tract):
+        return parse_tract(tract) in self.rows
+
+    def get(self, tract):
+        return self.rows.get(parse_tract(tract))
+
+    def locator(self):
+        if self._locator is None:
+            from tract_geometry import TractLocator
+            self._locator = TractLocator.from_geojson()
+        return self._locator
+
+    def locate_key(self, lat, lon):
+        #key of the tract containing the point, None if it isn't in any tract
+        locator = self.locator()
+        index = locator.locate_index([lat], [lon])[0]
+        if index < 0:
+            return None
+        return parse_tract(locator.boro_codes[index] + locator.tracts[index])
+
+    def locate(self, lat, lon):
+        key = self.locate_key(lat, lon)
+        return None if key is None else self.rows.get(key)
+
+    def name(self, tract):
+        key = parse_tract(tract)
+        return None if key is None else tract_name(key)
@@ -0,0 +1,80 @@
+# Per-tract rollups of the Housing New York unit counts.
+#
+# Which tract each building's units count towards is held as a buildings x tracts sparse
+# matrix (a TractAllocation), so every unit column rolls up in one sparse-dense product. A
+# building normally sits in one tract with weight 1; one that straddles tracts can be split
+# between them. Rolling up under another assignment only needs a new allocation, and
+# to_geography moves an allocation onto other tracts through a tract_crosswalk.Crosswalk.
+# scipy is only imported once an allocation is built.
+
+import numpy as np
+import pandas as pd
+
+INCOME_UNIT_COLS = ['Extremely Low Income Units', 'Very Low Income Units', 'Low Income Units', 'Moderate Income Units', 'Middle Income Units']
+OTHER_UNIT_COLS = ['Other Income Units', 'Studio Units', '1-BR Units', '2-BR Units', '3-BR Units', '4-BR Units', '5-BR Units', '6-BR+ Units', 'Unknown-BR Units']
+UNIT_COLS = INCOME_UNIT_COLS + OTHER_UNIT_COLS
+COUNTED_UNIT_COLS = ['Counted Rental Units', 'Counted Homeownership Units', 'All Counted Units', 'Total Units']
+ROLLUP_COLS = UNIT_COLS + COUNTED_UNIT_COLS
+
+
+class TractAllocation:
+    # Share of each building's units that goes to each tract, as a buildings x tracts scipy
+    # sparse matrix. Rows follow the order of the buildings table the allocation was built
+    # for; buildings without a tract have an empty row and count nowhere.
+
+    def __init__(self, buildings, tract_keys, weights, n_buildings):
+        from scipy import sparse
+
+        buildings = np.asarray(buildings, dtype = np.int64)
+        tract_keys = np.asarray(tract_keys, dtype = np.int64)
+        weights = np.asarray(weights, dtype = float)
+        self.tracts, tract_pos = np.unique(tract_keys, return_inverse = True)
+        self.matrix = sparse.csr_matrix((weights, (buildings, tract_pos)), shape = (n_buildings, len(self.tracts)))
+        self.matrix.sum_duplicates()
+        #tracts x buildings, the layout the rollup product wants
+        self._rollup = self.matrix.T.tocsr()
+
+    @classmethod
+    def from_keys(cls, keys):
+        # Every building wholly in the tract of its key (a Series or array with one tract key
+        # per building, missing for buildings without a tract)
+        keys = pd.Series(keys).to_numpy(dtype = float, na_value = np.nan)
+        located = np.flatnonzero(~np.isnan(keys))
+        return cls(located, keys[located], np.ones(len(located)), len(keys))
+
+    @classmethod
+    def from_pieces(cls, buildings, tract_keys, shares, n_buildings):
+        # Buildings split between tracts: one entry per (building position, tract key, share)
+        # piece. Each building's shares are scaled to add up to 1, so its units are kept.
+        buildings = np.asarray(buildings, dtype = np.int64)
+        shares = np.asarray(shares, dtype = float)
+        totals = np.bincount(buildings, weights = shares, minlength = n_buildings)
+        return cls(buildings, tract_keys, np.divide(shares, totals[buildings], out = np.zeros(len(shares)), where = totals[buildings] > 0), n_buildings)
+
+    def to_geography(self, crosswalk):
+        # The same buildings allocated to the target tracts of a Crosswalk whose source tracts
+        # are this allocation's: each building's share of a tract is split like that tract's
+        # counts. Tracts the crosswalk doesn't cover drop out.
+        position = np.searchsorted(crosswalk.sources, self.tracts)
+        covered = (position < len(crosswalk.sources)) & (crosswalk.sources[np.minimum(position, len(crosswalk.sources) - 1)] == self.tracts)
+        moved = (self.matrix[:, np.flatnonzero(covered)] @ crosswalk.split[:, position[covered]].T).tocoo()
+        return TractAllocation(moved.row, crosswalk.targets[moved.col], moved.data, self.matrix.shape[0])
+
+    def rollup(self, data, columns=ROLLUP_COLS, key='Tract Key'):
+        # Sums of the unit columns of data (the buildings table, in allocation order) for
+        # every tract with buildings, indexed by tract key. Missing counts add nothing.
+        if len(data) != self.matrix.shape[0]:
+            raise ValueError("the allocation is for " + str(self.matrix.shape[0]) + " buildings, not " + str(len(data)))
+        values = np.nan_to_num(data[columns].to_numpy(dtype = float, na_value = np.nan))
+        reached = np.diff(self._rollup.indptr) > 0
+        totals = self._rollup[reached] @ values
+        return pd.DataFrame(totals, index = pd.Index(self.tracts[reached], name = key), columns = columns)
+
+
+def tract_unit_totals(housing_data, unit_cols=UNIT_COLS, key='Tract Key'):
+    #sum every unit column for each tract in a single sparse product; the result is indexed by
+    #tract key, one column per unit type, ready to join onto the tract tables
+    totals = TractAllocation.from_keys(housing_data[key]).rollup(housing_data, unit_cols, key)
+    totals.index = totals.index.astype(housing_data[key].dtype)
+    #whole buildings add up to whole units, so integer columns stay integers
+    return totals.astype({col: housing_data[col].dtype for col in unit_cols if pd.api.types.is_integer_dtype(housing_data[col].dtype)})
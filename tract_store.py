@@ -0,0 +1,141 @@
+# Compact tract tables, for holding many vintages and scenarios in memory at once.
+#
+# A TractStore keeps the gap inputs of a set of tracts as typed NumPy arrays, one entry per
+# tract, instead of a wide DataFrame:
+#
+#   keys         int32    tract keys (see tract_keys)
+#   boro         uint8    borough code, 1 to 5
+#   income       float32  tracts x 7 median incomes, 1 person to 7+ (LEVEL_INC_COLS)
+#   shares       float32  tracts x 7 household shares, in the same order (LEVEL_SHARE_COLS)
+#   mode_family  uint8    position of the mode household size in HOUSEHOLD_LEVELS
+#   mode_unit    uint8    position of the mode affordability band in UNIT_BANDS
+#   missing      uint8    bit i set where income i is missing (NaN)
+#   top_coded    uint8    bit i set where income i was the ACS "250,000+" top code
+#
+# Whether an income was top coded is only known from the ACS string, so it is recorded where
+# the string is parsed and handed to the store; a real or imputed income of exactly 250000
+# isn't flagged.
+#
+# Modes are NONE where there isn't one (no households, no affordable units) and ABSENT where
+# the store was built without them, so frame() leaves them out instead. That is about
+# 65 bytes per tract, under half of what the same columns take in a DataFrame with object
+# modes and tract names, and it pickles to the same size for worker processes.
+# gap_inputs() returns the matrices the affordability functions take.
+
+import numpy as np
+import pandas as pd
+
+from affordability import HOUSEHOLD_LEVELS, LEVEL_INC_COLS, LEVEL_SHARE_COLS, NO_AFFORDABLE_UNITS, TOP_CODED_INCOME, UNIT_BANDS, mode_gap, threshold_matrix, weighted_gap
+from tract_keys import BORO_PREFIXES, TRACT_SCALE, to_tract_name
+
+#mode position for tracts without one
+NONE = 255
+#mode position when the store wasn't given the modes
+ABSENT = 254
+
+
+def _codes(names, choices):
+    #positions of names in choices as uint8, NONE for anything else
+    return pd.Series(names).map({name: i for i, name in enumerate(choices)}).fillna(NONE).to_numpy(dtype = np.uint8)
+
+
+def _numbers(column):
+    #a column as float32, parsing ACS strings like "250,000+" and "-" the way data_loaders does,
+    #and where it held the top code (never, for a column that is already numeric)
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype = np.float32, na_value = np.nan), np.zeros(len(column), dtype = bool)
+    from data_loaders import parse_income
+    parsed, top_coded = parse_income(column, with_top_coded = True)
+    return parsed.to_numpy(dtype = np.float32, na_value = np.nan), top_coded.to_numpy(dtype = bool)
+
+
+def _names(codes, choices, none):
+    #the names of mode positions: none for NONE, None for ABSENT
+    names = np.asarray(list(choices) + [none, None], dtype = object)
+    return names[np.select([codes == NONE, codes == ABSENT], [len(choices), len(choices) + 1], codes.astype(np.int64))]
+
+
+def _bits(flags):
+    #one uint8 per row with bit i set where column i of the boolean matrix is
+    return (flags * (1 << np.arange(flags.shape[1]))).sum(axis = 1).astype(np.uint8)
+
+
+class TractStore:
+    # Struct-of-arrays tract table (see the columns above). Build one from a tract table with
+    # from_frame, or from arrays laid out like the attributes; top_coded is then a tracts x 7
+    # boolean matrix, with nothing top coded by default.
+
+    __slots__ = ['keys', 'boro', 'income', 'shares', 'mode_family', 'mode_unit', 'missing', 'top_coded']
+
+    def __init__(self, keys, income, shares, mode_family=None, mode_unit=None, top_coded=None):
+        self.keys = np.asarray(keys, dtype = np.int32)
+        n = len(self.keys)
+        self.boro = (self.keys // TRACT_SCALE).astype(np.uint8)
+        self.income = np.asarray(income, dtype = np.float32).reshape(n, len(LEVEL_INC_COLS))
+        self.shares = np.asarray(shares, dtype = np.float32).reshape(n, len(LEVEL_SHARE_COLS))
+        self.mode_family = np.full(n, ABSENT, dtype = np.uint8) if mode_family is None else np.asarray(mode_family, dtype = np.uint8)
+        self.mode_unit = np.full(n, ABSENT, dtype = np.uint8) if mode_unit is None else np.asarray(mode_unit, dtype = np.uint8)
+        self.missing = _bits(np.isnan(self.income))
+        self.top_coded = _bits(np.zeros(self.income.shape, dtype = bool) if top_coded is None else np.asarray(top_coded, dtype = bool).reshape(self.income.shape))
+
+    @classmethod
+    def from_frame(cls, data, key='Tract Key', top_coded=None):
+        # The tracts of a table with a key column (or a key index), the LEVEL_INC_COLS and
+        # LEVEL_SHARE_COLS columns and, optionally, mode_family and mode_unit names, such as
+        # combined_data. Incomes may still be ACS strings, whose top codes are recorded; for
+        # incomes parsed earlier, top_coded is a boolean table of the top codes by tract key
+        # with the LEVEL_INC_COLS columns (parse_income(..., with_top_coded = True)).
+        keys = data[key] if key in data.columns else data.index.to_series()
+        keys = keys.to_numpy(dtype = np.int64)
+        parsed = [_numbers(data[col]) for col in LEVEL_INC_COLS]
+        income = np.column_stack([values for values, flags in parsed])
+        flags = np.column_stack([flags for values, flags in parsed])
+        if top_coded is not None:
+            flags |= top_coded[LEVEL_INC_COLS].reindex(keys).fillna(False).to_numpy(dtype = bool)
+        shares = np.column_stack([_numbers(data[col])[0] for col in LEVEL_SHARE_COLS])
+        mode_family = _codes(data['mode_family'], HOUSEHOLD_LEVELS) if 'mode_family' in data.columns else None
+        mode_unit = _codes(data['mode_unit'], UNIT_BANDS) if 'mode_unit' in data.columns else None
+        return cls(keys, income, shares, mode_family, mode_unit, flags)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__)
+
+    def take(self, rows):
+        # A store with only the given rows (positions or a boolean mask)
+        subset = object.__new__(TractStore)
+        for name in self.__slots__:
+            setattr(subset, name, getattr(self, name)[rows])
+        return subset
+
+    def levels(self):
+        return np.where(self.mode_family >= ABSENT, -1, self.mode_family.astype(np.int64))
+
+    def bands(self):
+        return np.where(self.mode_unit >= ABSENT, -1, self.mode_unit.astype(np.int64))
+
+    def gap_inputs(self):
+        # income, shares, levels and bands as affordability.gap_inputs returns them, with
+        # missing incomes counted as top coded like the original analysis
+        income = np.where(self.missing[:, None] & (1 << np.arange(len(LEVEL_INC_COLS))) != 0, TOP_CODED_INCOME, self.income.astype(float))
+        return income, self.shares.astype(float), self.levels(), self.bands()
+
+    def gaps(self, ami_levels, pct_ami):
+        #mode_diff and weighted_avg for every tract (NaN without affordable units)
+        thresholds = threshold_matrix(ami_levels, pct_ami)
+        income, shares, levels, bands = self.gap_inputs()
+        return mode_gap(income, levels, bands, thresholds), weighted_gap(income, shares, bands, thresholds)
+
+    def frame(self):
+        # The store as a tract table with the column names and mode names it was built from;
+        # modes it wasn't given come back as None
+        keys = pd.Series(self.keys.astype(np.int64))
+        data = pd.DataFrame({'Tract Key': keys.astype('Int64'), 'Census Tract': to_tract_name(keys), 'Boro': pd.Series(self.boro).map(BORO_PREFIXES)})
+        data[LEVEL_INC_COLS] = self.income
+        data[LEVEL_SHARE_COLS] = self.shares
+        data['mode_family'] = _names(self.mode_family, HOUSEHOLD_LEVELS, None)
+        data['mode_unit'] = _names(self.mode_unit, UNIT_BANDS, NO_AFFORDABLE_UNITS)
+        return data